@@ -1,17 +1,290 @@
+"""
+Табличный просмотр результатов:
+- ResultTableModel — виртуальная модель для QTableView: ячейки форматируются лениво в data(),
+  строки подгружаются пачками через canFetchMore/fetchMore из потокового курсора — чтение идёт
+  в фоновом воркере (QueryRunner), а простаивающий поток закрывается и отпускает соединение
+- DataViewWindow — окно просмотра экспериментов на той же модели, постранично по ключу (KeysetPager)
+"""
+
 import logging
-from PyQt6.QtWidgets import (QMainWindow, QVBoxLayout, QWidget, QTableWidget,
-                             QTableWidgetItem, QHeaderView, QPushButton, QMessageBox)
-from PyQt6.QtCore import Qt
-from database import get_all_experiments_with_joins
+import os
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+from PyQt6.QtWidgets import (QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QTableView,
+                             QHeaderView, QPushButton, QLabel, QMessageBox)
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QTimer, pyqtSignal
+
+from database import SelectParams, KeysetPager, stream_select
+from resultset import ResultSet
+from workers import QueryRunner
 
 # Настройка логирования для этого модуля
 logger = logging.getLogger(__name__)
 
+FETCH_BATCH = 500
+PAGE_SIZE = 500
+# Открытый поток держит соединение пула в транзакции (ACCESS SHARE на таблицах, снимок данных):
+# без прокрутки дольше этого он закрывается
+STREAM_IDLE_SECONDS = float(os.getenv("DBW_STREAM_IDLE_S", "60"))
+
+
+def _format_value(val: Any) -> str:
+    if val is None:
+        return "NULL"
+    return str(val)
+
+
+class ResultTableModel(QAbstractTableModel):
+    """
+    Модель результата запроса. Источник — готовый ResultSet (set_rows)
+    или генератор пачек ResultSet (set_stream, см. database.stream_select).
+    Данные читаются прямо из столбцов ResultSet; локальная сортировка хранит только перестановку строк.
+    QTableView запрашивает только видимые ячейки, поэтому стоимость отрисовки не зависит от числа строк.
+    Следующие пачки потока читаются в фоне; поток, простоявший STREAM_IDLE_SECONDS, закрывается (streamExpired).
+    """
+
+    error = pyqtSignal(str)
+    sortRequested = pyqtSignal(str, Qt.SortOrder)  # сортировка ещё не дочитанного потока — на стороне сервера
+    streamExpired = pyqtSignal()  # поток закрыт по простою, строки дочитаны не все
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rs: ResultSet = ResultSet([])
+        self._order: Optional[List[int]] = None
+        self._keys: List[str] = []
+        self._labels: Dict[str, str] = {}
+        self._formatters: Dict[str, Callable[[Any], str]] = {}
+        self._stream: Optional[Iterator[ResultSet]] = None
+        self._fetching: Optional[Iterator[ResultSet]] = None  # поток, пачку которого сейчас читает воркер
+        self._fetcher = QueryRunner(self)
+        self._idle = QTimer(self)
+        self._idle.setSingleShot(True)
+        self._idle.setInterval(int(STREAM_IDLE_SECONDS * 1000))
+        self._idle.timeout.connect(self._on_idle)
+
+    # ---- источники данных
+
+    def set_rows(self, rows: Union[ResultSet, List[Dict[str, Any]]], labels: Optional[Dict[str, str]] = None,
+                 formatters: Optional[Dict[str, Callable[[Any], str]]] = None):
+        self.beginResetModel()
+        self._close_stream()
+        self._rs = ResultSet.from_dicts(rows)
+        self._order = None
+        self._keys = self._rs.keys
+        self._labels = labels or {}
+        self._formatters = formatters or {}
+        self.endResetModel()
+
+    def set_stream(self, stream: Iterator[ResultSet], first_batch: ResultSet,
+                   labels: Optional[Dict[str, str]] = None,
+                   formatters: Optional[Dict[str, Callable[[Any], str]]] = None):
+        """first_batch уже прочитан из stream (обычно в фоновом воркере); остальное — через fetchMore."""
+        self.set_rows(first_batch, labels, formatters)
+        self._stream = stream if first_batch else None
+        if not first_batch:
+            stream.close()
+        else:
+            self._idle.start()
+
+    def append_rows(self, rows: ResultSet):
+        """Дописывает строки в конец (результат, приходящий частями); у пустой модели задаёт столбцы."""
+        if not rows:
+            return
+        if not self._keys:
+            self.beginResetModel()
+            self._rs = ResultSet([])
+            self._rs.extend(rows)
+            self._keys = self._rs.keys
+            self.endResetModel()
+            return
+        first = len(self._rs)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._rs.extend(rows)
+        if self._order is not None:
+            self._order.extend(range(first, first + len(rows)))
+        self.endInsertRows()
+
+    def clear(self):
+        self.set_rows(ResultSet([]))
+
+    def close(self):
+        """Освобождает серверный курсор и соединение потока."""
+        self._close_stream()
+
+    def _close_stream(self):
+        self._idle.stop()
+        stream, self._stream = self._stream, None
+        if stream is None:
+            return
+        if stream is self._fetching:
+            # генератор сейчас выполняется в воркере — закроется по завершении чтения (_on_batch)
+            self._fetcher.cancel()
+            return
+        self._close_quietly(stream)
+
+    @staticmethod
+    def _close_quietly(stream: Iterator[ResultSet]):
+        try:
+            stream.close()
+        except Exception:
+            logger.warning("Не удалось закрыть потоковый курсор")
+
+    def _on_idle(self):
+        if self._stream is not None and self._fetching is None:
+            logger.info("Поток результата закрыт после %s с простоя", STREAM_IDLE_SECONDS)
+            self._close_stream()
+            self.streamExpired.emit()
+
+    @property
+    def rows(self) -> ResultSet:
+        """Загруженные строки в порядке отображения."""
+        return self._rs if self._order is None else self._rs.take(self._order)
+
+    @property
+    def exhausted(self) -> bool:
+        return self._stream is None
+
+    def _value(self, row: int, column: int) -> Any:
+        if self._order is not None:
+            row = self._order[row]
+        return self._rs.value(row, column)
+
+    # ---- QAbstractTableModel
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rs)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._keys)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            val = self._value(index.row(), index.column())
+            fmt = self._formatters.get(self._keys[index.column()])
+            return fmt(val) if fmt and val is not None else _format_value(val)
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            val = self._value(index.row(), index.column())
+            if isinstance(val, (int, float)) and not isinstance(val, bool):
+                return int(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            key = self._keys[section]
+            return self._labels.get(key, self._rs.columns[section])
+        return str(section + 1)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._stream is not None
+
+    def fetchMore(self, parent=QModelIndex()):
+        # FETCH следующей пачки — в воркере, строки добавляются по результату; повторные вызовы
+        # представления, пока пачка читается, пропускаются
+        if parent.isValid() or self._stream is None or self._fetching is not None:
+            return
+        stream = self._fetching = self._stream
+        self._idle.stop()
+        self._fetcher.run(next, stream, None, with_connection=False,
+                          on_result=lambda batch: self._on_batch(stream, batch),
+                          on_error=lambda msg: self._on_fetch_error(stream, msg))
+
+    def _on_batch(self, stream: Iterator[ResultSet], batch: Optional[ResultSet]):
+        self._fetching = None
+        if stream is not self._stream:
+            self._close_quietly(stream)  # поток заменён или закрыт, пока читалась пачка
+            return
+        if not batch:
+            self._close_stream()
+            return
+        first = len(self._rs)
+        self.beginInsertRows(QModelIndex(), first, first + len(batch) - 1)
+        self._rs.extend(batch)
+        if self._order is not None:
+            self._order.extend(range(first, first + len(batch)))
+        self.endInsertRows()
+        self._idle.start()
+
+    def _on_fetch_error(self, stream: Iterator[ResultSet], msg: str):
+        self._fetching = None
+        current = stream is self._stream
+        if current:
+            self._stream = None
+            self._idle.stop()
+        self._close_quietly(stream)
+        if current:
+            self.error.emit(msg)
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        if not 0 <= column < len(self._keys):
+            return
+        key = self._keys[column]
+        if self._stream is not None:
+            # Часть строк ещё на сервере: локальная сортировка дала бы неверный порядок.
+            self.sortRequested.emit(self._rs.columns[column], order)
+            return
+        self.layoutAboutToBeChanged.emit()
+        # NULL — в конце при любом направлении, как в PostgreSQL по умолчанию для ASC
+        values = self._rs.column(key)
+        present = [i for i, v in enumerate(values) if v is not None]
+        nulls = [i for i, v in enumerate(values) if v is None]
+        try:
+            present.sort(key=values.__getitem__, reverse=order == Qt.SortOrder.DescendingOrder)
+        except TypeError:
+            present.sort(key=lambda i: str(values[i]), reverse=order == Qt.SortOrder.DescendingOrder)
+        self._order = present + nulls
+        self.layoutChanged.emit()
+
+
+class ResultGrid(QTableView):
+    """QTableView, настроенный под ResultTableModel (одинаковая высота строк, сортировка по заголовку)."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.result_model = ResultTableModel(self)
+        self.setModel(self.result_model)
+        self.setAlternatingRowColors(True)
+        self.setSortingEnabled(True)
+        self.horizontalHeader().setSortIndicatorShown(True)
+        self.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.verticalHeader().setDefaultSectionSize(24)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
+
+
+def open_stream(params: SelectParams, batch_size: int = FETCH_BATCH):
+    """Открывает поток и читает первую пачку. Вызывается в воркере (with_connection=False)."""
+    stream = stream_select(params, batch_size)
+    first = next(stream, None) or ResultSet([])
+    return stream, first
+
+
+EXPERIMENTS_VIEW = SelectParams(
+    tables=["experiments"],
+    columns=["id", "name", "is_active", "user_count", "success_rate", "impressions", "clicks", "created_at"],
+    order_by=[("id", "ASC")],
+)
+EXPERIMENTS_LABELS = {
+    "id": "ID", "name": "Название", "is_active": "Активный", "user_count": "Пользователи",
+    "success_rate": "Успех", "impressions": "Показы", "clicks": "Клики", "created_at": "Создан",
+}
+EXPERIMENTS_FORMATTERS = {
+    "is_active": lambda v: "Да" if v else "Нет",
+    "created_at": lambda v: v.strftime("%Y-%m-%d %H:%M"),
+}
+
+
 class DataViewWindow(QMainWindow):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Просмотр экспериментов")
         self.setGeometry(200, 200, 800, 600)
+        self.runner = QueryRunner(self)
+        # страница читается по ключу id — одинаково быстро и в начале, и в конце таблицы
+        self.pager = KeysetPager(EXPERIMENTS_VIEW, page_size=PAGE_SIZE)
 
         # создаем центральный виджет и компоновку
         central_widget = QWidget()
@@ -19,50 +292,67 @@ class DataViewWindow(QMainWindow):
         layout = QVBoxLayout(central_widget)
 
         # Создаем таблицу для отображения
-        self.table = QTableWidget()
+        self.table = ResultGrid()
+        self.table.result_model.error.connect(self._on_error)
+        self.table.setSortingEnabled(False)  # порядок задаётся запросом (ORDER BY id)
         layout.addWidget(self.table)
 
+        nav = QHBoxLayout()
+        self.prev_btn = QPushButton("← Назад")
+        self.prev_btn.clicked.connect(self.prev_page)
+        self.page_label = QLabel()
+        self.next_btn = QPushButton("Вперёд →")
+        self.next_btn.clicked.connect(self.next_page)
+        nav.addWidget(self.prev_btn)
+        nav.addStretch(1)
+        nav.addWidget(self.page_label)
+        nav.addStretch(1)
+        nav.addWidget(self.next_btn)
+        layout.addLayout(nav)
+
         self.refresh_btn = QPushButton("Обновить данные")
         self.refresh_btn.clicked.connect(self.load_data)
         layout.addWidget(self.refresh_btn)
+        self.runner.busyChanged.connect(self._on_busy_changed)
 
         self.load_data()
 
         logger.info("Окно просмотра данных создано")
 
     def load_data(self):
-        try:
-            experiments = get_all_experiments_with_joins()
-
-            # Настраиваем таблицу
-            self.table.setRowCount(len(experiments))
-            self.table.setColumnCount(8)
-            self.table.setHorizontalHeaderLabels([
-                "ID", "Название", "Активный", "Пользователи",
-                "Успех", "Показы", "Клики", "Создан"
-            ])
-
-            # заполняем таблицу данным
-            for row, experiment in enumerate(experiments):
-                self.table.setItem(row, 0, QTableWidgetItem(str(experiment.id)))
-                self.table.setItem(row, 1, QTableWidgetItem(str(experiment.name)))
-                self.table.setItem(row, 2, QTableWidgetItem("Да" if experiment.is_active else "Нет"))
-                self.table.setItem(row, 3, QTableWidgetItem(str(experiment.user_count)))
-                self.table.setItem(row, 4, QTableWidgetItem(str(experiment.success_rate)))
-                self.table.setItem(row, 5, QTableWidgetItem(str(experiment.impressions)))
-                self.table.setItem(row, 6, QTableWidgetItem(str(experiment.clicks)))
-                self.table.setItem(row, 7, QTableWidgetItem(experiment.created_at.strftime("%Y-%m-%d %H:%M")))
-
-            # Настройка растягивание столбцов
-            header = self.table.horizontalHeader()
+        self.runner.run(self.pager.first_page, on_result=self._on_loaded, on_error=self._on_error)
+
+    def next_page(self):
+        self.runner.run(self.pager.next_page, on_result=self._on_loaded, on_error=self._on_error)
+
+    def prev_page(self):
+        self.runner.run(self.pager.prev_page, on_result=self._on_loaded, on_error=self._on_error)
+
+    def _on_busy_changed(self, busy: bool):
+        self.refresh_btn.setEnabled(not busy)
+        self.prev_btn.setEnabled(not busy and self.pager.has_prev)
+        self.next_btn.setEnabled(not busy and self.pager.has_next)
+
+    def _on_loaded(self, rows):
+        if not rows:
+            return  # дальше/раньше данных нет — остаёмся на текущей странице
+        self.table.result_model.set_rows(rows, EXPERIMENTS_LABELS, EXPERIMENTS_FORMATTERS)
+        self.page_label.setText(f"Страница {self.pager.page_no}")
+
+        # Настройка растягивание столбцов
+        header = self.table.horizontalHeader()
+        if self.table.result_model.columnCount() > 1:
             header.setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)  # исправлено
 
-            logger.info(f"Загружено {len(experiments)} экспериментов")
+        logger.info(f"Загружена страница {self.pager.page_no}: {len(rows)} экспериментов")
+
+    def _on_error(self, msg: str):
+        error_msg = f"Ошибки при загрузке данных: {msg}"
+        logger.error(error_msg)
+        QMessageBox.critical(self, "Ошибка", error_msg)
 
-        except Exception as e:
-            error_msg = f"Ошибки при загрузке данных: {str(e)}"
-            logger.error(error_msg)
-            QMessageBox.critical(self, "Ошибка", error_msg)
     def closeEvent(self, event):
+        self.runner.cancel()
+        self.table.result_model.close()
         logger.info("Окно просмотра данных закрыто")
         event.accept()
@@ -0,0 +1,300 @@
+"""
+Параллельный импорт CSV в таблицу PostgreSQL:
+- файл делится на диапазоны байт по границам строк (split_ranges)
+- диапазоны загружаются параллельно несколькими соединениями пула через COPY FROM STDIN
+  в UNLOGGED-таблицу загрузки (без WAL и без ограничений — запись максимально дешёвая)
+- строки проверяются (дубликаты и конфликты первичного ключа, NULL в NOT NULL),
+  переносятся в целевую таблицу одной транзакцией, затем выполняется ANALYZE
+
+Ограничение: поля в кавычках с переводами строк внутри ломают деление по строкам —
+для таких файлов укажите workers=1.
+"""
+
+from __future__ import annotations
+import csv
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Literal, Optional, Sequence, Tuple
+
+from psycopg2 import sql
+from psycopg2.extensions import connection as PGConnection
+
+from database import (DBError, CATALOG_CACHE, RESULT_CACHE, get_pool, pooled_connection,
+                      _humanize_pg_error)
+
+logger = logging.getLogger(__name__)
+
+MIN_CHUNK_BYTES = 8 * 1024 * 1024  # мельче делить нет смысла: накладные расходы COPY перевесят
+
+
+def split_ranges(path: str, parts: int, start: int = 0) -> List[Tuple[int, int]]:
+    """
+    Делит файл с позиции start на не более чем parts диапазонов [begin, end),
+    каждая граница — сразу после символа перевода строки.
+    """
+    size = os.path.getsize(path)
+    parts = max(1, min(parts, (size - start) // MIN_CHUNK_BYTES or 1))
+    step = (size - start) // parts
+    bounds = [start]
+    with open(path, "rb") as f:
+        for i in range(1, parts):
+            f.seek(max(start + i * step, bounds[-1]))
+            f.readline()  # дочитываем текущую строку до конца
+            pos = f.tell()
+            if pos >= size:
+                break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    bounds.append(size)
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1) if bounds[i] < bounds[i + 1]]
+
+
+class _RangeReader:
+    """Файлоподобный объект для copy_expert: отдаёт байты [begin, end) и сообщает о прочитанном."""
+
+    def __init__(self, path: str, begin: int, end: int, on_read: Callable[[int], None],
+                 stop: threading.Event):
+        self._f = open(path, "rb")
+        self._f.seek(begin)
+        self._left = end - begin
+        self._on_read = on_read
+        self._stop = stop
+
+    def read(self, size: int = -1) -> bytes:
+        if self._stop.is_set():
+            raise RuntimeError("Импорт прерван")
+        if self._left <= 0:
+            return b""
+        n = self._left if size is None or size < 0 else min(size, self._left)
+        data = self._f.read(n)
+        self._left -= len(data)
+        self._on_read(len(data))
+        return data
+
+    def close(self) -> None:
+        self._f.close()
+
+
+def _read_header(path: str, delimiter: str, encoding: str) -> Tuple[List[str], int]:
+    """Имена столбцов из первой строки и смещение начала данных."""
+    with open(path, "rb") as f:
+        line = f.readline()
+        return next(csv.reader([line.decode(encoding).rstrip("\r\n")], delimiter=delimiter)), f.tell()
+
+
+def _primary_key(conn: PGConnection, schema: str, table: str) -> List[str]:
+    q = """
+        SELECT a.attname
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+        WHERE i.indrelid = %s::regclass AND i.indisprimary
+        ORDER BY array_position(i.indkey, a.attnum)
+    """
+    with conn.cursor() as cur:
+        cur.execute(q, (sql.Identifier(schema, table).as_string(conn),))
+        return [r[0] for r in cur.fetchall()]
+
+
+def _validate(conn: PGConnection, staging: sql.Composable, target: sql.Composable,
+              columns: Sequence[str], meta: Dict[str, Dict[str, Any]], pk: Sequence[str]) -> Dict[str, int]:
+    """Считает проблемные строки загрузки до переноса в целевую таблицу."""
+    issues: Dict[str, int] = {}
+    with conn.cursor() as cur:
+        for col in columns:
+            if not meta[col]["nullable"]:
+                cur.execute(sql.SQL("SELECT count(*) FROM {} WHERE {} IS NULL").format(
+                    staging, sql.Identifier(col)))
+                n = cur.fetchone()[0]
+                if n:
+                    issues[f"NULL в NOT NULL столбце {col}"] = n
+        if pk and all(c in columns for c in pk):
+            keys = sql.SQL(", ").join(sql.Identifier(c) for c in pk)
+            cur.execute(sql.SQL(
+                "SELECT count(*) FROM (SELECT 1 FROM {} GROUP BY {} HAVING count(*) > 1) d"
+            ).format(staging, keys))
+            n = cur.fetchone()[0]
+            if n:
+                issues["повторяющиеся ключи в файле"] = n
+            cur.execute(sql.SQL("SELECT count(*) FROM {} s WHERE EXISTS (SELECT 1 FROM {} t WHERE {})").format(
+                staging, target,
+                sql.SQL(" AND ").join(sql.SQL("t.{0} = s.{0}").format(sql.Identifier(c)) for c in pk)))
+            n = cur.fetchone()[0]
+            if n:
+                issues["ключи уже есть в таблице"] = n
+    return issues
+
+
+def import_csv(
+    path: str,
+    table: str,
+    columns: Optional[Sequence[str]] = None,
+    schema: str = "public",
+    delimiter: str = ",",
+    header: bool = True,
+    encoding: str = "UTF8",
+    workers: Optional[int] = None,
+    on_conflict: Literal["error", "skip"] = "error",
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Загружает CSV в table. columns — порядок столбцов файла (по умолчанию — из заголовка).
+    workers — число параллельных COPY (по умолчанию — число ядер, но не больше пула минус одно соединение).
+    on_conflict="skip" — строки с уже существующим ключом пропускаются (ON CONFLICT DO NOTHING),
+    "error" — импорт прерывается до изменения целевой таблицы.
+    progress получает {"stage": "copy"|"validate"|"insert"|"analyze", "done": байт, "total": байт}.
+    Вызывается вне GUI-потока (QueryRunner с with_connection=False): соединения берутся из пула.
+    """
+    py_encoding = "utf-8" if encoding.upper().replace("-", "") == "UTF8" else encoding
+    data_start = 0
+    if header:
+        header_cols, data_start = _read_header(path, delimiter, py_encoding)
+        columns = columns or [c.strip() for c in header_cols]
+    if not columns:
+        raise DBError("Не заданы столбцы: укажите columns или файл с заголовком.")
+
+    pool = get_pool()
+    workers = workers or os.cpu_count() or 1
+    workers = max(1, min(workers, pool.maxconn - 1))
+    ranges = split_ranges(path, workers, data_start)
+    total = os.path.getsize(path) - data_start
+
+    target = sql.Identifier(schema, table)
+    staging_name = f"dbw_stage_{uuid.uuid4().hex[:12]}"
+    staging = sql.Identifier(schema, staging_name)
+    cols_sql = sql.SQL(", ").join(sql.Identifier(c) for c in columns)
+    timings: Dict[str, float] = {}
+
+    def report(stage: str, done: int) -> None:
+        if progress:
+            progress({"stage": stage, "done": done, "total": total})
+
+    with pooled_connection() as conn:
+        meta = {c["column_name"]: c for c in CATALOG_CACHE.columns(conn, table, schema)}
+        if not meta:
+            raise DBError(f"Таблица {schema}.{table} не найдена.")
+        missing = [c for c in columns if c not in meta]
+        if missing:
+            raise DBError(f"В таблице {table} нет столбцов: {', '.join(missing)}")
+        pk = _primary_key(conn, schema, table)
+        try:
+            with conn.cursor() as cur:
+                # без ограничений целевой таблицы: проверки — после загрузки, одним запросом на вид
+                cur.execute(sql.SQL("CREATE UNLOGGED TABLE {} AS SELECT {} FROM {} WITH NO DATA").format(
+                    staging, cols_sql, target))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise DBError(_humanize_pg_error(e))
+
+        try:
+            # ---- параллельный COPY диапазонов
+            copy_q = sql.SQL(
+                "COPY {} ({}) FROM STDIN WITH (FORMAT csv, DELIMITER {}, NULL '', ENCODING {})"
+            ).format(staging, cols_sql, sql.Literal(delimiter), sql.Literal(encoding)).as_string(conn)
+            stop = threading.Event()
+            lock = threading.Lock()
+            read_total = [0]
+
+            reported = [0]
+            step = max(1, total // 100)  # не чаще раза на процент — прогресс уходит сигналом в GUI
+
+            def on_read(n: int) -> None:
+                with lock:
+                    read_total[0] += n
+                    done = read_total[0]
+                    if done - reported[0] < step and done < total:
+                        return
+                    reported[0] = done
+                try:
+                    report("copy", done)
+                except Exception:
+                    stop.set()  # отмена из воркера GUI: прерываем все диапазоны
+                    raise
+
+            def load(rng: Tuple[int, int]) -> int:
+                reader = _RangeReader(path, rng[0], rng[1], on_read, stop)
+                try:
+                    with pooled_connection() as c:
+                        try:
+                            with c.cursor() as cur:
+                                cur.copy_expert(copy_q, reader)
+                                n = cur.rowcount
+                            c.commit()
+                            return n
+                        except Exception:
+                            c.rollback()
+                            stop.set()
+                            raise
+                finally:
+                    reader.close()
+
+            t0 = time.perf_counter()
+            errors: List[Exception] = []
+            loaded = 0
+            if ranges:
+                with ThreadPoolExecutor(max_workers=len(ranges), thread_name_prefix="csv-copy") as ex:
+                    for fut in [ex.submit(load, r) for r in ranges]:
+                        try:
+                            loaded += fut.result()
+                        except Exception as e:
+                            errors.append(e)
+            timings["copy"] = time.perf_counter() - t0
+            if errors:
+                raise errors[0]
+
+            # ---- проверка
+            report("validate", total)
+            t0 = time.perf_counter()
+            issues = _validate(conn, staging, target, columns, meta, pk)
+            conn.rollback()
+            timings["validate"] = time.perf_counter() - t0
+            if on_conflict == "skip":
+                issues.pop("ключи уже есть в таблице", None)
+            if issues:
+                details = "; ".join(f"{k}: {v}" for k, v in issues.items())
+                raise DBError(f"Файл не прошёл проверку, таблица не изменена. {details}")
+
+            # ---- перенос одной транзакцией
+            report("insert", total)
+            t0 = time.perf_counter()
+            conflict = sql.SQL(" ON CONFLICT DO NOTHING") if on_conflict == "skip" else sql.SQL("")
+            with conn.cursor() as cur:
+                cur.execute(sql.SQL("INSERT INTO {} ({}) SELECT {} FROM {}").format(
+                    target, cols_sql, cols_sql, staging) + conflict)
+                inserted = cur.rowcount
+            conn.commit()
+            timings["insert"] = time.perf_counter() - t0
+            RESULT_CACHE.invalidate_tables({table})
+        except DBError:
+            conn.rollback()
+            raise
+        except Exception as e:
+            conn.rollback()
+            raise DBError(_humanize_pg_error(e))
+        finally:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(staging))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                logger.warning("Не удалось удалить таблицу загрузки %s", staging_name)
+
+        # ---- статистика планировщика для новых данных
+        report("analyze", total)
+        t0 = time.perf_counter()
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("ANALYZE {}").format(target))
+        conn.commit()
+        timings["analyze"] = time.perf_counter() - t0
+
+    logger.info("Импорт %s -> %s: %s строк, %s потоков, %s", path, table, inserted, len(ranges), timings)
+    return {"rows_loaded": loaded, "rows_inserted": inserted, "chunks": len(ranges),
+            "workers": len(ranges), "seconds": timings}
+
+
+__all__ = ["import_csv", "split_ranges"]
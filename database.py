@@ -1,25 +1,49 @@
 """
 Содержит:
-- Вспомогательные функции для подключения к базе данных
-- Средства интроспекции (просмотра структуры) каталога PostgreSQL
+- Вспомогательные функции для подключения к базе данных и общий пул соединений
+- Замер запросов: время, строки и байты по отпечаткам запросов, журнал медленных запросов
+- Средства интроспекции (просмотра структуры) каталога PostgreSQL и кэш метаданных таблиц
 - Транзакционный API для ALTER TABLE (структурированные операции изменения таблиц)
 - Параметризованный конструктор запросов SELECT с поддержкой JOIN, WHERE, GROUP BY, HAVING и ORDER BY
+- Кэш результатов SELECT (LRU по строкам и байтам, TTL, сброс при записи в таблицы запроса)
+- Кэш подготовленных выражений (PREPARE/EXECUTE) на каждом соединении пула
+- Пакетную вставку строк (execute_values / COPY FROM STDIN) с фиксацией по частям
+- Потоковое чтение больших результатов через серверные (именованные) курсоры и выборку в массивы NumPy
+- Результаты чтения данных — ResultSet (столбцы в типизированных массивах, см. resultset.py);
+  интроспекция каталога по-прежнему возвращает списки словарей
 - Поддержку строковых функций (UPPER, LOWER, TRIM, SUBSTRING, LPAD, RPAD, CONCAT)
 
 Модуль не зависит от графического фреймворка: интерфейс (PyQt/PySide) должен вызывать функции из этого файла.
 """
 
 from __future__ import annotations
+import io
+import json
 import os
+import random
+import re
 import sys
+import select
+import time
 import logging
-from dataclasses import dataclass, field
-from typing import Any, Dict, List, Literal, Optional, Sequence, Tuple
+import hashlib
+import threading
+import uuid
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from decimal import Decimal
+from functools import lru_cache
+from itertools import islice
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Literal, Optional, Sequence, Set, Tuple
 
 import psycopg2
 from psycopg2 import sql
 from psycopg2.extensions import connection as PGConnection
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import Json, RealDictCursor, execute_values
+
+from resultset import ResultSet, _unique_keys
 
 # -------- connection
 
@@ -30,6 +54,7 @@ def get_connection() -> PGConnection:
         user=os.getenv("PGUSER","postgres"),
         password=os.getenv("PGPASSWORD","ShubinSQL228"),
         port=int(os.getenv("PGPORT","5432")),
+        cursor_factory=InstrumentedCursor,
     )
     conn.set_client_encoding('UTF8')
     return conn
@@ -39,6 +64,484 @@ def get_connection() -> PGConnection:
 class DBError(RuntimeError):
     pass
 
+# -------- Query instrumentation
+
+SLOW_QUERY_MS = float(os.getenv("DBW_SLOW_QUERY_MS", "500"))  # порог журнала медленных запросов
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)  # верхние границы корзин
+
+slow_query_logger = logging.getLogger("database.slow")
+
+# Токены для отпечатка: комментарии, строковые литералы, идентификаторы в кавычках, параметры и числа, пробелы
+_FP_TOKEN_RE = re.compile(
+    r"(--[^\n]*|/\*.*?\*/)|('(?:[^']|'')*')|(\"(?:[^\"]|\"\")*\")"
+    r"|(%\(\w+\)s|%s|\$\d+|(?<![\w$])\d+(?:\.\d+)?(?:e[+-]?\d+)?)|(\s+)",
+    re.S | re.I)
+_FP_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")  # IN (?, ?, ?) / строка VALUES
+_FP_ROWS_RE = re.compile(r"\(\?\.\.\.\)(?:\s*,\s*\(\?\.\.\.\))+")  # VALUES (...), (...), ...
+_FP_EXECUTE_RE = re.compile(r'execute "(dbw_ps_\w+)"')
+_FP_PREPARE_RE = re.compile(r'^prepare "dbw_ps_\w+"')
+
+# имя подготовленного выражения -> исходный SQL (чтобы EXECUTE попадал в отпечаток своего запроса).
+# Имя выводится из текста, поэтому одно выражение может жить на нескольких соединениях:
+# _PREPARED_REFS считает их, запись удаляется вместе с последним (см. _hold_source/_release_sources).
+_PREPARED_SOURCES: Dict[str, str] = {}
+_PREPARED_REFS: Dict[str, int] = {}
+
+
+@lru_cache(maxsize=4096)
+def _normalize_fingerprint(text: str) -> str:
+    out, pos = [], 0
+    for m in _FP_TOKEN_RE.finditer(text):
+        out.append(text[pos:m.start()].lower())
+        pos = m.end()
+        if m.group(3):
+            out.append(m.group(3))
+        elif m.group(2) or m.group(4):
+            out.append("?")
+        else:
+            out.append(" ")
+    out.append(text[pos:].lower())
+    norm = " ".join("".join(out).split())
+    norm = _FP_ROWS_RE.sub("(?...), ...", _FP_LIST_RE.sub("(?...)", norm))
+    m = _FP_EXECUTE_RE.match(norm)
+    if m and m.group(1) in _PREPARED_SOURCES:
+        return _normalize_fingerprint(_PREPARED_SOURCES[m.group(1)])
+    return _FP_PREPARE_RE.sub("prepare ?", norm)
+
+
+def query_fingerprint(query: str) -> Tuple[str, str]:
+    """
+    (идентификатор, нормализованный текст) запроса: литералы и параметры заменены на ?,
+    списки значений свёрнуты, регистр и пробелы приведены. Запросы, отличающиеся только
+    значениями, получают один отпечаток.
+    """
+    norm = _normalize_fingerprint(query)
+    return hashlib.sha1(norm.encode("utf-8")).hexdigest()[:12], norm
+
+
+def _value_bytes(v: Any) -> int:
+    if v is None:
+        return 0
+    if isinstance(v, (str, bytes, bytearray, memoryview)):
+        return len(v)
+    if isinstance(v, (bool, int, float)):
+        return 8
+    return len(str(v))
+
+
+def _estimate_bytes(rows: Sequence[Any]) -> int:
+    """Примерный объём полученных строк: по выборке не более чем из 8 строк пачки."""
+    n = len(rows)
+    if not n:
+        return 0
+    sample = rows[::max(1, n // 8)][:8]
+    total = sum(_value_bytes(v) for r in sample for v in (r.values() if isinstance(r, dict) else r))
+    return total * n // len(sample)
+
+
+@dataclass
+class QueryStat:
+    """Накопленная статистика одного отпечатка запроса."""
+    fingerprint: str
+    query: str
+    calls: int = 0
+    total_ms: float = 0.0
+    min_ms: float = float("inf")
+    max_ms: float = 0.0
+    rows: int = 0
+    bytes: int = 0
+    slow: int = 0
+    errors: int = 0
+    histogram: List[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1))
+
+    @property
+    def mean_ms(self) -> float:
+        return self.total_ms / self.calls if self.calls else 0.0
+
+    def percentile(self, q: float) -> float:
+        """Оценка перцентиля по гистограмме: верхняя граница корзины (не больше max_ms)."""
+        target = q / 100 * self.calls
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS + (self.max_ms,), self.histogram):
+            seen += count
+            if count and seen >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+
+class QueryStats:
+    """
+    Агрегатор замеров по отпечаткам запросов: время (сумма, min/max, гистограмма), строки, байты.
+    Число отпечатков ограничено max_fingerprints: новые сверх лимита только считаются в dropped.
+    """
+
+    def __init__(self, max_fingerprints: int = 500, enabled: bool = True):
+        self.max_fingerprints = max_fingerprints
+        self.enabled = enabled
+        self.dropped = 0
+        self._stats: Dict[str, QueryStat] = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, fp: str, norm: str) -> Optional[QueryStat]:
+        st = self._stats.get(fp)
+        if st is None:
+            if len(self._stats) >= self.max_fingerprints:
+                self.dropped += 1
+                return None
+            st = self._stats[fp] = QueryStat(fp, norm)
+        return st
+
+    def record(self, query: str, elapsed: float, rows: int = 0, nbytes: int = 0, error: bool = False) -> None:
+        """Один выполненный запрос; elapsed — секунды. Медленные пишутся в журнал database.slow."""
+        fp, norm = query_fingerprint(query)
+        ms = elapsed * 1000
+        with self._lock:
+            st = self._entry(fp, norm)
+            if st is not None:
+                st.calls += 1
+                st.total_ms += ms
+                st.min_ms = min(st.min_ms, ms)
+                st.max_ms = max(st.max_ms, ms)
+                st.rows += rows
+                st.bytes += nbytes
+                st.errors += error
+                st.histogram[_bucket(ms)] += 1
+                st.slow += ms >= SLOW_QUERY_MS
+        if ms >= SLOW_QUERY_MS:
+            slow_query_logger.warning("Медленный запрос %.0f мс, строк %d [%s]: %s", ms, rows, fp, norm[:2000])
+
+    def add_bytes(self, query: str, nbytes: int) -> None:
+        """Объём строк, прочитанных после замера времени (fetch у клиентского курсора)."""
+        fp, norm = query_fingerprint(query)
+        with self._lock:
+            st = self._stats.get(fp)
+            if st is not None:
+                st.bytes += nbytes
+
+    def top(self, n: int = 20, by: str = "total_ms") -> List[QueryStat]:
+        """Первые n отпечатков по убыванию by (total_ms, calls, mean_ms, max_ms, rows, bytes)."""
+        with self._lock:
+            items = [replace(st, histogram=list(st.histogram)) for st in self._stats.values()]
+        return sorted(items, key=lambda st: getattr(st, by), reverse=True)[:n]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+            self.dropped = 0
+
+
+def _bucket(ms: float) -> int:
+    for i, bound in enumerate(LATENCY_BUCKETS_MS):
+        if ms <= bound:
+            return i
+    return len(LATENCY_BUCKETS_MS)
+
+
+QUERY_STATS = QueryStats(
+    max_fingerprints=int(os.getenv("DBW_QUERY_STATS_MAX", "500")),
+    enabled=os.getenv("DBW_QUERY_STATS", "1") != "0",
+)
+
+
+def configure_slow_query_log(path: Optional[str] = None, threshold_ms: Optional[float] = None) -> None:
+    """Отдельный файл журнала медленных запросов (кроме общего журнала) и/или новый порог."""
+    global SLOW_QUERY_MS
+    if threshold_ms is not None:
+        SLOW_QUERY_MS = threshold_ms
+    if path and not any(getattr(h, "baseFilename", None) == os.path.abspath(path)
+                        for h in slow_query_logger.handlers):
+        handler = logging.FileHandler(path, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        slow_query_logger.addHandler(handler)
+
+
+class InstrumentedCursorMixin:
+    """
+    Замер запросов курсора для QUERY_STATS.
+    Клиентский курсор получает весь результат в execute: время и число строк фиксируются сразу,
+    объём — при чтении строк. У именованного (серверного) курсора время и строки копятся
+    по всем FETCH и фиксируются при исчерпании результата или close().
+    """
+
+    _dbw_query: Optional[str] = None
+    _dbw_elapsed = 0.0
+    _dbw_rows = 0
+    _dbw_bytes = 0
+
+    def _dbw_text(self, query: Any) -> str:
+        if isinstance(query, sql.Composable):
+            return query.as_string(self)
+        if isinstance(query, bytes):
+            return query.decode("utf-8", "replace")
+        return str(query)
+
+    def execute(self, query, vars=None):
+        if not QUERY_STATS.enabled:
+            return super().execute(query, vars)
+        self._dbw_finish()
+        text = self._dbw_text(query)
+        t0 = time.perf_counter()
+        try:
+            result = super().execute(query, vars)
+        except Exception:
+            QUERY_STATS.record(text, time.perf_counter() - t0, error=True)
+            raise
+        elapsed = time.perf_counter() - t0
+        if self.name is None:
+            QUERY_STATS.record(text, elapsed, max(self.rowcount, 0))
+            self._dbw_query = text
+        else:
+            self._dbw_query, self._dbw_elapsed, self._dbw_rows, self._dbw_bytes = text, elapsed, 0, 0
+        return result
+
+    def copy_expert(self, sql_text, file, size=8192):
+        if not QUERY_STATS.enabled:
+            return super().copy_expert(sql_text, file, size)
+        text = self._dbw_text(sql_text)
+        t0 = time.perf_counter()
+        try:
+            return super().copy_expert(sql_text, file, size)
+        finally:
+            QUERY_STATS.record(text, time.perf_counter() - t0, max(self.rowcount, 0))
+
+    def _dbw_fetched(self, rows: Sequence[Any], elapsed: float, exhausted: bool) -> None:
+        if self._dbw_query is None:
+            return
+        nbytes = _estimate_bytes(rows)
+        if self.name is None:
+            QUERY_STATS.add_bytes(self._dbw_query, nbytes)
+            return
+        self._dbw_elapsed += elapsed
+        self._dbw_rows += len(rows)
+        self._dbw_bytes += nbytes
+        if exhausted:
+            self._dbw_finish()
+
+    def _dbw_finish(self) -> None:
+        if self.name is not None and self._dbw_query is not None:
+            QUERY_STATS.record(self._dbw_query, self._dbw_elapsed, self._dbw_rows, self._dbw_bytes)
+        self._dbw_query = None
+
+    def fetchone(self):
+        t0 = time.perf_counter()
+        row = super().fetchone()
+        self._dbw_fetched([row] if row is not None else [], time.perf_counter() - t0, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        t0 = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._dbw_fetched(rows, time.perf_counter() - t0, len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        t0 = time.perf_counter()
+        rows = super().fetchall()
+        self._dbw_fetched(rows, time.perf_counter() - t0, True)
+        return rows
+
+    def __iter__(self):
+        # встроенный итератор psycopg2 не вызывает fetch*: читаем пачками по itersize через fetchmany
+        while True:
+            rows = self.fetchmany(self.itersize)
+            yield from rows
+            if len(rows) < self.itersize:
+                return
+
+    def close(self):
+        self._dbw_finish()
+        return super().close()
+
+
+class InstrumentedCursor(InstrumentedCursorMixin, psycopg2.extensions.cursor):
+    """Курсор по умолчанию для соединений get_connection()."""
+
+
+class InstrumentedRealDictCursor(InstrumentedCursorMixin, RealDictCursor):
+    """RealDictCursor с замером запросов (интроспекция каталога)."""
+
+
+# -------- connection pool
+
+class ConnectionPool:
+    """
+    Потокобезопасный пул соединений.
+    - minconn соединений открываются при создании пула и не закрываются по простою, не более maxconn одновременно;
+    - соединения, простоявшие дольше idle_timeout секунд, закрываются (сверх minconn);
+    - перед выдачей соединение, простоявшее дольше health_check_after секунд, проверяется через ping();
+    - при возврате откатывается незавершённая транзакция и сбрасываются настройки сессии (RESET ALL).
+    """
+
+    def __init__(self, minconn: int = 1, maxconn: int = 10, idle_timeout: float = 300.0,
+                 health_check_after: float = 5.0, acquire_timeout: float = 30.0,
+                 connect: Callable[[], PGConnection] = get_connection):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise DBError(f"Некорректные размеры пула: min={minconn}, max={maxconn}")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.acquire_timeout = acquire_timeout
+        self._connect = connect
+        self._idle: List[Tuple[PGConnection, float]] = []  # (соединение, момент возврата)
+        self._used: Set[int] = set()
+        self._cond = threading.Condition()
+        self._closed = False
+        try:
+            for _ in range(minconn):
+                self._idle.append((connect(), time.monotonic()))
+        except Exception:
+            for conn, _ in self._idle:
+                self._close_quietly(conn)
+            raise
+
+    @property
+    def size(self) -> int:
+        return len(self._idle) + len(self._used)
+
+    def getconn(self) -> PGConnection:
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise DBError("Пул соединений закрыт.")
+                    self._prune_idle()
+                    if self._idle:
+                        conn, since = self._idle.pop()  # LIFO: самое «тёплое» соединение
+                        self._used.add(id(conn))
+                        break
+                    if self.size < self.maxconn:
+                        conn, since = None, 0.0
+                        break
+                    left = deadline - time.monotonic()
+                    if left <= 0 or not self._cond.wait(left):
+                        raise DBError(f"Нет свободных соединений в пуле (занято {len(self._used)} из {self.maxconn}).")
+                if conn is None:
+                    # резервируем место до выхода из-под блокировки: connect() может быть долгим
+                    placeholder = object()
+                    self._used.add(id(placeholder))
+            if conn is None:
+                break
+            # ping() ходит в сеть: проверяем вне блокировки, чтобы зависшее соединение не держало остальных
+            if not conn.closed and (time.monotonic() - since <= self.health_check_after or ping(conn)):
+                return conn
+            with self._cond:
+                self._used.discard(id(conn))
+                self._close_quietly(conn)
+                self._cond.notify()
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._used.discard(id(placeholder))
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._used.discard(id(placeholder))
+            self._used.add(id(conn))
+        return conn
+
+    def putconn(self, conn: PGConnection, discard: bool = False) -> None:
+        if not discard and not conn.closed:
+            discard = not self._reset(conn)
+        with self._cond:
+            self._used.discard(id(conn))
+            if discard or conn.closed or self._closed:
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self) -> None:
+        with self._cond:
+            self._closed = True
+            for conn, _ in self._idle:
+                self._close_quietly(conn)
+            self._idle.clear()
+            self._cond.notify_all()
+
+    def _prune_idle(self) -> None:
+        """Закрывает простаивающие соединения сверх minconn. Вызывается под блокировкой."""
+        now = time.monotonic()
+        keep: List[Tuple[PGConnection, float]] = []
+        extra = self.size - self.minconn
+        for conn, since in self._idle:  # от самых старых к самым свежим
+            if extra > 0 and now - since > self.idle_timeout:
+                self._close_quietly(conn)
+                extra -= 1
+            else:
+                keep.append((conn, since))
+        self._idle = keep
+
+    @staticmethod
+    def _reset(conn: PGConnection) -> bool:
+        """Возвращает соединение в исходное состояние сессии. False — соединение непригодно."""
+        try:
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            if conn.autocommit:
+                conn.autocommit = False
+            with conn.cursor() as cur:
+                cur.execute("RESET ALL")
+            conn.commit()
+            return True
+        except Exception:
+            logging.warning("Соединение не прошло сброс при возврате в пул и будет закрыто.")
+            return False
+
+    @staticmethod
+    def _close_quietly(conn: PGConnection) -> None:
+        forget_prepared(conn)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+_POOL: Optional[ConnectionPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Общий для процесса пул; размеры задаются переменными PGPOOL_MIN / PGPOOL_MAX / PGPOOL_IDLE."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ConnectionPool(
+                minconn=int(os.getenv("PGPOOL_MIN", "1")),
+                maxconn=int(os.getenv("PGPOOL_MAX", "10")),
+                idle_timeout=float(os.getenv("PGPOOL_IDLE", "300")),
+            )
+        return _POOL
+
+
+def close_pool() -> None:
+    """Закрывает общий пул (при выходе из приложения)."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.closeall()
+            _POOL = None
+
+
+@contextmanager
+def pooled_connection() -> Iterator[PGConnection]:
+    """
+    Соединение из общего пула:
+        with pooled_connection() as conn:
+            rows = execute_select(conn, params)
+    При выходе соединение сбрасывается и возвращается в пул.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+
 def _humanize_pg_error(e: Exception) -> str:
     msg = str(e)
     mapping = {
@@ -51,6 +554,7 @@ def _humanize_pg_error(e: Exception) -> str:
         "duplicate object": "Объект уже существует.",
         "invalid input syntax": "Неверный формат данных для указанного типа.",
         "cannot drop column": "Нельзя удалить столбец: существуют зависимости или ограничения.",
+        "lock timeout": "Таблица занята другими запросами: блокировка не получена за lock_timeout.",
     }
     for k,v in mapping.items():
         if k in msg.lower():
@@ -73,7 +577,7 @@ def list_tables(conn: PGConnection, schemas: Optional[Sequence[str]]=None) -> Li
     if schemas:
         schema_filter = "and n.nspname = any(%s)"
         args=[list(schemas)]
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+    with conn.cursor(cursor_factory=InstrumentedRealDictCursor) as cur:
         cur.execute(q.format(schema_filter=schema_filter), args)
         return list(cur.fetchall())
 
@@ -91,7 +595,7 @@ def get_columns(conn: PGConnection, table: str, schema: str="public") -> List[Di
     where c.table_schema=%s and c.table_name=%s
     order by c.ordinal_position;
     """
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+    with conn.cursor(cursor_factory=InstrumentedRealDictCursor) as cur:
         cur.execute(q,(schema,table))
         return list(cur.fetchall())
 
@@ -106,12 +610,11 @@ def get_constraints(conn: PGConnection, table: str, schema: str="public") -> Lis
     where nsp.nspname=%s and rel.relname=%s
     order by 1;
     """
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+    with conn.cursor(cursor_factory=InstrumentedRealDictCursor) as cur:
         cur.execute(q,(schema,table))
         rows = list(cur.fetchall())
         for r in rows:
-            tmap = {'p':'PRIMARY KEY','u':'UNIQUE','f':'FOREIGN KEY','c':'CHECK'}
-            r['type_verbose'] = tmap.get(r['type'], r['type'])
+            r['type_verbose'] = CONSTRAINT_TYPES.get(r['type'], r['type'])
         return rows
 
 def get_foreign_keys(conn: PGConnection, table: str, schema: str="public") -> List[Dict[str,Any]]:
@@ -124,9 +627,323 @@ def get_foreign_keys(conn: PGConnection, table: str, schema: str="public") -> Li
     where con.contype='f' and nsp.nspname=%s and rel.relname=%s
     order by 1;
     """
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+    with conn.cursor(cursor_factory=InstrumentedRealDictCursor) as cur:
         cur.execute(q,(schema,table))
         return list(cur.fetchall())
+
+
+def get_column_dependents(conn: PGConnection, table: str, column: Optional[str] = None,
+                          schema: str = "public") -> List[Dict[str,Any]]:
+    """
+    Объекты, зависящие от столбца (или от всей таблицы при column=None) по pg_depend:
+    индексы, ограничения (в т.ч. внешние ключи других таблиц), представления, триггеры, связанные последовательности.
+    Значение по умолчанию столбца (pg_attrdef) не считается. kind: index, constraint, view, trigger, sequence, other.
+    """
+    q = """
+    select distinct
+        case when d.classid = 'pg_rewrite'::regclass then 'view ' || v.ev_class::regclass::text
+             else pg_describe_object(d.classid, d.objid, d.objsubid) end as object,
+        case
+            when d.classid = 'pg_rewrite'::regclass then 'view'
+            when d.classid = 'pg_constraint'::regclass then 'constraint'
+            when d.classid = 'pg_trigger'::regclass then 'trigger'
+            when d.classid = 'pg_class'::regclass and dc.relkind = 'i' then 'index'
+            when d.classid = 'pg_class'::regclass and dc.relkind = 'S' then 'sequence'
+            else 'other'
+        end as kind,
+        coalesce(v.ev_class::regclass::text, dc.oid::regclass::text) as relation
+    from pg_depend d
+    left join pg_class dc on d.classid = 'pg_class'::regclass and dc.oid = d.objid
+    left join pg_rewrite v on d.classid = 'pg_rewrite'::regclass and v.oid = d.objid
+    where d.refclassid = 'pg_class'::regclass
+      and d.refobjid = %s::regclass
+      and (%s::int is null or d.refobjsubid = %s::int)
+      and d.classid <> 'pg_attrdef'::regclass
+      and d.deptype in ('n', 'a')
+      and (v.ev_class is null or v.ev_class <> d.refobjid)
+    order by 2, 1;
+    """
+    with conn.cursor(cursor_factory=InstrumentedRealDictCursor) as cur:
+        attnum = None
+        if column is not None:
+            cur.execute("select attnum from pg_attribute where attrelid = %s::regclass and attname = %s "
+                        "and not attisdropped", (sql.Identifier(schema, table).as_string(conn), column))
+            row = cur.fetchone()
+            if row is None:
+                raise DBError(f"Столбец {column} не найден в таблице {schema}.{table}.")
+            attnum = row["attnum"]
+        cur.execute(q, (sql.Identifier(schema, table).as_string(conn), attnum, attnum))
+        return list(cur.fetchall())
+
+
+def audit_unindexed_foreign_keys(conn: PGConnection, schema: str = "public",
+                                 table: Optional[str] = None) -> List[Dict[str,Any]]:
+    """
+    Внешние ключи схемы (или одной таблицы), столбцы которых не образуют начало ни одного индекса
+    дочерней таблицы. Без такого индекса каждое удаление или изменение ключа в родительской таблице
+    сканирует дочернюю целиком. Поля: constraint, table, columns, ref_table, total_bytes
+    (pg_total_relation_size дочерней таблицы), rows (оценка reltuples); крупные таблицы — первыми.
+    """
+    q = """
+    select c.conname as constraint, cl.relname as table,
+           array_agg(a.attname order by k.ord) as columns,
+           c.confrelid::regclass::text as ref_table,
+           pg_total_relation_size(c.conrelid) as total_bytes,
+           greatest(cl.reltuples, 0)::bigint as rows
+    from pg_constraint c
+    join pg_class cl on cl.oid = c.conrelid
+    join pg_namespace n on n.oid = cl.relnamespace
+    cross join lateral unnest(c.conkey) with ordinality as k(attnum, ord)
+    join pg_attribute a on a.attrelid = c.conrelid and a.attnum = k.attnum
+    where c.contype = 'f' and n.nspname = %s and (%s::text is null or cl.relname = %s::text)
+      and not exists (
+          select 1 from pg_index i
+          where i.indrelid = c.conrelid and i.indisvalid and i.indpred is null
+            and (i.indkey::int2[])[0:cardinality(c.conkey) - 1] @> c.conkey
+            and (i.indkey::int2[])[0:cardinality(c.conkey) - 1] <@ c.conkey)
+    group by c.oid, c.conname, cl.relname, c.confrelid, c.conrelid, cl.reltuples
+    order by total_bytes desc, 1;
+    """
+    with conn.cursor(cursor_factory=InstrumentedRealDictCursor) as cur:
+        cur.execute(q, (schema, table, table))
+        return list(cur.fetchall())
+
+
+CONSTRAINT_TYPES = {'p':'PRIMARY KEY','u':'UNIQUE','f':'FOREIGN KEY','c':'CHECK'}
+
+
+def get_schema_catalog(conn: PGConnection, schema: str = "public",
+                       tables: Optional[Sequence[str]] = None) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+    """
+    Пакетная интроспекция: столбцы, ограничения и внешние ключи всех таблиц схемы
+    за три запроса к pg_class/pg_attribute/pg_constraint (по oid), независимо от числа таблиц.
+    tables — необязательный список имён, чтобы ограничиться частью схемы.
+    Возвращает {таблица: {"columns": [...], "constraints": [...], "foreign_keys": [...]}}
+    в тех же форматах, что get_columns / get_constraints / get_foreign_keys.
+    """
+    table_filter = ""
+    args: List[Any] = [schema]
+    if tables is not None:
+        table_filter = "and c.relname = any(%s)"
+        args.append(list(tables))
+
+    q_tables = """
+    select c.relname as table
+    from pg_class c
+    join pg_namespace n on n.oid = c.relnamespace
+    where c.relkind = 'r' and n.nspname = %s {table_filter}
+    order by 1;
+    """
+    # data_type вычисляется так же, как в information_schema.columns
+    q_columns = """
+    select c.relname as table,
+           a.attname as column_name,
+           case when t.typtype = 'd' then
+                case when bt.typelem <> 0 and bt.typlen = -1 then 'ARRAY'
+                     when nbt.nspname = 'pg_catalog' then format_type(t.typbasetype, null)
+                     else 'USER-DEFINED' end
+           else
+                case when t.typelem <> 0 and t.typlen = -1 then 'ARRAY'
+                     when nt.nspname = 'pg_catalog' then format_type(a.atttypid, null)
+                     else 'USER-DEFINED' end
+           end as data_type,
+           not (a.attnotnull or (t.typtype = 'd' and t.typnotnull)) as nullable,
+           case when a.attgenerated = '' then pg_get_expr(ad.adbin, ad.adrelid) end as column_default,
+           col_description(c.oid, a.attnum) as comment
+    from pg_attribute a
+    join pg_class c on c.oid = a.attrelid
+    join pg_namespace n on n.oid = c.relnamespace
+    join pg_type t on t.oid = a.atttypid
+    join pg_namespace nt on nt.oid = t.typnamespace
+    left join pg_type bt on t.typtype = 'd' and bt.oid = t.typbasetype
+    left join pg_namespace nbt on nbt.oid = bt.typnamespace
+    left join pg_attrdef ad on ad.adrelid = a.attrelid and ad.adnum = a.attnum
+    where c.relkind = 'r' and n.nspname = %s {table_filter}
+      and a.attnum > 0 and not a.attisdropped
+    order by c.relname, a.attnum;
+    """
+    q_constraints = """
+    select c.relname as table,
+           con.conname as name,
+           con.contype as type,
+           pg_get_constraintdef(con.oid) as definition
+    from pg_constraint con
+    join pg_class c on c.oid = con.conrelid
+    join pg_namespace n on n.oid = c.relnamespace
+    where c.relkind = 'r' and n.nspname = %s {table_filter}
+    order by c.relname, con.conname;
+    """
+    catalog: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+    with conn.cursor(cursor_factory=InstrumentedRealDictCursor) as cur:
+        cur.execute(q_tables.format(table_filter=table_filter), args)
+        for r in cur.fetchall():
+            catalog[r["table"]] = {"columns": [], "constraints": [], "foreign_keys": []}
+
+        cur.execute(q_columns.format(table_filter=table_filter), args)
+        for r in cur.fetchall():
+            entry = catalog.get(r.pop("table"))
+            if entry is not None:
+                entry["columns"].append(r)
+
+        cur.execute(q_constraints.format(table_filter=table_filter), args)
+        for r in cur.fetchall():
+            entry = catalog.get(r.pop("table"))
+            if entry is None:
+                continue
+            r["type_verbose"] = CONSTRAINT_TYPES.get(r["type"], r["type"])
+            entry["constraints"].append(r)
+            if r["type"] == "f":
+                entry["foreign_keys"].append({"name": r["name"], "definition": r["definition"]})
+    return catalog
+# -------- Catalog cache
+
+class CatalogCache:
+    """
+    Кэш метаданных таблиц в памяти процесса: (schema, table) -> столбцы, ограничения, внешние ключи.
+    Запись живёт ttl секунд; alter_table и создание таблиц сбрасывают её сразу,
+    изменения из других клиентов приходят через DDLListener (LISTEN/NOTIFY).
+    """
+
+    def __init__(self, ttl: float = 300.0):
+        self.ttl = ttl
+        self._data: Dict[Tuple[str, str], Tuple[float, Dict[str, List[Dict[str, Any]]]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, conn: PGConnection, table: str, schema: str = "public") -> Dict[str, List[Dict[str, Any]]]:
+        key = (schema, table)
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is not None and time.monotonic() - hit[0] < self.ttl:
+                return hit[1]
+        entry = get_schema_catalog(conn, schema, [table]).get(table)
+        if entry is None:
+            # несуществующие таблицы не кэшируем: её могут создать в любой момент
+            return {"columns": [], "constraints": [], "foreign_keys": []}
+        with self._lock:
+            self._data[key] = (time.monotonic(), entry)
+        return entry
+
+    def columns(self, conn: PGConnection, table: str, schema: str = "public") -> List[Dict[str, Any]]:
+        return self.get(conn, table, schema)["columns"]
+
+    def constraints(self, conn: PGConnection, table: str, schema: str = "public") -> List[Dict[str, Any]]:
+        return self.get(conn, table, schema)["constraints"]
+
+    def foreign_keys(self, conn: PGConnection, table: str, schema: str = "public") -> List[Dict[str, Any]]:
+        return self.get(conn, table, schema)["foreign_keys"]
+
+    def invalidate(self, schema: Optional[str] = None, table: Optional[str] = None) -> None:
+        """Сбрасывает записи; None означает «любая схема» / «любая таблица»."""
+        with self._lock:
+            for key in [k for k in self._data
+                        if (schema is None or k[0] == schema) and (table is None or k[1] == table)]:
+                del self._data[key]
+
+
+CATALOG_CACHE = CatalogCache(ttl=float(os.getenv("DBW_CATALOG_TTL", "300")))
+
+DDL_NOTIFY_CHANNEL = "dbw_ddl"
+
+
+def install_ddl_notify_trigger(conn: PGConnection) -> None:
+    """
+    Создаёт event trigger, который после любой DDL-команды (и DROP) отправляет
+    NOTIFY dbw_ddl с именем затронутой схемы. Требует прав суперпользователя.
+    """
+    ddl = f"""
+    create or replace function dbw_notify_ddl() returns event_trigger language plpgsql as $$
+    declare r record;
+    begin
+        if tg_event = 'sql_drop' then
+            for r in select distinct schema_name from pg_event_trigger_dropped_objects()
+                     where schema_name is not null loop
+                perform pg_notify('{DDL_NOTIFY_CHANNEL}', r.schema_name);
+            end loop;
+        else
+            for r in select distinct schema_name from pg_event_trigger_ddl_commands()
+                     where schema_name is not null loop
+                perform pg_notify('{DDL_NOTIFY_CHANNEL}', r.schema_name);
+            end loop;
+        end if;
+    end $$;
+    drop event trigger if exists dbw_ddl_end;
+    create event trigger dbw_ddl_end on ddl_command_end execute function dbw_notify_ddl();
+    drop event trigger if exists dbw_ddl_drop;
+    create event trigger dbw_ddl_drop on sql_drop execute function dbw_notify_ddl();
+    """
+    try:
+        with conn.cursor() as cur:
+            cur.execute(ddl)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        raise DBError(_humanize_pg_error(e))
+
+
+def ddl_notify_trigger_installed(conn: PGConnection) -> bool:
+    with conn.cursor() as cur:
+        cur.execute("select count(*) from pg_event_trigger where evtname in ('dbw_ddl_end', 'dbw_ddl_drop')")
+        installed = cur.fetchone()[0] == 2
+    conn.rollback()
+    return installed
+
+
+class DDLListener(threading.Thread):
+    """
+    Фоновый поток: держит отдельное (не из пула) соединение с LISTEN dbw_ddl
+    и сбрасывает CatalogCache по уведомлениям. При обрыве переподключается;
+    после переподключения кэш сбрасывается целиком, т.к. уведомления могли быть пропущены.
+    """
+
+    def __init__(self, cache: CatalogCache, channel: str = DDL_NOTIFY_CHANNEL,
+                 connect: Callable[[], PGConnection] = get_connection, poll_interval: float = 5.0,
+                 install_trigger: bool = True):
+        super().__init__(name="dbw-ddl-listener", daemon=True)
+        self._cache = cache
+        self._channel = channel
+        self._connect = connect
+        self._poll_interval = poll_interval
+        self._install_trigger = install_trigger
+        self._stop_event = threading.Event()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def run(self) -> None:
+        retry = self._poll_interval
+        while not self._stop_event.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                if self._install_trigger and not ddl_notify_trigger_installed(conn):
+                    try:
+                        install_ddl_notify_trigger(conn)
+                    except DBError as e:
+                        logging.warning("DDL event trigger не установлен, кэш каталога обновляется по TTL: %s", e)
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(sql.SQL("LISTEN {}").format(sql.Identifier(self._channel)))
+                self._cache.invalidate()
+                retry = self._poll_interval
+                while not self._stop_event.is_set():
+                    if select.select([conn], [], [], self._poll_interval) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        note = conn.notifies.pop(0)
+                        self._cache.invalidate(schema=note.payload or None)
+            except Exception as e:
+                logging.warning("Слушатель DDL-уведомлений: %s", e)
+                self._stop_event.wait(retry)
+                retry = min(retry * 2, 60.0)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+
 # -------- ALTER TABLE transactional API --------
 
 @dataclass
@@ -135,7 +952,7 @@ class AlterAction:
         "add_column", "drop_column", "rename_column", "rename_table",
         "alter_type", "set_not_null", "drop_not_null",
         "add_unique", "drop_constraint", "add_check",
-        "add_foreign_key"
+        "add_foreign_key", "create_index"
     ]
     table: str
     column: Optional[str] = None
@@ -149,67 +966,590 @@ class AlterAction:
     extra: Dict[str, Any] = field(default_factory=dict)
 
 
-def alter_table(conn: PGConnection, actions: Sequence[AlterAction]) -> str:
+def _index_command(a: AlterAction) -> Tuple[sql.Composable, str]:
     """
-    Выполняет несколько операций ALTER TABLE в одной транзакции.
-    При ошибке все изменения откатываются.
+    CREATE INDEX CONCURRENTLY для действия create_index. Столбцы — extra["columns"] (или column),
+    элемент может оканчиваться на ASC/DESC; extra: method (btree/gin/gist/brin/hash), opclass,
+    unique. Имя индекса — constraint_name или <таблица>_<столбцы>_idx.
+    """
+    cols = a.extra.get("columns") or ([a.column] if a.column else [])
+    if not cols:
+        raise DBError("Для индекса не заданы столбцы.")
+    method = a.extra.get("method", "btree").lower()
+    if method not in ("btree", "gin", "gist", "brin", "hash"):
+        raise DBError(f"Неизвестный метод индекса: {method}")
+    opclass = a.extra.get("opclass")
+    if opclass and not re.fullmatch(r"\w+", opclass):
+        raise DBError(f"Некорректный класс операторов: {opclass}")
+    items, names = [], []
+    for c in cols:
+        parts = c.split()
+        direction = parts.pop().upper() if len(parts) > 1 and parts[-1].upper() in ("ASC", "DESC") else ""
+        name = " ".join(parts)
+        names.append(name)
+        item = sql.Identifier(name)
+        if opclass:
+            item = item + sql.SQL(" " + opclass)
+        if direction:
+            item = item + sql.SQL(" " + direction)
+        items.append(item)
+    index_name = a.constraint_name or f"{a.table}_{'_'.join(names)}_idx"[:63]
+    cmd = sql.SQL("CREATE {}INDEX CONCURRENTLY IF NOT EXISTS {} ON {} USING {} ({})").format(
+        sql.SQL("UNIQUE ") if a.extra.get("unique") else sql.SQL(""),
+        sql.Identifier(index_name), sql.Identifier(a.table), sql.SQL(method), sql.SQL(", ").join(items))
+    return cmd, index_name
+
+
+ALTER_LOCK_TIMEOUT_MS = int(os.getenv("DBW_ALTER_LOCK_TIMEOUT_MS", "2000"))  # безопасный режим alter_table
+ALTER_LOCK_RETRIES = int(os.getenv("DBW_ALTER_LOCK_RETRIES", "5"))
+ALTER_RETRY_BACKOFF = 0.5  # секунд перед первым повтором, дальше вдвое больше
+_LOCK_NOT_AVAILABLE = "55P03"
+
+
+def _constraint_name(a: AlterAction) -> str:
+    if a.constraint_name:
+        return a.constraint_name
+    if a.kind == "add_unique":
+        return f"{a.table}_{a.column}_uniq"
+    if a.kind == "add_check":
+        return f"{a.table}_check_{abs(hash(a.check_expr))%9999}"
+    if a.kind == "add_foreign_key":
+        return f"{a.table}_{a.column}_fk"
+    if a.kind == "set_not_null":
+        return f"{a.table}_{a.column}_not_null"[:63]
+    raise DBError(f"Для действия {a.kind} не задано имя ограничения")
+
+
+def _alter_clause(a: AlterAction) -> sql.Composable:
+    """Подкоманда ALTER TABLE <таблица> для одного действия."""
+    if a.kind == "add_column":
+        return sql.SQL("ADD COLUMN {} {}").format(sql.Identifier(a.column), sql.SQL(a.data_type))
+    if a.kind == "drop_column":
+        return sql.SQL("DROP COLUMN {} {}").format(
+            sql.Identifier(a.column), sql.SQL("CASCADE") if a.cascade else sql.SQL(""))
+    if a.kind == "rename_column":
+        return sql.SQL("RENAME COLUMN {} TO {}").format(sql.Identifier(a.column), sql.Identifier(a.new_name))
+    if a.kind == "rename_table":
+        return sql.SQL("RENAME TO {}").format(sql.Identifier(a.new_name))
+    if a.kind == "alter_type":
+        return sql.SQL("ALTER COLUMN {} TYPE {}").format(sql.Identifier(a.column), sql.SQL(a.data_type))
+    if a.kind == "set_not_null":
+        return sql.SQL("ALTER COLUMN {} SET NOT NULL").format(sql.Identifier(a.column))
+    if a.kind == "drop_not_null":
+        return sql.SQL("ALTER COLUMN {} DROP NOT NULL").format(sql.Identifier(a.column))
+    if a.kind == "add_unique":
+        return sql.SQL("ADD CONSTRAINT {} UNIQUE ({})").format(
+            sql.Identifier(_constraint_name(a)), sql.Identifier(a.column))
+    if a.kind == "add_check":
+        return sql.SQL("ADD CONSTRAINT {} CHECK ({})").format(
+            sql.Identifier(_constraint_name(a)), sql.SQL(a.check_expr))
+    if a.kind == "add_foreign_key":
+        return sql.SQL("ADD CONSTRAINT {} FOREIGN KEY ({}) REFERENCES {}({})").format(
+            sql.Identifier(_constraint_name(a)),
+            sql.Identifier(a.column),
+            sql.Identifier(a.ref_table),
+            sql.Identifier(a.ref_column),
+        )
+    if a.kind == "drop_constraint":
+        return sql.SQL("DROP CONSTRAINT {}").format(sql.Identifier(a.constraint_name))
+    raise DBError(f"Неизвестный тип действия: {a.kind}")
+
+
+def _alter_statement(table: str, clause: sql.Composable) -> sql.Composable:
+    return sql.SQL("ALTER TABLE {} ").format(sql.Identifier(table)) + clause
+
+
+# Влияние подкоманды на таблицу: metadata — только каталог; scan — чтение всей таблицы
+# (проверка ограничения, построение индекса); rewrite — перезапись таблицы и всех её индексов.
+_EFFECT_RANK = {"metadata": 0, "scan": 1, "rewrite": 2}
+_KIND_EFFECT = {
+    "add_column": "metadata", "drop_column": "metadata", "rename_column": "metadata", "rename_table": "metadata",
+    "alter_type": "rewrite", "set_not_null": "scan", "drop_not_null": "metadata",
+    "add_unique": "scan", "add_check": "scan", "add_foreign_key": "scan", "drop_constraint": "metadata",
+    "validate": "scan", "create_index": "scan",
+}
+# Значения по умолчанию, вычисляемые для каждой строки, и GENERATED ... STORED вынуждают ADD COLUMN
+# перезаписать таблицу; константа (PostgreSQL 11+) хранится только в каталоге.
+_VOLATILE_COLUMN_RE = re.compile(
+    r"\b(?:small|big)?serial\b|\b(?:random|clock_timestamp|timeofday|gen_random_uuid|uuid_generate_v[14]|nextval)"
+    r"\s*\(|\bgenerated\s+always\s+as\s*\(", re.IGNORECASE)
+# Порядок подкоманд внутри одного ALTER TABLE — как проходы, которыми их выполняет PostgreSQL
+_PASS_ORDER = {"drop_constraint": 0, "drop_column": 0, "alter_type": 1, "add_column": 2, "drop_not_null": 3,
+               "add_unique": 4, "add_check": 5, "add_foreign_key": 5, "set_not_null": 6}
+_RENAMES = ("rename_column", "rename_table")
+
+
+@dataclass
+class AlterStep:
+    """
+    Одна команда плана alter_table. phase: main — первая транзакция, validate — VALIDATE CONSTRAINT
+    (каждая своей транзакцией), finalize — завершение безопасного SET NOT NULL, index — CREATE INDEX
+    CONCURRENTLY (clauses — готовая команда). effect — metadata, scan или rewrite: сколько раз
+    таблица будет прочитана или перезаписана. depends_on — другие таблицы, к которым обращается команда;
+    columns — затронутые столбцы таблицы; constraints — имена затронутых ограничений.
+    """
+    table: str
+    clauses: List[sql.Composable]
+    kinds: List[str]
+    effect: str
+    phase: str = "main"
+    depends_on: Set[str] = field(default_factory=set)
+    columns: List[str] = field(default_factory=list)
+    constraints: List[str] = field(default_factory=list)
+
+    @property
+    def statement(self) -> sql.Composable:
+        if self.phase == "index":
+            return self.clauses[0]
+        return _alter_statement(self.table, sql.SQL(", ").join(self.clauses))
+
+    def to_sql(self, conn: PGConnection) -> str:
+        return self.statement.as_string(conn)
+
+
+def _step(table: str, clause: sql.Composable, kind: str, phase: str = "main", effect: Optional[str] = None,
+          depends_on: Optional[Set[str]] = None, column: Optional[str] = None,
+          constraint: Optional[str] = None) -> AlterStep:
+    return AlterStep(table, [clause], [kind], effect or _KIND_EFFECT[kind], phase, depends_on or set(),
+                     [column] if column else [], [constraint] if constraint else [])
+
+
+def _action_effect(a: AlterAction) -> str:
+    if a.kind == "add_column" and _VOLATILE_COLUMN_RE.search(a.data_type or ""):
+        return "rewrite"
+    return _KIND_EFFECT[a.kind]
+
+
+def _merge_steps(steps: Sequence[AlterStep]) -> List[AlterStep]:
+    """
+    Сливает подкоманды одной таблицы в один ALTER TABLE: все перезаписи и проверки такой команды
+    PostgreSQL выполняет за один проход по таблице и под одной блокировкой. Порядок действий
+    сохраняется там, где он важен: RENAME нельзя объединять с другими подкомандами, поэтому
+    он разделяет команды своей таблицы, а подкоманда, ссылающаяся на другую таблицу (FOREIGN KEY),
+    не меняется местами с командами той таблицы. Подкоманда, затрагивающая столбец или ограничение
+    из уже открытой команды, начинает новую: внутри одного ALTER TABLE PostgreSQL выполняет подкоманды
+    по проходам, а не в заданном порядке (SET NOT NULL, затем DROP NOT NULL дали бы NOT NULL).
     """
-    commands = []
+    merged: List[AlterStep] = []
+    open_: Dict[str, int] = {}  # таблица -> индекс команды, к которой ещё можно присоединять подкоманды
+    last: Dict[str, int] = {}  # таблица -> индекс последней команды, изменившей её
+    for st in steps:
+        renamed = st.kinds[0] in _RENAMES
+        target = open_.get(st.table)
+        if (renamed or target is None or any(last.get(t, -1) > target for t in st.depends_on)
+                or set(st.columns) & set(merged[target].columns)
+                or set(st.constraints) & set(merged[target].constraints)):
+            merged.append(replace(st, clauses=list(st.clauses), kinds=list(st.kinds), depends_on=set(st.depends_on),
+                                  columns=list(st.columns), constraints=list(st.constraints)))
+            target = len(merged) - 1
+            if renamed:
+                open_.pop(st.table, None)
+            else:
+                open_[st.table] = target
+        else:
+            m = merged[target]
+            m.clauses.extend(st.clauses)
+            m.kinds.extend(st.kinds)
+            m.depends_on |= st.depends_on
+            m.columns.extend(c for c in st.columns if c not in m.columns)
+            m.constraints.extend(c for c in st.constraints if c not in m.constraints)
+            if _EFFECT_RANK[st.effect] > _EFFECT_RANK[m.effect]:
+                m.effect = st.effect
+        last[st.table] = target
+        for t in st.depends_on:
+            # последующие изменения связанной таблицы не переносятся раньше этой команды
+            open_.pop(t, None)
+            if renamed:
+                last[t] = target
+    # подкоманды одной команды не пересекаются по столбцам и ограничениям, поэтому их можно
+    # расставить по проходам PostgreSQL, не меняя результата
+    for m in merged:
+        order = sorted(range(len(m.kinds)), key=lambda i: _PASS_ORDER.get(m.kinds[i], 0))
+        m.clauses = [m.clauses[i] for i in order]
+        m.kinds = [m.kinds[i] for i in order]
+    return merged
+
+
+@dataclass
+class _AlterPlan:
+    """Команды alter_table по транзакциям."""
+    main: List[AlterStep] = field(default_factory=list)
+    validate: List[AlterStep] = field(default_factory=list)  # каждая — своей транзакцией
+    finalize: List[AlterStep] = field(default_factory=list)
+    indexes: List[Tuple[str, sql.Composable, str]] = field(default_factory=list)  # (таблица, команда, имя)
+    added_constraints: List[Tuple[str, str]] = field(default_factory=list)  # снимаются, если проверка не прошла
+
+    @property
+    def steps(self) -> List[AlterStep]:
+        return (self.main + self.validate + self.finalize +
+                [_step(table, cmd, "create_index", phase="index") for table, cmd, _ in self.indexes])
+
+
+def _plan_alter(actions: Sequence[AlterAction], safe: bool, merge: bool = True,
+                effect: Callable[[AlterAction], str] = _action_effect) -> _AlterPlan:
+    """effect — оценка влияния действия (dry_run_alter уточняет её по каталогу)."""
+    plan = _AlterPlan()
     for a in actions:
-        t = sql.Identifier(a.table)
-        if a.kind == "add_column":
-            cmd = sql.SQL("ALTER TABLE {} ADD COLUMN {} {}").format(
-                t, sql.Identifier(a.column), sql.SQL(a.data_type))
-        elif a.kind == "drop_column":
-            cmd = sql.SQL("ALTER TABLE {} DROP COLUMN {} {}").format(
-                t, sql.Identifier(a.column),
-                sql.SQL("CASCADE") if a.cascade else sql.SQL(""))
-        elif a.kind == "rename_column":
-            cmd = sql.SQL("ALTER TABLE {} RENAME COLUMN {} TO {}").format(
-                t, sql.Identifier(a.column), sql.Identifier(a.new_name))
-        elif a.kind == "rename_table":
-            cmd = sql.SQL("ALTER TABLE {} RENAME TO {}").format(
-                t, sql.Identifier(a.new_name))
-        elif a.kind == "alter_type":
-            cmd = sql.SQL("ALTER TABLE {} ALTER COLUMN {} TYPE {}").format(
-                t, sql.Identifier(a.column), sql.SQL(a.data_type))
-        elif a.kind == "set_not_null":
-            cmd = sql.SQL("ALTER TABLE {} ALTER COLUMN {} SET NOT NULL").format(
-                t, sql.Identifier(a.column))
-        elif a.kind == "drop_not_null":
-            cmd = sql.SQL("ALTER TABLE {} ALTER COLUMN {} DROP NOT NULL").format(
-                t, sql.Identifier(a.column))
-        elif a.kind == "add_unique":
-            cname = a.constraint_name or f"{a.table}_{a.column}_uniq"
-            cmd = sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} UNIQUE ({})").format(
-                t, sql.Identifier(cname), sql.Identifier(a.column))
-        elif a.kind == "add_check":
-            cname = a.constraint_name or f"{a.table}_check_{abs(hash(a.check_expr))%9999}"
-            cmd = sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} CHECK ({})").format(
-                t, sql.Identifier(cname), sql.SQL(a.check_expr))
-        elif a.kind == "add_foreign_key":
-            cname = a.constraint_name or f"{a.table}_{a.column}_fk"
-            cmd = sql.SQL(
-                "ALTER TABLE {} ADD CONSTRAINT {} FOREIGN KEY ({}) REFERENCES {}({})"
-            ).format(
-                t, sql.Identifier(cname),
-                sql.Identifier(a.column),
-                sql.Identifier(a.ref_table),
-                sql.Identifier(a.ref_column),
-            )
-        elif a.kind == "drop_constraint":
-            cmd = sql.SQL("ALTER TABLE {} DROP CONSTRAINT {}").format(
-                t, sql.Identifier(a.constraint_name))
+        if a.kind == "create_index":
+            plan.indexes.append((a.table, *_index_command(a)))
+        elif safe and a.kind in ("add_check", "add_foreign_key"):
+            name = _constraint_name(a)
+            refs = {a.ref_table} if a.kind == "add_foreign_key" and a.ref_table != a.table else set()
+            plan.main.append(_step(a.table, _alter_clause(a) + sql.SQL(" NOT VALID"), a.kind,
+                                   effect="metadata", depends_on=refs, column=a.column, constraint=name))
+            plan.validate.append(_step(a.table, sql.SQL("VALIDATE CONSTRAINT {}").format(sql.Identifier(name)),
+                                       "validate", phase="validate"))
+            plan.added_constraints.append((a.table, name))
+        elif safe and a.kind == "set_not_null":
+            # PostgreSQL 12+ не сканирует таблицу при SET NOT NULL, если есть проверенный CHECK (col IS NOT NULL)
+            name = _constraint_name(a)
+            plan.main.append(_step(a.table, sql.SQL("ADD CONSTRAINT {} CHECK ({} IS NOT NULL) NOT VALID").format(
+                sql.Identifier(name), sql.Identifier(a.column)), "add_check", effect="metadata", column=a.column,
+                constraint=name))
+            plan.validate.append(_step(a.table, sql.SQL("VALIDATE CONSTRAINT {}").format(sql.Identifier(name)),
+                                       "validate", phase="validate"))
+            plan.added_constraints.append((a.table, name))
+            plan.finalize.append(_step(a.table, _alter_clause(a), a.kind, phase="finalize", effect="metadata",
+                                       column=a.column))
+            plan.finalize.append(_step(a.table, sql.SQL("DROP CONSTRAINT {}").format(sql.Identifier(name)),
+                                       "drop_constraint", phase="finalize"))
         else:
-            raise DBError(f"Неизвестный тип действия: {a.kind}")
-        commands.append(cmd)
+            if a.kind == "add_foreign_key" and a.ref_table != a.table:
+                refs = {a.ref_table}
+            elif a.kind == "rename_table":
+                refs = {a.new_name}
+            else:
+                refs = set()
+            if a.kind == "drop_constraint":
+                name = a.constraint_name
+            elif a.kind in ("add_unique", "add_check", "add_foreign_key"):
+                name = _constraint_name(a)
+            else:
+                name = None
+            plan.main.append(_step(a.table, _alter_clause(a), a.kind, effect=effect(a), depends_on=refs,
+                                   column=a.column, constraint=name))
+    if merge:
+        # finalize не сливается: в одной команде DROP CONSTRAINT выполнился бы раньше SET NOT NULL
+        # и тот просканировал бы таблицу
+        plan.main = _merge_steps(plan.main)
+    return plan
+
+
+def plan_alter(actions: Sequence[AlterAction], safe: bool = False, merge: bool = True) -> List[AlterStep]:
+    """
+    Команды, которые выполнит alter_table(actions, safe), в порядке выполнения. С merge=True
+    подкоманды одной таблицы объединяются в один ALTER TABLE (см. _merge_steps): несколько
+    изменений типа и добавлений столбцов перезаписывают таблицу один раз, а не по разу на действие.
+    По effect шагов видно, какие команды перезапишут или просканируют таблицу.
+    """
+    return _plan_alter(actions, safe, merge).steps
+
+
+def _missing_fk_indexes(conn: PGConnection, actions: Sequence[AlterAction],
+                        schema: str = "public") -> List[AlterAction]:
+    """
+    Действия create_index для внешних ключей из actions, столбец которых не начинает ни один
+    индекс таблицы — ни существующий, ни создаваемый тем же набором действий (create_index, add_unique).
+    """
+    planned = {(a.table, (a.extra.get("columns") or [a.column])[0].split()[0])
+               for a in actions if a.kind == "create_index" and (a.extra.get("columns") or a.column)}
+    planned |= {(a.table, a.column) for a in actions if a.kind == "add_unique"}
+    missing: List[AlterAction] = []
+    with conn.cursor() as cur:
+        for a in actions:
+            if a.kind != "add_foreign_key" or (a.table, a.column) in planned:
+                continue
+            cur.execute("""
+                select exists (
+                    select 1 from pg_index i
+                    join pg_attribute at on at.attrelid = i.indrelid and at.attnum = i.indkey[0]
+                    where i.indrelid = to_regclass(%s) and at.attname = %s and i.indisvalid and i.indpred is null)
+            """, (sql.Identifier(schema, a.table).as_string(conn), a.column))
+            if not cur.fetchone()[0]:
+                missing.append(AlterAction(kind="create_index", table=a.table, column=a.column))
+                planned.add((a.table, a.column))
+    conn.rollback()
+    return missing
+
+
+# ---- Оценка последствий (dry run)
+
+ALTER_EXPENSIVE_SECONDS = float(os.getenv("DBW_ALTER_EXPENSIVE_SECONDS", "10"))
+ALTER_EXPENSIVE_BYTES = int(os.getenv("DBW_ALTER_EXPENSIVE_MB", "1024")) * 1024 * 1024
+IO_PROBE_PAGES = 1280  # замер скорости чтения — первые ~10 МБ таблицы
+IO_THROUGHPUT_FALLBACK = 100 * 1024 * 1024  # байт/с, если замерить не удалось
+REWRITE_IO_FACTOR = 3  # перезапись: чтение таблицы, запись новой копии и WAL
+
+_LOCK_LEVELS = ["ACCESS SHARE", "SHARE UPDATE EXCLUSIVE", "SHARE", "SHARE ROW EXCLUSIVE", "ACCESS EXCLUSIVE"]
+_BLOCKING_LOCKS = {"SHARE", "SHARE ROW EXCLUSIVE", "ACCESS EXCLUSIVE"}  # блокируют запись в таблицу
+_KIND_LOCK = {"add_foreign_key": "SHARE ROW EXCLUSIVE", "validate": "SHARE UPDATE EXCLUSIVE",
+              "create_index": "SHARE UPDATE EXCLUSIVE"}  # остальные подкоманды — ACCESS EXCLUSIVE
+
+
+@dataclass
+class AlterImpact:
+    """
+    Последствия одной команды плана alter_table: блокировка, перезапись или сканирование,
+    размер таблицы (table_bytes — куча, total_bytes — с индексами и TOAST, pg_total_relation_size),
+    зависимые индексы и представления, грубая оценка длительности по замеренной скорости чтения.
+    expensive — долгая команда под блокировкой, запрещающей запись: требует отдельного подтверждения.
+    """
+    step: AlterStep
+    sql: str
+    lock: str
+    table_bytes: int
+    total_bytes: int
+    dependents: List[Dict[str, Any]]
+    estimated_seconds: float
+    expensive: bool
+    notes: List[str] = field(default_factory=list)
+
+    @property
+    def rewrite(self) -> bool:
+        return self.step.effect == "rewrite"
+
+    @property
+    def scan(self) -> bool:
+        return self.step.effect in ("scan", "rewrite")
+
+
+_TYPE_NAME_RE = re.compile(r'[A-Za-z_"][\w ."]*(\(\s*\d+\s*(,\s*-?\d+\s*)?\))?[\w ]*(\[\d*\])*')
+
+
+def _type_change_rewrites(cur, schema: str, table: str, column: str, data_type: str) -> bool:
+    """
+    Перезапишет ли ALTER COLUMN TYPE таблицу: не перезаписывает при двоично-совместимом приведении
+    без модификатора (varchar -> text и т.п.) и при снятии или увеличении ограничения длины того же типа.
+    Модификатор целевого типа (text -> varchar(n), numeric -> numeric(p,s)) требует проверки каждого
+    значения, USING — вычисления выражения: такие изменения считаются перезаписью.
+    """
+    type_text, *using = re.split(r"\s+using\s", data_type.strip(), maxsplit=1, flags=re.IGNORECASE)
+    type_text = re.split(r"\s+collate\s", type_text, maxsplit=1, flags=re.IGNORECASE)[0].strip()
+    if not _TYPE_NAME_RE.fullmatch(type_text):
+        raise DBError(f"Некорректный тип столбца: {data_type}")
+    has_typmod = "(" in type_text
+    cur.execute("""
+        select a.atttypid, a.atttypmod, t.oid as new_oid,
+               exists (select 1 from pg_cast c where c.castsource = a.atttypid and c.casttarget = t.oid
+                       and c.castmethod = 'b') as binary_cast
+        from pg_attribute a, (select to_regtype(%s)::oid as oid) t
+        where a.attrelid = to_regclass(%s) and a.attname = %s and not a.attisdropped
+    """, (re.sub(r"\(.*?\)", "", type_text).strip(), sql.Identifier(schema, table).as_string(cur.connection), column))
+    row = cur.fetchone()
+    if row is None or not row[2] or using:
+        return True
+    old_oid, old_mod, new_oid, binary_cast = row
+    if old_oid != new_oid:
+        return not binary_cast or has_typmod
+    if old_oid == 1043:  # varchar: typmod = длина + 4, -1 — без ограничения
+        m = re.search(r"\(\s*(\d+)\s*\)", type_text)
+        return m is not None and (old_mod < 0 or int(m.group(1)) + 4 < old_mod)
+    # тот же тип без модификатора только снимает ограничение; с модификатором — считаем, что перезапишет
+    return has_typmod
+
+
+def _measure_io_throughput(conn: PGConnection, schema: str, table: str) -> Optional[float]:
+    """
+    Скорость последовательного чтения таблицы, байт/с: время чтения первых IO_PROBE_PAGES страниц
+    (TID Range Scan, PostgreSQL 14+ — читаются только эти страницы). Страницы из кэша завышают
+    скорость, поэтому оценка длительности получается скорее оптимистичной. None — замер не удался
+    (тайм-аут, блокировка, нет права SELECT): тогда используется IO_THROUGHPUT_FALLBACK.
+    """
+    if conn.server_version < 140000:
+        return None
+    try:
+        with conn.cursor() as cur:
+            cur.execute("select relpages from pg_class where oid = to_regclass(%s)",
+                        (sql.Identifier(schema, table).as_string(conn),))
+            row = cur.fetchone()
+            pages = min(row[0], IO_PROBE_PAGES) if row else 0
+            if pages < 128:  # меньше 1 МБ — замер бессмыслен
+                conn.rollback()
+                return None
+            cur.execute("SET LOCAL statement_timeout = '5s'")
+            t0 = time.perf_counter()
+            cur.execute(sql.SQL("select count(*) from {} where ctid < %s::tid").format(sql.Identifier(schema, table)),
+                        (f"({pages},0)",))
+            elapsed = time.perf_counter() - t0
+    except psycopg2.Error as e:
+        conn.rollback()
+        logging.info("Замер скорости чтения %s не удался: %s", table, _humanize_pg_error(e))
+        return None
+    conn.rollback()
+    return pages * 8192 / max(elapsed, 1e-3)
+
+
+def dry_run_alter(conn: PGConnection, actions: Sequence[AlterAction], safe: bool = False, merge: bool = True,
+                  throughput: Optional[float] = None, schema: str = "public",
+                  index_foreign_keys: bool = False) -> List[AlterImpact]:
+    """
+    Последствия alter_table(actions, safe, merge=merge, index_foreign_keys=...) без выполнения —
+    по одной записи на команду плана. Внешние ключи без поддерживающего индекса отмечаются в notes.
+    Смена типа проверяется по каталогу (двоично-совместимые приведения не перезаписывают таблицу).
+    throughput — скорость чтения в байт/с; по умолчанию замеряется на самой большой таблице из actions.
+    Перезапись оценивается как REWRITE_IO_FACTOR объёмов таблицы с индексами, сканирование — как чтение кучи.
+    """
+    try:
+        missing = _missing_fk_indexes(conn, actions, schema)
+        if index_foreign_keys:
+            actions, missing = [*actions, *missing], []
+        with conn.cursor() as cur:
+            def effect(a: AlterAction) -> str:
+                if a.kind == "alter_type" and not _type_change_rewrites(cur, schema, a.table, a.column, a.data_type):
+                    return "metadata"
+                return _action_effect(a)
+
+            plan = _plan_alter(actions, safe, merge, effect=effect)
+            sizes: Dict[str, Optional[Tuple[int, int]]] = {}
+            for t in {st.table for st in plan.steps}:
+                cur.execute("""
+                    select pg_relation_size(r), pg_total_relation_size(r)
+                    from (select to_regclass(%s) as r) x where r is not null
+                """, (sql.Identifier(schema, t).as_string(conn),))
+                row = cur.fetchone()
+                sizes[t] = (row[0], row[1]) if row else None
+        conn.rollback()
+        existing = [t for t in sizes if sizes[t]]
+        if throughput is None and existing:
+            largest = max(existing, key=lambda t: sizes[t][0])
+            throughput = _measure_io_throughput(conn, schema, largest)
+        fallback = not throughput
+        throughput = throughput or IO_THROUGHPUT_FALLBACK
+
+        impacts = []
+        for st in plan.steps:
+            kinds = ["create_index"] if st.phase == "index" else st.kinds
+            lock = max((_KIND_LOCK.get(k, "ACCESS EXCLUSIVE") for k in kinds), key=_LOCK_LEVELS.index)
+            table_bytes, total_bytes = sizes[st.table] or (0, 0)
+            notes: List[str] = []
+            dependents: List[Dict[str, Any]] = []
+            if sizes[st.table] is None:
+                notes.append(f"таблица {st.table} не найдена (возможно, создаётся раньше в этом же плане)")
+            elif st.effect == "rewrite":
+                # перезапись перестраивает все индексы таблицы
+                dependents = [d for d in get_column_dependents(conn, st.table, schema=schema)
+                              if d["kind"] in ("index", "view")]
+            else:
+                for c in st.columns:
+                    if {"alter_type", "drop_column", "rename_column"} & set(st.kinds):
+                        try:
+                            dependents += [d for d in get_column_dependents(conn, st.table, c, schema)
+                                           if d["kind"] in ("index", "view") and d not in dependents]
+                        except DBError:
+                            pass
+            if "add_foreign_key" in st.kinds:
+                notes.extend(f"нет индекса по {m.table}.{m.column}: удаления и изменения ключей в родительской "
+                             f"таблице будут сканировать {m.table}" for m in missing
+                             if m.table == st.table and m.column in st.columns)
+            if "alter_type" in st.kinds and any(d["kind"] == "view" for d in dependents):
+                notes.append("смена типа столбца, используемого представлением, завершится ошибкой")
+            if fallback and st.effect != "metadata" and sizes[st.table]:
+                notes.append(f"скорость чтения не замерена: длительность оценена по "
+                             f"{IO_THROUGHPUT_FALLBACK / 2**20:.0f} МБ/с (IO_THROUGHPUT_FALLBACK)")
+            if st.effect == "rewrite":
+                seconds = total_bytes * REWRITE_IO_FACTOR / throughput
+            elif st.effect == "scan":
+                seconds = table_bytes / throughput
+            else:
+                seconds = 0.0
+            expensive = (st.effect != "metadata" and lock in _BLOCKING_LOCKS
+                         and (seconds >= ALTER_EXPENSIVE_SECONDS or total_bytes >= ALTER_EXPENSIVE_BYTES))
+            impacts.append(AlterImpact(st, st.to_sql(conn), lock, table_bytes, total_bytes, dependents,
+                                       seconds, expensive, notes))
+        conn.rollback()
+        return impacts
+    except DBError:
+        conn.rollback()
+        raise
+    except Exception as e:
+        conn.rollback()
+        raise DBError(_humanize_pg_error(e))
+
+
+def describe_alter_impact(impacts: Sequence[AlterImpact]) -> str:
+    """Текстовый отчёт dry_run_alter для окна подтверждения."""
+    effects = {"metadata": "только каталог", "scan": "сканирование таблицы", "rewrite": "ПЕРЕЗАПИСЬ таблицы"}
+    lines = []
+    for i, im in enumerate(impacts, 1):
+        lines.append(f"{i}. {im.sql}")
+        lines.append(f"   {effects[im.step.effect]}; блокировка {im.lock}; "
+                     f"размер {im.table_bytes / 2**20:.1f} МБ, с индексами {im.total_bytes / 2**20:.1f} МБ; "
+                     f"~{im.estimated_seconds:.1f} с" + ("  [ДОЛГО ПОД БЛОКИРОВКОЙ]" if im.expensive else ""))
+        if im.dependents:
+            lines.append("   зависимые: " + ", ".join(d["object"] for d in im.dependents))
+        lines.extend(f"   ! {n}" for n in im.notes)
+    return "\n".join(lines)
+
+
+def alter_table(conn: PGConnection, actions: Sequence[AlterAction], safe: bool = False,
+                lock_timeout_ms: Optional[int] = None, retries: Optional[int] = None, merge: bool = True,
+                dry_run: bool = False, index_foreign_keys: bool = False) -> str:
+    """
+    Выполняет несколько операций ALTER TABLE в одной транзакции.
+    При ошибке все изменения откатываются. С merge=True (по умолчанию) подкоманды одной таблицы
+    объединяются в одну команду ALTER TABLE (см. plan_alter): таблица перезаписывается не более
+    одного раза и исключительная блокировка берётся один раз.
+    dry_run=True — ничего не выполнять, вернуть отчёт describe_alter_impact(dry_run_alter(...)).
+    Для add_foreign_key проверяется, есть ли индекс, начинающийся со столбца ключа: без него удаления
+    в родительской таблице сканируют дочернюю. index_foreign_keys=True — недостающие индексы
+    создаются CREATE INDEX CONCURRENTLY вместе с остальными индексами; иначе о них говорится в результате.
+    Действия create_index (CREATE INDEX CONCURRENTLY) не могут выполняться в транзакции:
+    они идут после её фиксации, по одному в autocommit, и не блокируют запись в таблицу.
+    Ошибка при создании индекса уже зафиксированные изменения не откатывает; недостроенный
+    (невалидный) индекс удаляется.
+
+    safe=True — режим для нагруженных таблиц: каждая транзакция ждёт блокировку не дольше
+    lock_timeout_ms (по умолчанию ALTER_LOCK_TIMEOUT_MS) и при неудаче повторяется до retries раз
+    с растущей паузой, чтобы ALTER не выстраивал очередь из всех запросов к таблице за собой.
+    CHECK и FOREIGN KEY добавляются как NOT VALID и проверяются отдельными транзакциями
+    (VALIDATE CONSTRAINT не блокирует чтение и запись), SET NOT NULL опирается на заранее
+    проверенный CHECK (col IS NOT NULL) и не сканирует таблицу под ACCESS EXCLUSIVE.
+    Если проверка не прошла, добавленные ограничения удаляются, остальные изменения
+    первой транзакции остаются зафиксированными.
+    """
+    if dry_run:
+        return describe_alter_impact(dry_run_alter(conn, actions, safe, merge, index_foreign_keys=index_foreign_keys))
+    try:
+        missing = _missing_fk_indexes(conn, actions)
+    except Exception as e:
+        conn.rollback()
+        raise DBError(_humanize_pg_error(e))
+    if index_foreign_keys:
+        actions, missing = [*actions, *missing], []
+    plan = _plan_alter(actions, safe, merge)
+    for st in plan.steps:
+        if st.effect != "metadata":
+            logging.info("ALTER TABLE %s (%s): %s", st.table, st.effect, ", ".join(st.kinds))
+    if safe:
+        lock_timeout_ms = ALTER_LOCK_TIMEOUT_MS if lock_timeout_ms is None else lock_timeout_ms
+        retries = ALTER_LOCK_RETRIES if retries is None else retries
+    retries = retries or 0
 
     cur = conn.cursor()
     try:
-        for cmd in commands:
-            cur.execute(cmd)
-        conn.commit()
-        return f"Успешно выполнено {len(commands)} изменений."
+        _run_locked(conn, cur, [st.statement for st in plan.main], lock_timeout_ms, retries)
+        try:
+            for st in plan.validate:
+                _run_locked(conn, cur, [st.statement], lock_timeout_ms, retries)
+            if plan.finalize:
+                _run_locked(conn, cur, [st.statement for st in plan.finalize], lock_timeout_ms, retries)
+        except Exception:
+            conn.rollback()
+            _drop_constraints_quietly(conn, cur, plan.added_constraints, lock_timeout_ms, retries)
+            raise
+        if plan.indexes:
+            _create_indexes_concurrently(conn, cur, [(cmd, name) for _, cmd, name in plan.indexes])
+        for a in actions:
+            CATALOG_CACHE.invalidate(table=a.table)
+            if a.kind == "rename_table":
+                CATALOG_CACHE.invalidate(table=a.new_name)
+        RESULT_CACHE.invalidate_tables({a.table for a in actions}
+                                       | {a.new_name for a in actions if a.kind == "rename_table"})
+        msg = f"Успешно выполнено {len(actions)} изменений."
+        if missing:
+            msg += (" Внешние ключи без индекса: " + ", ".join(f"{m.table}({m.column})" for m in missing) +
+                    " — удаления в родительской таблице будут сканировать дочернюю; создайте индекс.")
+        return msg
     except Exception as e:
         conn.rollback()
         msg = _humanize_pg_error(e)
@@ -217,26 +1557,396 @@ def alter_table(conn: PGConnection, actions: Sequence[AlterAction]) -> str:
         raise DBError(msg)
     finally:
         cur.close()
+
+
+def _run_locked(conn: PGConnection, cur, statements: Sequence[sql.Composable],
+                lock_timeout_ms: Optional[int], retries: int) -> None:
+    """
+    Выполняет statements одной транзакцией. Если блокировку не удалось получить за lock_timeout_ms
+    (55P03), транзакция откатывается и повторяется через ALTER_RETRY_BACKOFF * 2^попытка секунд
+    со случайной добавкой — чтобы повторы нескольких клиентов не совпадали.
+    """
+    for attempt in range(retries + 1):
+        try:
+            if lock_timeout_ms is not None:
+                cur.execute("SET LOCAL lock_timeout = %s", (f"{int(lock_timeout_ms)}ms",))
+            for st in statements:
+                cur.execute(st)
+            conn.commit()
+            return
+        except psycopg2.Error as e:
+            conn.rollback()
+            if e.pgcode != _LOCK_NOT_AVAILABLE or attempt == retries:
+                raise
+            delay = ALTER_RETRY_BACKOFF * 2 ** attempt * (1 + random.random())
+            logging.warning("ALTER TABLE: блокировка не получена за %s мс, повтор %d из %d через %.1f с",
+                            lock_timeout_ms, attempt + 1, retries, delay)
+            time.sleep(delay)
+
+
+def _drop_constraints_quietly(conn: PGConnection, cur, constraints: Sequence[Tuple[str, str]],
+                              lock_timeout_ms: Optional[int], retries: int) -> None:
+    for table, name in constraints:
+        try:
+            _run_locked(conn, cur, [_alter_statement(table, sql.SQL("DROP CONSTRAINT IF EXISTS {}").format(
+                sql.Identifier(name)))], lock_timeout_ms, retries)
+        except Exception:
+            conn.rollback()
+            logging.warning("Не удалось удалить непроверенное ограничение %s.%s", table, name)
+
+
+def _create_indexes_concurrently(conn: PGConnection, cur, index_commands: Sequence[Tuple[sql.Composable, str]]) -> None:
+    """CONCURRENTLY запрещён внутри транзакции — на время создания индексов включается autocommit."""
+    autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        for cmd, name in index_commands:
+            try:
+                cur.execute(cmd)
+            except Exception:
+                try:
+                    cur.execute(sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(sql.Identifier(name)))
+                except Exception:
+                    logging.warning("Не удалось удалить невалидный индекс %s", name)
+                raise
+    finally:
+        conn.autocommit = autocommit
+
+
+# -------- Result cache
+
+def _table_name(ref: str) -> str:
+    """'public."Orders" AS o' -> 'orders': имя таблицы без схемы, алиаса и кавычек (без учёта регистра)."""
+    parts = ref.split()
+    return parts[0].replace('"', '').rsplit(".", 1)[-1].lower() if parts else ""
+
+
+_WRITE_TARGET_RE = re.compile(
+    r"\b(?:insert\s+into|update|delete\s+from|truncate(?:\s+table)?|merge\s+into|copy"
+    r"|(?:alter|drop)\s+table(?:\s+if\s+exists)?)\s+(?:only\s+)?((?:\"[^\"]+\"|\w+)(?:\.(?:\"[^\"]+\"|\w+))?)",
+    re.IGNORECASE)
+_READ_ONLY_RE = re.compile(r"^\s*(?:select|with|explain|show|values|table)\b", re.IGNORECASE)
+
+
+def written_tables(query: str) -> Optional[Set[str]]:
+    """
+    Таблицы, в которые пишет произвольный SQL: множество имён (пустое — запрос только читает)
+    или None, если понять цель записи не удалось (тогда кэш сбрасывается целиком).
+    """
+    targets = {_table_name(m.group(1)) for m in _WRITE_TARGET_RE.finditer(query)}
+    if targets:
+        return targets
+    return set() if _READ_ONLY_RE.match(query) else None
+
+
+@dataclass
+class _CachedResult:
+    rows: ResultSet
+    tables: Set[str]
+    nbytes: int
+    expires: float
+
+
+class ResultCache:
+    """
+    LRU-кэш результатов execute_select: ключ — текст SQL и аргументы из build_select_sql.
+    Ограничен суммарным числом строк и байт; каждая запись живёт ttl секунд.
+    safe_execute, alter_table и insert_row сбрасывают записи, ссылающиеся на изменённые таблицы;
+    изменения из других клиентов ограничены только TTL.
+    """
+
+    def __init__(self, max_rows: int = 200_000, max_bytes: int = 256 * 1024 * 1024, ttl: float = 60.0):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str], _CachedResult]" = OrderedDict()
+        self._rows = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    @staticmethod
+    def key(sql_text: str, args: Sequence[Any]) -> Tuple[str, str]:
+        # repr, а не tuple(args): среди аргументов бывают списки (IN/ANY)
+        return sql_text, repr(list(args))
+
+    def get(self, key: Tuple[str, str]) -> Optional[ResultSet]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires <= time.monotonic():
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.rows
+
+    def put(self, key: Tuple[str, str], rows: ResultSet, tables: Set[str]) -> None:
+        nbytes = rows.nbytes
+        if len(rows) > self.max_rows or nbytes > self.max_bytes:
+            return  # результат больше всего кэша — не вытесняем ради него остальное
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = _CachedResult(rows, set(tables), nbytes, time.monotonic() + self.ttl)
+            self._rows += len(rows)
+            self._bytes += nbytes
+            while self._rows > self.max_rows or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_tables(self, tables: Optional[Set[str]]) -> None:
+        """Сбрасывает записи, читающие любую из tables; None — сбросить всё."""
+        with self._lock:
+            if tables is None:
+                keys = list(self._entries)
+            else:
+                names = {_table_name(t) for t in tables}
+                keys = [k for k, e in self._entries.items() if e.tables & names]
+            for k in keys:
+                self._drop(k)
+            self.invalidations += len(keys)
+
+    def clear(self) -> None:
+        self.invalidate_tables(None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries), "rows": self._rows, "bytes": self._bytes,
+                "hits": self.hits, "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "evictions": self.evictions, "invalidations": self.invalidations,
+            }
+
+    def _drop(self, key: Tuple[str, str]) -> None:
+        entry = self._entries.pop(key)
+        self._rows -= len(entry.rows)
+        self._bytes -= entry.nbytes
+
+
+RESULT_CACHE = ResultCache(
+    max_rows=int(os.getenv("DBW_RESULT_CACHE_ROWS", "200000")),
+    max_bytes=int(os.getenv("DBW_RESULT_CACHE_MB", "256")) * 1024 * 1024,
+    ttl=float(os.getenv("DBW_RESULT_CACHE_TTL", "60")),
+)
+
+
+# -------- Prepared statements
+
+PREPARED_MAX = int(os.getenv("DBW_PREPARED_MAX", "64"))  # 0 — не готовить выражения
+
+# Подготовленные выражения живут в сессии PostgreSQL, поэтому учёт ведётся по объекту соединения:
+# соединение пула -> {нормализованный SQL: (имя выражения, число параметров)} в порядке LRU.
+_PREPARED: "weakref.WeakKeyDictionary[PGConnection, OrderedDict[str, Tuple[str, int]]]" = weakref.WeakKeyDictionary()
+_PREPARED_LOCK = threading.Lock()
+
+# feature_not_supported ("cached plan must not change result type" после DDL)
+# и invalid_sql_statement_name (выражение удалено DISCARD ALL / DEALLOCATE извне)
+_STALE_PLAN_CODES = {"0A000", "26000"}
+
+_WS_OUTSIDE_QUOTES_RE = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")|\s+")
+_PYFORMAT_RE = re.compile(r"%(%|s|\([^)]*\)s)")
+
+
+def normalize_sql(query: str) -> str:
+    """Схлопывает пробельные символы вне строковых литералов и идентификаторов в кавычках."""
+    return _WS_OUTSIDE_QUOTES_RE.sub(lambda m: m.group(1) or " ", query).strip()
+
+
+def _to_numbered(query: str) -> Optional[Tuple[str, int]]:
+    """'... %s ... %%' -> ('... $1 ... %', 1). None — для именованных %(name)s (не поддерживаются)."""
+    n = 0
+    named = False
+
+    def repl(m):
+        nonlocal n, named
+        if m.group(1) == "%":
+            return "%"
+        if m.group(1) != "s":
+            named = True
+            return m.group(0)
+        n += 1
+        return f"${n}"
+
+    text = _PYFORMAT_RE.sub(repl, query)
+    return None if named else (text, n)
+
+
+def _statement_name(key: str) -> str:
+    return "dbw_ps_" + hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def _statements(conn: PGConnection) -> "OrderedDict[str, Tuple[str, int]]":
+    with _PREPARED_LOCK:
+        stmts = _PREPARED.get(conn)
+        if stmts is None:
+            stmts = _PREPARED[conn] = OrderedDict()
+        return stmts
+
+
+def _hold_source(name: str, key: str) -> None:
+    with _PREPARED_LOCK:
+        _PREPARED_SOURCES[name] = key
+        _PREPARED_REFS[name] = _PREPARED_REFS.get(name, 0) + 1
+
+
+def _release_sources(names: Iterable[str]) -> None:
+    """Снимает ссылки соединения на выражения; исходный SQL забывается вместе с последней. Под _PREPARED_LOCK."""
+    for name in names:
+        refs = _PREPARED_REFS.pop(name, 0) - 1
+        if refs > 0:
+            _PREPARED_REFS[name] = refs
+        else:
+            _PREPARED_SOURCES.pop(name, None)
+
+
+def _prepare(conn: PGConnection, cur, key: str) -> Optional[Tuple[str, int]]:
+    stmts = _statements(conn)
+    hit = stmts.get(key)
+    if hit is not None:
+        stmts.move_to_end(key)
+        return hit
+    converted = _to_numbered(key)
+    if converted is None:
+        return None
+    text, nparams = converted
+    name = _statement_name(key)
+    cur.execute(sql.SQL("PREPARE {} AS ").format(sql.Identifier(name)) + sql.SQL(text))
+    stmts[key] = (name, nparams)
+    _hold_source(name, key)
+    while len(stmts) > PREPARED_MAX:
+        _, (old, _) = stmts.popitem(last=False)
+        with _PREPARED_LOCK:
+            _release_sources([old])
+        cur.execute(sql.SQL("DEALLOCATE {}").format(sql.Identifier(old)))
+    return name, nparams
+
+
+def forget_prepared(conn: PGConnection) -> None:
+    """Забывает учёт выражений соединения (после DISCARD ALL, переподключения или закрытия)."""
+    with _PREPARED_LOCK:
+        stmts = _PREPARED.pop(conn, None)
+        if stmts:
+            _release_sources(name for name, _ in stmts.values())
+            stmts.clear()
+
+
+def execute_prepared(conn: PGConnection, query: str, args: Optional[Sequence[Any]] = None) -> ResultSet:
+    """
+    Выполняет параметризованный (%s) запрос через PREPARE/EXECUTE и возвращает строки.
+    Выражение готовится при первом вызове на данном соединении, дальше план не строится заново.
+    PREPARE/DEALLOCATE не транзакционны, поэтому учёт не нарушается откатом.
+    Если план устарел после DDL, выражение готовится заново и запрос повторяется один раз —
+    только когда до вызова не было открытой транзакции (иначе повтор изменил бы её смысл).
+    Кортежи среди аргументов (IN %s) и именованные параметры выполняются обычным execute.
+    """
+    args = list(args or [])
+    key = normalize_sql(query)
+    direct = PREPARED_MAX <= 0 or any(isinstance(a, tuple) for a in args)
+    was_idle = conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    for attempt in (1, 2):
+        with conn.cursor() as cur:
+            try:
+                stmt = None if direct else _prepare(conn, cur, key)
+                if stmt is None:
+                    cur.execute(query, args)
+                else:
+                    name, nparams = stmt
+                    if nparams != len(args):
+                        raise DBError(f"Ожидалось параметров: {nparams}, передано: {len(args)}")
+                    placeholders = sql.SQL("({})").format(sql.SQL(", ").join(sql.Placeholder() * nparams)) \
+                        if nparams else sql.SQL("")
+                    cur.execute(sql.SQL("EXECUTE {} ").format(sql.Identifier(name)) + placeholders, args)
+                return ResultSet.from_cursor(cur)
+            except psycopg2.Error as e:
+                stale = e.pgcode in _STALE_PLAN_CODES and not direct
+                if stale and e.pgcode == "26000":
+                    forget_prepared(conn)  # выражения сессии удалены извне — учёт недействителен целиком
+                if stale and was_idle and attempt == 1:
+                    conn.rollback()
+                    if e.pgcode == "0A000":
+                        # устаревшее выражение ещё существует в сессии: забываем его только вместе с DEALLOCATE.
+                        # Внутри открытой транзакции запись остаётся, и первый вызов вне транзакции
+                        # снова получит 0A000 и подготовит выражение заново (иначе PREPARE упал бы с 42P05)
+                        if _statements(conn).pop(key, None) is not None:
+                            with _PREPARED_LOCK:
+                                _release_sources([_statement_name(key)])
+                        with conn.cursor() as dcur:
+                            dcur.execute(sql.SQL("DEALLOCATE {}").format(sql.Identifier(_statement_name(key))))
+                    logging.info("Подготовленное выражение устарело (%s), готовим заново", e.pgcode)
+                    continue
+                raise DBError(_humanize_pg_error(e))
+    raise DBError("Не удалось выполнить подготовленное выражение")
+
+
 # -------- SELECT Query Builder --------
 
+# конфигурация текстового поиска для оператора @@ и столбцов tsvector (search.py)
+FTS_CONFIG = os.getenv("DBW_FTS_CONFIG", "simple")
+
+
 @dataclass
 class SelectParams:
     tables: List[str]
     columns: List[str] = field(default_factory=list)
     joins: List[Dict[str, Any]] = field(default_factory=list)  # [{'type':'LEFT','table':'b','on':'a.id=b.a_id'}]
     where: List[Dict[str, Any]] = field(default_factory=list)  # [{'col':'x','op':'=','val':1}]
+    # op '@@' — полнотекстовый поиск: col — tsvector, val — запрос в синтаксисе websearch_to_tsquery
     group_by: List[str] = field(default_factory=list)
     having: List[Dict[str, Any]] = field(default_factory=list)
     order_by: List[Tuple[str, Literal['ASC','DESC']]] = field(default_factory=list)
     limit: Optional[int] = None
     offset: Optional[int] = None
+    # keyset-пагинация: значения ключей order_by последней (seek_after) или первой (seek_before)
+    # строки уже показанной страницы; ключи должны быть NOT NULL и вместе уникальны (добавьте PK)
+    seek_after: Optional[Sequence[Any]] = None
+    seek_before: Optional[Sequence[Any]] = None
+
+
+def _seek_condition(order_by: Sequence[Tuple[str, str]], values: Sequence[Any],
+                    forward: bool) -> Tuple[str, List[Any]]:
+    """
+    Условие «строго после (forward) / до ключа values» в порядке order_by.
+    Одинаковые направления — сравнение строк (a, b) > (%s, %s), его PostgreSQL отдаёт
+    составному индексу; смешанные — развёрнутое (a > %s) OR (a = %s AND b < %s) ...
+    """
+    dirs = [d.upper() for _, d in order_by]
+    cols = [c for c, _ in order_by]
+    if len(set(dirs)) == 1:
+        op = ">" if (dirs[0] == "ASC") == forward else "<"
+        if len(cols) == 1:
+            return f"{cols[0]} {op} %s", [values[0]]
+        return f"({', '.join(cols)}) {op} ({', '.join(['%s'] * len(cols))})", list(values)
+    ors, args = [], []
+    for i, (col, d) in enumerate(zip(cols, dirs)):
+        op = ">" if (d == "ASC") == forward else "<"
+        conj = [f"{c} = %s" for c in cols[:i]] + [f"{col} {op} %s"]
+        args.extend(values[:i])
+        args.append(values[i])
+        ors.append("(" + " AND ".join(conj) + ")")
+    return "(" + " OR ".join(ors) + ")", args
 
 
 def build_select_sql(p: SelectParams) -> Tuple[str, List[Any]]:
     """
     Собирает SQL-запрос SELECT с поддержкой JOIN, WHERE, GROUP BY, HAVING и ORDER BY.
     Возвращает текст запроса и список аргументов.
+    С seek_before порядок ORDER BY обращается (страница читается от ключа назад) —
+    строки нужно развернуть, это делает KeysetPager.
     """
+    seek = p.seek_after if p.seek_after is not None else p.seek_before
+    if seek is not None:
+        if p.seek_after is not None and p.seek_before is not None:
+            raise DBError("Укажите только seek_after или только seek_before.")
+        if not p.order_by or len(seek) != len(p.order_by):
+            raise DBError("Для keyset-пагинации нужен ключ на каждую колонку ORDER BY.")
+        if p.group_by or p.offset:
+            raise DBError("Keyset-пагинация не сочетается с GROUP BY и OFFSET.")
     parts = ["SELECT"]
     if p.columns:
         parts.append(", ".join(p.columns))
@@ -252,16 +1962,23 @@ def build_select_sql(p: SelectParams) -> Tuple[str, List[Any]]:
 
     # WHERE
     args: List[Any] = []
-    if p.where:
-        wh = []
-        for cond in p.where:
-            op = cond.get("op","=").strip().upper()
-            val = cond.get("val")
-            if op in ["LIKE","ILIKE","~","~*","!~","!~*"]:
-                wh.append(f"{cond['col']} {op} %s")
-            else:
-                wh.append(f"{cond['col']} {op} %s")
-            args.append(val)
+    wh = []
+    for cond in p.where:
+        op = cond.get("op","=").strip().upper()
+        val = cond.get("val")
+        if op in ["LIKE","ILIKE","~","~*","!~","!~*"]:
+            wh.append(f"{cond['col']} {op} %s")
+        elif op == "@@":
+            wh.append(f"{cond['col']} @@ websearch_to_tsquery(%s::regconfig, %s)")
+            args.append(cond.get("config", FTS_CONFIG))
+        else:
+            wh.append(f"{cond['col']} {op} %s")
+        args.append(val)
+    if seek is not None:
+        cond_sql, cond_args = _seek_condition(p.order_by, seek, forward=p.seek_before is None)
+        wh.append(cond_sql)
+        args.extend(cond_args)
+    if wh:
         parts.append("WHERE " + " AND ".join(wh))
 
     # GROUP BY
@@ -278,7 +1995,10 @@ def build_select_sql(p: SelectParams) -> Tuple[str, List[Any]]:
 
     # ORDER BY
     if p.order_by:
-        ob = [f"{col} {dir}" for col, dir in p.order_by]
+        if p.seek_before is not None:
+            ob = [f"{col} {'ASC' if dir.upper() == 'DESC' else 'DESC'}" for col, dir in p.order_by]
+        else:
+            ob = [f"{col} {dir}" for col, dir in p.order_by]
         parts.append("ORDER BY " + ", ".join(ob))
 
     # LIMIT / OFFSET
@@ -293,16 +2013,325 @@ def build_select_sql(p: SelectParams) -> Tuple[str, List[Any]]:
     return query, args
 
 
-def execute_select(conn: PGConnection, params: SelectParams) -> List[Dict[str, Any]]:
-    """Выполняет запрос, собранный build_select_sql."""
+def referenced_tables(params: SelectParams) -> Set[str]:
+    """Имена таблиц из FROM и JOIN (без схемы и алиаса) — по ним сбрасывается кэш результатов."""
+    return {_table_name(t) for t in params.tables} | {_table_name(j["table"]) for j in params.joins}
+
+
+def execute_select(conn: PGConnection, params: SelectParams, use_cache: bool = False,
+                   prepared: bool = True) -> ResultSet:
+    """
+    Выполняет запрос, собранный build_select_sql.
+    use_cache=True — брать результат из RESULT_CACHE и класть его туда; возвращаемый ResultSet
+    общий для всех попаданий, дописывать в него (extend) нельзя.
+    prepared=True — через execute_prepared: повторные запросы той же формы не планируются заново.
+    """
     sql_text, args = build_select_sql(params)
+    key = ResultCache.key(sql_text, args) if use_cache else None
+    if key is not None:
+        rows = RESULT_CACHE.get(key)
+        if rows is not None:
+            return rows
+    if prepared:
+        rows = execute_prepared(conn, sql_text, args)
+    else:
+        try:
+            with conn.cursor() as cur:
+                cur.execute(sql_text, args)
+                rows = ResultSet.from_cursor(cur)
+        except Exception as e:
+            msg = _humanize_pg_error(e)
+            raise DBError(msg)
+    if key is not None:
+        RESULT_CACHE.put(key, rows, referenced_tables(params))
+    return rows
+
+
+def _result_key(expr: str) -> str:
+    """Имя поля результата для выражения ORDER BY: 'e.created_at' -> 'created_at', 'x AS y' -> 'y'."""
+    m = re.search(r"\s+as\s+(\S+)\s*$", expr, re.IGNORECASE)
+    name = m.group(1) if m else expr.strip().rsplit(".", 1)[-1]
+    return name[1:-1].replace('""', '"') if name.startswith('"') and name.endswith('"') else name
+
+
+class KeysetPager:
+    """
+    Постраничный просмотр по ключу (seek): каждая страница — «WHERE (ключи) > (последние) LIMIT n»,
+    поэтому её стоимость не зависит от того, насколько далеко пролистано (в отличие от OFFSET).
+    params.order_by задаёт ключи; последней колонкой должен быть уникальный ключ (обычно id).
+    Методы принимают соединение — их можно запускать в QueryRunner как fn(conn).
+    """
+
+    def __init__(self, params: SelectParams, page_size: int = 500,
+                 key_names: Optional[Sequence[str]] = None):
+        if not params.order_by:
+            raise DBError("Для keyset-пагинации нужен ORDER BY.")
+        self.params = replace(params, limit=None, offset=None, seek_after=None, seek_before=None)
+        self.page_size = page_size
+        self.key_names = list(key_names) if key_names else [_result_key(c) for c, _ in params.order_by]
+        self.page_no = 0
+        self.has_next = False
+        self.has_prev = False
+        self._first_key: Optional[Tuple[Any, ...]] = None
+        self._last_key: Optional[Tuple[Any, ...]] = None
+
+    def _key(self, row: Dict[str, Any]) -> Tuple[Any, ...]:
+        return tuple(row[k] for k in self.key_names)
+
+    def _fetch(self, conn: PGConnection, **seek: Any) -> ResultSet:
+        # +1 строка — признак того, что за страницей есть ещё данные
+        return execute_select(conn, replace(self.params, limit=self.page_size + 1, **seek))
+
+    def _set_page(self, rows: ResultSet) -> ResultSet:
+        if rows:
+            self._first_key, self._last_key = self._key(rows[0]), self._key(rows[-1])
+        return rows
+
+    def first_page(self, conn: PGConnection) -> ResultSet:
+        rows = self._fetch(conn)
+        self.page_no = 1
+        self.has_prev = False
+        self.has_next = len(rows) > self.page_size
+        return self._set_page(rows[:self.page_size])
+
+    def next_page(self, conn: PGConnection) -> ResultSet:
+        if self._last_key is None:
+            return self.first_page(conn)
+        rows = self._fetch(conn, seek_after=self._last_key)
+        if not rows:
+            self.has_next = False
+            return rows
+        self.page_no += 1
+        self.has_prev = True
+        self.has_next = len(rows) > self.page_size
+        return self._set_page(rows[:self.page_size])
+
+    def prev_page(self, conn: PGConnection) -> ResultSet:
+        if self._first_key is None:
+            return self.first_page(conn)
+        rows = self._fetch(conn, seek_before=self._first_key)
+        if not rows:
+            self.has_prev = False
+            return rows
+        self.page_no = max(1, self.page_no - 1)
+        self.has_next = True
+        self.has_prev = len(rows) > self.page_size
+        page = rows[:self.page_size]
+        page = page.take(range(len(page) - 1, -1, -1))  # seek_before читает в обратном порядке
+        return self._set_page(page)
+
+
+# -------- Streaming (server-side cursors) --------
+
+DEFAULT_BATCH_SIZE = 2000
+
+
+def _iter_named(conn: PGConnection, query: Any, args: Sequence[Any], batch_size: int,
+                description: Optional[List[Any]] = None) -> Iterator[List[Tuple[Any, ...]]]:
+    """
+    Читает результат именованным (серверным) курсором пачками по batch_size строк (кортежей).
+    В памяти клиента одновременно находится не больше одной пачки.
+    Курсор живёт внутри транзакции, поэтому соединение не должно быть в autocommit.
+    description (если передан) заполняется cursor.description после первого FETCH.
+    """
+    if batch_size <= 0:
+        raise DBError("Размер пачки должен быть положительным.")
+    if conn.autocommit:
+        raise DBError("Потоковое чтение требует транзакции: отключите autocommit.")
+    cur = conn.cursor(name=f"dbw_{uuid.uuid4().hex[:16]}")
+    cur.itersize = batch_size
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(sql_text, args)
-            return list(cur.fetchall())
-    except Exception as e:
-        msg = _humanize_pg_error(e)
-        raise DBError(msg)
+        try:
+            cur.execute(query, args)
+            batch = cur.fetchmany(batch_size)
+        except psycopg2.Error as e:
+            conn.rollback()
+            raise DBError(_humanize_pg_error(e))
+        if description is not None:
+            description[:] = cur.description or []
+        while batch:
+            yield batch
+            try:
+                batch = cur.fetchmany(batch_size)
+            except psycopg2.Error as e:
+                conn.rollback()
+                raise DBError(_humanize_pg_error(e))
+    finally:
+        if not cur.closed and not conn.closed:
+            try:
+                cur.close()
+            except psycopg2.Error:
+                pass
+
+
+def _iter_resultsets(conn: PGConnection, query: Any, args: Sequence[Any], batch_size: int) -> Iterator[ResultSet]:
+    desc: List[Any] = []
+    batches = _iter_named(conn, query, args, batch_size, desc)
+    try:
+        for batch in batches:
+            yield ResultSet.from_rows(desc, batch)
+    finally:
+        batches.close()  # закрытие потока сразу освобождает серверный курсор
+
+
+def iter_select(conn: PGConnection, params: SelectParams,
+                batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[ResultSet]:
+    """
+    Потоковый аналог execute_select: генератор пачек строк (ResultSet).
+    Память не зависит от размера результата, первая пачка приходит сразу после DECLARE/FETCH.
+        for batch in iter_select(conn, params, batch_size=5000):
+            ...
+    """
+    sql_text, args = build_select_sql(params)
+    return _iter_resultsets(conn, sql_text, args, batch_size)
+
+
+def iter_select_rows(conn: PGConnection, params: SelectParams, batch_size: int = DEFAULT_BATCH_SIZE,
+                     description: Optional[List[Any]] = None) -> Iterator[List[Tuple[Any, ...]]]:
+    """
+    Как iter_select, но пачки — списки кортежей, как их отдаёт psycopg2.
+    Имена и типы столбцов — в description (cursor.description).
+    """
+    sql_text, args = build_select_sql(params)
+    return _iter_named(conn, sql_text, args, batch_size, description)
+
+
+def iter_execute(conn: PGConnection, query: str, args: Optional[List[Any]] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[ResultSet]:
+    """
+    Потоковый аналог safe_execute для запросов, возвращающих строки (SELECT / VALUES / WITH ... SELECT).
+    Команды изменения данных выполняйте через safe_execute.
+    """
+    return _iter_resultsets(conn, query, args or [], batch_size)
+
+
+def stream_select(params: SelectParams, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[ResultSet]:
+    """
+    Как iter_select, но сам берёт соединение из пула и держит его, пока генератор
+    не исчерпан или не закрыт (close()). Нужен долгоживущим источникам вроде таблицы GUI.
+    Между пачками соединение простаивает в транзакции с открытым курсором (блокировки ACCESS SHARE,
+    снимок данных): потребитель читает пачки вне GUI-потока и закрывает простаивающий поток (см. DataView).
+    """
+    with pooled_connection() as conn:
+        yield from iter_select(conn, params, batch_size)
+
+# -------- Columnar results (NumPy) --------
+
+# OID типа -> (dtype NumPy для результата, формат поля в COPY BINARY или None для переменной длины)
+_NUMPY_TYPES: Dict[int, Tuple[str, Optional[str]]] = {
+    16: ("bool", "?"),
+    21: ("int16", ">i2"),
+    23: ("int32", ">i4"),
+    20: ("int64", ">i8"),
+    700: ("float32", ">f4"),
+    701: ("float64", ">f8"),
+    1700: ("float64", None),             # numeric переменной длины — через Decimal -> float
+    1082: ("datetime64[D]", ">i4"),      # дни от 2000-01-01
+    1114: ("datetime64[us]", ">i8"),     # микросекунды от 2000-01-01
+    1184: ("datetime64[us]", ">i8"),     # то же в UTC
+}
+_PGCOPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+
+
+def _describe(conn: PGConnection, sql_text: str, args: Sequence[Any]) -> List[Any]:
+    """Имена и OID типов столбцов результата без чтения строк (LIMIT 0)."""
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT * FROM ({sql_text}) AS q LIMIT 0", args)
+        return list(cur.description)
+
+
+# Значение-заглушка вместо NULL в быстром пути: COPY получает только непустые поля фиксированной ширины
+_NUMPY_NULL_FILL = {16: "false", 21: "0::int2", 23: "0::int4", 20: "0::int8", 700: "0::float4", 701: "0::float8",
+                    1082: "'2000-01-01'::date", 1114: "'2000-01-01'::timestamp",
+                    1184: "'2000-01-01 00:00:00+00'::timestamptz"}
+
+
+def _columnar_from_binary(conn: PGConnection, sql_text: str, args: Sequence[Any], desc: List[Any]):
+    """
+    Быстрый путь: COPY ... (FORMAT binary) и разбор буфера одним структурным dtype.
+    Годится, только если все столбцы фиксированной ширины (иначе возвращает None, и данные читаются
+    пачками кортежей). Чтобы длина строки не зависела от NULL, запрос оборачивается: каждый столбец
+    выдаётся как coalesce(значение, заглушка) и признак IS NULL — маска берётся из того же буфера,
+    запрос выполняется один раз. Столбцы подзапроса переименовываются по позиции (повторы имён не мешают).
+    """
+    import numpy as np
+    fmts = [_NUMPY_TYPES.get(d.type_code, (None, None))[1] for d in desc]
+    if not desc or any(f is None for f in fmts):
+        return None
+    names = [f"c{i}" for i in range(len(desc))]
+    select = sql.SQL(", ").join(
+        sql.SQL("coalesce({c}, {fill}), {c} IS NULL").format(
+            c=sql.Identifier(n), fill=sql.SQL(_NUMPY_NULL_FILL[d.type_code]))
+        for n, d in zip(names, desc))
+    buf = io.BytesIO()
+    with conn.cursor() as cur:
+        query = cur.mogrify(sql_text, args).decode(psycopg2.extensions.encodings.get(conn.encoding, "utf-8"))
+        wrapped = sql.SQL("COPY (SELECT {} FROM ({}) AS q ({})) TO STDOUT WITH (FORMAT binary)").format(
+            select, sql.SQL(query), sql.SQL(", ").join(sql.Identifier(n) for n in names))
+        cur.copy_expert(wrapped.as_string(conn), buf)
+    data = buf.getbuffer()
+    if bytes(data[:11]) != _PGCOPY_SIGNATURE:
+        raise DBError("Неожиданный формат COPY BINARY.")
+    ext_len = int.from_bytes(data[15:19], "big")
+    body = data[19 + ext_len:len(data) - 2]  # без заголовка и завершающего -1
+    row_dtype = np.dtype([("n", ">i2")] + [
+        x for i, f in enumerate(fmts)
+        for x in ((f"l{i}", ">i4"), (f"v{i}", f), (f"nl{i}", ">i4"), (f"null{i}", "?"))])
+    if len(body) % row_dtype.itemsize:
+        raise DBError("Неожиданная длина строк COPY BINARY.")
+    rows = np.frombuffer(body, dtype=row_dtype)
+    result = {}
+    for i, (key, d) in enumerate(zip(_unique_keys(d.name for d in desc), desc)):
+        dtype = _NUMPY_TYPES[d.type_code][0]
+        raw = rows[f"v{i}"]
+        if dtype == "datetime64[D]":
+            values = np.datetime64("2000-01-01", "D") + raw.astype("int64").astype("timedelta64[D]")
+        elif dtype == "datetime64[us]":
+            values = np.datetime64("2000-01-01", "us") + raw.astype("int64").astype("timedelta64[us]")
+        else:
+            values = raw.astype(dtype)
+        result[key] = np.ma.MaskedArray(values, mask=rows[f"null{i}"].copy())
+    return result
+
+
+def _columnar_from_rows(conn: PGConnection, params: SelectParams, batch_size: int):
+    """Общий путь: пачки ResultSet серверного курсора -> to_numpy() и склейка по столбцам."""
+    import numpy as np
+    chunks = [batch.to_numpy() for batch in iter_select(conn, params, batch_size)]
+    if not chunks:
+        desc = _describe(conn, *build_select_sql(params))
+        return {key: np.ma.MaskedArray(np.empty(0, dtype=_NUMPY_TYPES.get(d.type_code, ("object", None))[0]),
+                                       mask=np.zeros(0, dtype=bool))
+                for key, d in zip(_unique_keys(d.name for d in desc), desc)}
+    return {name: np.ma.concatenate([c[name] for c in chunks]) for name in chunks[0]}
+
+
+def execute_select_columnar(conn: PGConnection, params: SelectParams,
+                            batch_size: int = 50_000, method: Literal["auto", "rows"] = "auto") -> Dict[str, Any]:
+    """
+    Выполняет запрос конструктора и возвращает {столбец: numpy.ma.MaskedArray}; маска — NULL.
+    Повторяющиеся имена столбцов различаются суффиксом, как ключи ResultSet (id, id_2, ...).
+    Числа, bool, date и timestamp — типизированные массивы (numeric -> float64), прочее — dtype=object.
+    method="auto": COPY BINARY с разбором без цикла по строкам, если все столбцы фиксированной ширины
+    (NULL допускаются), иначе — пачки кортежей; словари на строку не создаются ни в одном из путей.
+    Требует numpy (импортируется при вызове).
+    """
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        raise DBError("Для выборки в массивы установите пакет numpy.")
+    sql_text, args = build_select_sql(params)
+    try:
+        if method == "auto":
+            result = _columnar_from_binary(conn, sql_text, args, _describe(conn, sql_text, args))
+            if result is not None:
+                return result
+        return _columnar_from_rows(conn, params, batch_size)
+    except psycopg2.Error as e:
+        conn.rollback()
+        raise DBError(_humanize_pg_error(e))
+
+
 # -------- String functions utilities --------
 
 VALID_STRING_FUNCS = {
@@ -322,10 +2351,10 @@ def apply_string_func(
     column: str,
     func: str,
     *extra_args: Any
-) -> List[Dict[str, Any]]:
+) -> ResultSet:
     """
     Применяет строковую функцию (UPPER, LOWER, TRIM, SUBSTRING, LPAD, RPAD, CONCAT)
-    к указанному столбцу таблицы и возвращает результат в виде списка словарей.
+    к указанному столбцу таблицы и возвращает результат (ResultSet).
     """
     func = func.upper().strip()
     if func not in VALID_STRING_FUNCS:
@@ -341,9 +2370,9 @@ def apply_string_func(
     )
 
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        with conn.cursor() as cur:
             cur.execute(q, extra_args)
-            return list(cur.fetchall())
+            return ResultSet.from_cursor(cur)
     except Exception as e:
         msg = _humanize_pg_error(e)
         raise DBError(msg)
@@ -351,30 +2380,190 @@ def apply_string_func(
 
 # -------- Combined API for GUI calls --------
 
-def preview_table(conn: PGConnection, table: str, limit: int = 50) -> List[Dict[str, Any]]:
+def preview_table(conn: PGConnection, table: str, limit: int = 50) -> ResultSet:
     """Возвращает первые N строк указанной таблицы (для предпросмотра)."""
     q = sql.SQL("SELECT * FROM {} LIMIT %s").format(sql.Identifier(table))
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+    with conn.cursor() as cur:
         cur.execute(q, (limit,))
-        return list(cur.fetchall())
+        return ResultSet.from_cursor(cur)
 
 
-def safe_execute(conn: PGConnection, query: str, args: Optional[List[Any]] = None) -> List[Dict[str, Any]]:
+def safe_execute(conn: PGConnection, query: str, args: Optional[List[Any]] = None) -> ResultSet:
     """
     Универсальное выполнение SQL-запроса с возвратом данных (используется GUI для произвольных запросов).
     """
     args = args or []
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        with conn.cursor() as cur:
             cur.execute(query, args)
-            if cur.description:
-                return list(cur.fetchall())
-            conn.commit()
-            return []
+            rows = ResultSet.from_cursor(cur)
+            if not cur.description:
+                conn.commit()
+        targets = written_tables(query)
+        if targets != set():
+            RESULT_CACHE.invalidate_tables(targets)
+        return rows
     except Exception as e:
         conn.rollback()
         msg = _humanize_pg_error(e)
         raise DBError(msg)
+
+
+def insert_row(conn: PGConnection, table: str, columns: Sequence[str], values: Sequence[Any]) -> None:
+    """Вставляет одну запись и фиксирует транзакцию."""
+    q = sql.SQL("INSERT INTO {} ({}) VALUES ({})").format(
+        sql.Identifier(table),
+        sql.SQL(", ").join(sql.Identifier(c) for c in columns),
+        sql.SQL(", ").join(sql.Placeholder() * len(columns)),
+    )
+    try:
+        with conn.cursor() as cur:
+            cur.execute(q, list(values))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        raise DBError(_humanize_pg_error(e))
+    RESULT_CACHE.invalidate_tables({table})
+
+
+# -------- Bulk insert --------
+
+_INT_TYPES = {"smallint", "integer", "bigint"}
+_FLOAT_TYPES = {"real", "double precision"}
+_TRUE_STRINGS = {"t", "true", "1", "y", "yes", "on", "да"}
+_FALSE_STRINGS = {"f", "false", "0", "n", "no", "off", "нет"}
+
+
+def _to_bool(v: Any) -> Any:
+    if not isinstance(v, str):
+        return bool(v)
+    s = v.strip().lower()
+    if s in _TRUE_STRINGS:
+        return True
+    if s in _FALSE_STRINGS:
+        return False
+    raise ValueError(f"не логическое значение: {v!r}")
+
+
+def _converter(data_type: str) -> Callable[[Any], Any]:
+    """Приведение значения (часто строки из файла/формы) к Python-типу столбца по data_type из каталога."""
+    dt = data_type.lower()
+    if dt in _INT_TYPES:
+        conv: Callable[[Any], Any] = int
+    elif dt in _FLOAT_TYPES:
+        conv = float
+    elif dt == "numeric":
+        conv = lambda v: v if isinstance(v, Decimal) else Decimal(str(v).strip())
+    elif dt == "boolean":
+        conv = _to_bool
+    elif dt in ("json", "jsonb"):
+        conv = lambda v: v if isinstance(v, (str, Json)) else Json(v)
+    else:
+        return lambda v: v
+    textual = dt not in ("json", "jsonb")
+
+    def convert(v: Any) -> Any:
+        if v is None or (textual and isinstance(v, str) and v.strip() == ""):
+            return None  # пустая строка в нетекстовом столбце — NULL, как в InsertRowDialog
+        return conv(v)
+    return convert
+
+
+def _copy_text(v: Any) -> str:
+    """Значение в текстовом формате COPY (NULL — \\N, экранируются \\, табуляция и переводы строк)."""
+    if v is None:
+        return "\\N"
+    if isinstance(v, bool):
+        s = "t" if v else "f"
+    elif isinstance(v, Json):
+        s = json.dumps(v.adapted)
+    elif isinstance(v, psycopg2.extensions.Binary):
+        return _copy_text(v.adapted)
+    elif isinstance(v, (bytes, bytearray, memoryview)):
+        s = "\\x" + bytes(v).hex()  # bytea в шестнадцатеричном виде; обратная косая экранируется ниже
+    elif hasattr(v, "isoformat"):
+        s = v.isoformat()
+    else:
+        s = str(v)
+    return s.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def bulk_insert(
+    conn: PGConnection,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    schema: str = "public",
+    chunk_size: int = 5000,
+    copy_threshold: int = 1000,
+    progress: Optional[Callable[[int], None]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Пакетная вставка строк (последовательностей значений в порядке columns).
+    Значения приводятся к типам столбцов по метаданным каталога (CATALOG_CACHE).
+    Каждая часть из chunk_size строк фиксируется отдельно: меньше copy_threshold строк —
+    execute_values (многострочный INSERT), больше — COPY FROM STDIN.
+    Массивы (ARRAY) всегда вставляются через execute_values.
+    Возвращает по словарю на часть: {"chunk", "rows", "method", "seconds", "rows_per_sec"}.
+    При ошибке текущая часть откатывается, уже зафиксированные остаются — в DBError указано их число.
+    """
+    if not columns:
+        raise DBError("Не указаны столбцы для вставки.")
+    meta = {c["column_name"]: c for c in CATALOG_CACHE.columns(conn, table, schema)}
+    if not meta:
+        raise DBError(f"Таблица {schema}.{table} не найдена.")
+    missing = [c for c in columns if c not in meta]
+    if missing:
+        raise DBError(f"В таблице {table} нет столбцов: {', '.join(missing)}")
+    convs = [_converter(str(meta[c].get("data_type") or "")) for c in columns]
+    copy_ok = all(str(meta[c].get("data_type")).upper() != "ARRAY" for c in columns)
+
+    target = sql.Identifier(schema, table)
+    cols_sql = sql.SQL(", ").join(sql.Identifier(c) for c in columns)
+    insert_q = sql.SQL("INSERT INTO {} ({}) VALUES %s").format(target, cols_sql).as_string(conn)
+    copy_q = sql.SQL("COPY {} ({}) FROM STDIN").format(target, cols_sql).as_string(conn)
+
+    timings: List[Dict[str, Any]] = []
+    done = 0
+    it = iter(rows)
+    try:
+        while True:
+            raw = list(islice(it, chunk_size))
+            if not raw:
+                break
+            chunk = []
+            for i, r in enumerate(raw):
+                if len(r) != len(columns):
+                    raise DBError(f"Строка {done + i + 1}: ожидалось {len(columns)} значений, получено {len(r)}")
+                try:
+                    chunk.append([conv(v) for conv, v in zip(convs, r)])
+                except (ValueError, ArithmeticError) as e:
+                    raise DBError(f"Строка {done + i + 1}: {e}")
+            method = "copy" if copy_ok and len(chunk) >= copy_threshold else "values"
+            t0 = time.perf_counter()
+            with conn.cursor() as cur:
+                if method == "copy":
+                    buf = io.StringIO("".join("\t".join(_copy_text(v) for v in r) + "\n" for r in chunk))
+                    cur.copy_expert(copy_q, buf)
+                else:
+                    execute_values(cur, insert_q, chunk, page_size=len(chunk))
+            conn.commit()
+            dt = time.perf_counter() - t0
+            done += len(chunk)
+            timings.append({"chunk": len(timings) + 1, "rows": len(chunk), "method": method,
+                            "seconds": dt, "rows_per_sec": len(chunk) / dt if dt > 0 else float("inf")})
+            if progress:
+                progress(done)
+    except Exception as e:
+        conn.rollback()
+        msg = e.args[0] if isinstance(e, DBError) else _humanize_pg_error(e)
+        raise DBError(f"{msg} (зафиксировано строк: {done})")
+    finally:
+        if done:
+            RESULT_CACHE.invalidate_tables({table})
+    return timings
+
+
 # -------- Logging / diagnostics --------
 
 def configure_logging(level: int = logging.INFO) -> None:
@@ -407,18 +2596,154 @@ def explain_select(conn: PGConnection, params: SelectParams) -> List[str]:
         raise DBError(_humanize_pg_error(e))
 
 
+LARGE_TABLE_ROWS = 100_000  # Seq Scan по таблице больше этого — замечание профилировщика
+MISESTIMATE_FACTOR = 10     # расхождение оценки и факта строк во столько раз — замечание
+
+
+@dataclass
+class PlanNode:
+    """Узел плана EXPLAIN (ANALYZE, FORMAT JSON). Время — мс на все циклы узла."""
+    node_type: str
+    relation: Optional[str] = None
+    detail: str = ""
+    plan_rows: float = 0.0
+    actual_rows: float = 0.0
+    loops: int = 0
+    total_ms: float = 0.0
+    self_ms: float = 0.0
+    total_cost: float = 0.0
+    shared_hit: int = 0
+    shared_read: int = 0
+    temp_read: int = 0
+    temp_written: int = 0
+    flags: List[str] = field(default_factory=list)
+    children: List["PlanNode"] = field(default_factory=list)
+    raw: Dict[str, Any] = field(default_factory=dict, repr=False)
+
+    def walk(self) -> Iterator["PlanNode"]:
+        yield self
+        for c in self.children:
+            yield from c.walk()
+
+
+@dataclass
+class PlanProfile:
+    """Результат explain_analyze: дерево узлов, время планирования/выполнения и исходный JSON."""
+    root: PlanNode
+    planning_ms: float
+    execution_ms: float
+    sql: str
+    raw: List[Dict[str, Any]] = field(default_factory=list, repr=False)
+
+    @property
+    def flags(self) -> List[Tuple[PlanNode, str]]:
+        return [(n, f) for n in self.root.walk() for f in n.flags]
+
+
+def _plan_detail(p: Dict[str, Any]) -> str:
+    parts = []
+    for key in ("Index Name", "Join Type", "Strategy", "Sort Key", "Group Key", "Hash Cond", "Index Cond",
+                "Recheck Cond", "Merge Cond", "Join Filter", "Filter"):
+        v = p.get(key)
+        if v:
+            parts.append(f"{key}: {', '.join(v) if isinstance(v, list) else v}")
+    return "; ".join(parts)
+
+
+def _plan_node(p: Dict[str, Any]) -> PlanNode:
+    loops = int(p.get("Actual Loops", 0))
+    node = PlanNode(
+        node_type=p.get("Node Type", "?"),
+        relation=p.get("Relation Name"),
+        detail=_plan_detail(p),
+        plan_rows=float(p.get("Plan Rows", 0)),
+        actual_rows=float(p.get("Actual Rows", 0)) * loops,
+        loops=loops,
+        total_ms=float(p.get("Actual Total Time", 0.0)) * loops,
+        total_cost=float(p.get("Total Cost", 0.0)),
+        shared_hit=int(p.get("Shared Hit Blocks", 0)),
+        shared_read=int(p.get("Shared Read Blocks", 0)),
+        temp_read=int(p.get("Temp Read Blocks", 0)),
+        temp_written=int(p.get("Temp Written Blocks", 0)),
+        children=[_plan_node(c) for c in p.get("Plans", [])],
+        raw=p,
+    )
+    # Время узла включает детей; своё время — разница (при параллельных узлах оценка приблизительная)
+    node.self_ms = max(0.0, node.total_ms - sum(c.total_ms for c in node.children
+                                                 if c.raw.get("Parent Relationship") != "InitPlan"))
+    return node
+
+
+def _flag_plan(node: PlanNode, table_rows: Dict[str, float], large_table_rows: int,
+               misestimate_factor: float) -> None:
+    p = node.raw
+    if node.loops == 0:
+        node.flags.append("узел не выполнялся")
+    else:
+        est = max(node.plan_rows * node.loops, 1.0)
+        act = max(node.actual_rows, 1.0)
+        if max(est, act) / min(est, act) >= misestimate_factor:
+            node.flags.append(f"оценка строк {node.plan_rows * node.loops:.0f}, факт {node.actual_rows:.0f} "
+                              f"(×{max(est, act) / min(est, act):.0f})")
+    if node.node_type == "Seq Scan" and node.relation and table_rows.get(node.relation, 0) >= large_table_rows:
+        node.flags.append(f"последовательное чтение большой таблицы (~{table_rows[node.relation]:.0f} строк)")
+    if p.get("Sort Space Type") == "Disk" or "external" in str(p.get("Sort Method", "")):
+        node.flags.append(f"сортировка на диске ({p.get('Sort Space Used', '?')} КБ)")
+    if int(p.get("Hash Batches", 1)) > 1:
+        node.flags.append(f"хэш-таблица не поместилась в work_mem ({p['Hash Batches']} пакетов)")
+    if int(p.get("HashAgg Batches", 0)) > 1 or int(p.get("Disk Usage", 0)) > 0:
+        node.flags.append(f"агрегация со сбросом на диск ({p.get('Disk Usage', '?')} КБ)")
+    if node.temp_written and not any("диск" in f or "work_mem" in f for f in node.flags):
+        node.flags.append(f"временные файлы: записано {node.temp_written} блоков")
+    for c in node.children:
+        _flag_plan(c, table_rows, large_table_rows, misestimate_factor)
+
+
+def explain_analyze(conn: PGConnection, params: SelectParams, buffers: bool = True, timing: bool = True,
+                    large_table_rows: int = LARGE_TABLE_ROWS,
+                    misestimate_factor: float = MISESTIMATE_FACTOR) -> PlanProfile:
+    """
+    Выполняет запрос под EXPLAIN (ANALYZE, BUFFERS, TIMING, FORMAT JSON) и разбирает план в дерево PlanNode
+    со своим временем узлов и замечаниями: расхождение оценки строк с фактом, Seq Scan по большой таблице,
+    сортировка/хэш/агрегация со сбросом на диск. Запрос действительно выполняется, поэтому транзакция
+    всегда откатывается.
+    """
+    q, args = build_select_sql(params)
+    opts = ["ANALYZE", f"BUFFERS {'TRUE' if buffers else 'FALSE'}", f"TIMING {'TRUE' if timing else 'FALSE'}",
+            "FORMAT JSON"]
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"EXPLAIN ({', '.join(opts)}) " + q, args)
+            raw = cur.fetchone()[0]
+            if isinstance(raw, str):
+                raw = json.loads(raw)
+            root = _plan_node(raw[0]["Plan"])
+            relations = sorted({n.relation for n in root.walk() if n.node_type == "Seq Scan" and n.relation})
+            table_rows: Dict[str, float] = {}
+            if relations:
+                cur.execute("SELECT relname, reltuples FROM pg_class "
+                            "WHERE relname = ANY(%s) AND relkind IN ('r', 'p', 'm')", (relations,))
+                table_rows = {name: float(n) for name, n in cur.fetchall()}
+    except Exception as e:
+        raise DBError(_humanize_pg_error(e))
+    finally:
+        conn.rollback()
+    _flag_plan(root, table_rows, large_table_rows, misestimate_factor)
+    return PlanProfile(root=root, planning_ms=float(raw[0].get("Planning Time", 0.0)),
+                       execution_ms=float(raw[0].get("Execution Time", 0.0)), sql=q, raw=raw)
+
+
 # -------- Convenience helpers for GUI --------
 
-def list_all_schema_objects(conn: PGConnection, schema: str = "public") -> Dict[str, Any]:
-    """Сводная информация по схеме: таблицы, столбцы, ограничения."""
+def list_all_schema_objects(conn: PGConnection, schema: str = "public",
+                            tables: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """
+    Сводная информация по схеме: таблицы, столбцы, ограничения.
+    Собирается пакетно (get_schema_catalog) — число запросов не зависит от числа таблиц.
+    """
     result: Dict[str, Any] = {"tables": []}
-    for t in [r["table"] for r in list_tables(conn, [schema])]:
-        result["tables"].append({
-            "name": t,
-            "columns": get_columns(conn, t, schema),
-            "constraints": get_constraints(conn, t, schema),
-            "foreign_keys": get_foreign_keys(conn, t, schema),
-        })
+    for t, entry in get_schema_catalog(conn, schema, tables).items():
+        result["tables"].append({"name": t, **entry})
     return result
 
 
@@ -443,18 +2768,36 @@ def rollback(conn: PGConnection):
 __all__ = [
     # подключение
     "get_connection", "DBError", "configure_logging", "ping",
+    "ConnectionPool", "get_pool", "close_pool", "pooled_connection",
+    # замер запросов
+    "QueryStat", "QueryStats", "QUERY_STATS", "query_fingerprint", "configure_slow_query_log",
+    "InstrumentedCursorMixin", "InstrumentedCursor", "InstrumentedRealDictCursor", "SLOW_QUERY_MS",
     # интроспекция
-    "list_tables", "get_columns", "get_constraints", "get_foreign_keys",
-    "list_all_schema_objects",
+    "list_tables", "get_columns", "get_constraints", "get_foreign_keys", "get_column_dependents",
+    "audit_unindexed_foreign_keys",
+    "get_schema_catalog", "list_all_schema_objects",
+    # кэш каталога
+    "CatalogCache", "CATALOG_CACHE", "DDL_NOTIFY_CHANNEL", "install_ddl_notify_trigger",
+    "ddl_notify_trigger_installed", "DDLListener",
     # ALTER TABLE
-    "AlterAction", "alter_table",
+    "AlterAction", "AlterStep", "alter_table", "plan_alter", "ALTER_LOCK_TIMEOUT_MS", "ALTER_LOCK_RETRIES",
+    "AlterImpact", "dry_run_alter", "describe_alter_impact", "ALTER_EXPENSIVE_SECONDS", "ALTER_EXPENSIVE_BYTES",
     # SELECT builder
-    "SelectParams", "build_select_sql", "execute_select", "explain_select",
+    "SelectParams", "build_select_sql", "execute_select", "explain_select", "KeysetPager", "FTS_CONFIG",
+    # профилировщик плана
+    "PlanNode", "PlanProfile", "explain_analyze", "LARGE_TABLE_ROWS", "MISESTIMATE_FACTOR",
+    # кэш результатов
+    "ResultCache", "RESULT_CACHE", "referenced_tables", "written_tables",
+    # подготовленные выражения
+    "PREPARED_MAX", "normalize_sql", "execute_prepared", "forget_prepared",
+    # потоковое чтение
+    "DEFAULT_BATCH_SIZE", "iter_select", "iter_select_rows", "iter_execute", "stream_select",
+    "execute_select_columnar",
     # строки
     "VALID_STRING_FUNCS", "apply_string_func",
     # util транзакций
     "begin", "commit", "rollback",
     # произвольный запрос
-    "safe_execute",
+    "safe_execute", "insert_row", "bulk_insert",
 ]
 
@@ -16,13 +16,27 @@ from typing import Any, Dict, List, Optional, Tuple, Literal
 from psycopg2.extras import Json
 from PyQt6.QtCore import QDateTime, QDate
 from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QBrush, QColor
 from PyQt6.QtWidgets import (
     QDialog, QWidget, QVBoxLayout, QHBoxLayout, QFormLayout, QGridLayout,
     QPushButton, QLabel, QLineEdit, QComboBox, QSpinBox, QTabWidget, QMessageBox,
-    QCheckBox, QDoubleSpinBox, QTextEdit, QDateEdit, QDateTimeEdit
+    QCheckBox, QDoubleSpinBox, QTextEdit, QDateEdit, QDateTimeEdit, QTableWidget, QTableWidgetItem,
+    QHeaderView, QAbstractItemView, QTreeWidget, QTreeWidgetItem
 )
 
-from database import AlterAction, alter_table, SelectParams, execute_select, apply_string_func
+from database import (
+    AlterAction, alter_table, SelectParams, execute_select, apply_string_func, insert_row, safe_execute,
+    CATALOG_CACHE, RESULT_CACHE, QUERY_STATS, explain_analyze, PlanNode, PlanProfile,
+    AlterImpact, dry_run_alter, describe_alter_impact, audit_unindexed_foreign_keys
+)
+import database
+from index_advisor import IndexProposal, advise_indexes
+from online_alter import online_alter_type
+from resultset import ResultSet
+from search import (SEARCH_MODES, SearchResult, search_table, trigram_index_proposal,
+                    create_trigram_index, FTS_MODE, FTS_COLUMN, FtsResult, fts_actions, fts_search,
+                    GLOBAL_SEARCH_MODES, GLOBAL_SEARCH_LIMIT, GLOBAL_SEARCH_TIMEOUT_MS)
+from workers import QueryRunner, CANCELLED_MSG
 
 logger = logging.getLogger(__name__)
 
@@ -74,6 +88,48 @@ class _BaseModalDialog(QDialog):
         self.setWindowTitle(title)
         self.setModal(True)
         self.setStyleSheet(BASE_STYLE)
+        self.runner = QueryRunner(self)
+        self._busy_buttons: List[QPushButton] = []
+        self._queued: Optional[Tuple[Any, tuple, dict]] = None
+        self.abort_btn = QPushButton("Прервать")
+        self.abort_btn.setStyleSheet(SMALL_BTNS_STYLE)
+        self.abort_btn.setEnabled(False)
+        self.abort_btn.clicked.connect(self.runner.cancel)
+        self.runner.busyChanged.connect(self._on_busy_changed)
+
+    def _run_db(self, fn, *args, on_result, on_progress=None, **kwargs):
+        """Выполняет функцию database.py в фоне; ошибки показываются в окне."""
+        self.runner.run(fn, *args, on_result=on_result, on_progress=on_progress,
+                        on_error=self._on_db_error, **kwargs)
+
+    def _run_db_next(self, fn, *args, **kwargs):
+        """
+        Как _run_db, но из обработчика результата: окно ещё занято завершающимся запросом,
+        поэтому следующий запускается, когда оно освободится.
+        """
+        if self.runner.busy:
+            self._queued = (fn, args, kwargs)
+        else:
+            self._run_db(fn, *args, **kwargs)
+
+    def _on_db_error(self, msg: str):
+        if msg == CANCELLED_MSG:
+            QMessageBox.information(self, "Отмена", msg)
+        else:
+            QMessageBox.critical(self, "Ошибка", msg)
+
+    def _on_busy_changed(self, busy: bool):
+        self.abort_btn.setEnabled(busy)
+        for b in self._busy_buttons:
+            b.setEnabled(not busy)
+        if not busy and self._queued is not None:
+            fn, args, kwargs = self._queued
+            self._queued = None
+            self._run_db(fn, *args, **kwargs)
+
+    def reject(self):
+        self.runner.cancel()
+        super().reject()
 
 
 # ---------------- SchemaEditorDialog ----------------
@@ -104,18 +160,31 @@ class SchemaEditorDialog(_BaseModalDialog):
 
         # Нижние кнопки — уменьшенного размера, белые с серой рамкой
         btns = QHBoxLayout()
+        # нагруженные таблицы: короткое ожидание блокировки с повторами, ограничения — NOT VALID + VALIDATE
+        self.safe_check = QCheckBox("Безопасный режим (lock_timeout, повторы, NOT VALID)")
+        self.safe_check.setToolTip("ALTER не встаёт в очередь за долгими запросами и держит "
+                                   "исключительную блокировку миллисекунды")
+        btns.addWidget(self.safe_check)
         btns.addStretch(1)
+        self.dry_run_btn = QPushButton("Оценить")
+        self.dry_run_btn.setStyleSheet(SMALL_BTNS_STYLE)
+        self.dry_run_btn.setToolTip("Блокировки, перезапись таблицы, размер и примерное время — без выполнения")
+        self.dry_run_btn.clicked.connect(lambda: self.apply_changes(dry_run=True))
+
         self.apply_btn = QPushButton("Применить")
         self.apply_btn.setStyleSheet(SMALL_BTNS_STYLE)
-        self.apply_btn.clicked.connect(self.apply_changes)
+        self.apply_btn.clicked.connect(lambda: self.apply_changes())
 
         self.cancel_btn = QPushButton("Отмена")
         self.cancel_btn.setStyleSheet(SMALL_BTNS_STYLE)
         self.cancel_btn.clicked.connect(self.reject)
 
+        btns.addWidget(self.dry_run_btn)
         btns.addWidget(self.apply_btn)
+        btns.addWidget(self.abort_btn)
         btns.addWidget(self.cancel_btn)
         root.addLayout(btns)
+        self._busy_buttons = [self.dry_run_btn, self.apply_btn]
 
     # ---- Вкладка «Столбцы»
     def _build_tab_columns(self):
@@ -206,6 +275,14 @@ class SchemaEditorDialog(_BaseModalDialog):
         twrap.setLayout(trow)
         f.addRow("Изменить тип (col → type):", twrap)
 
+        # теневой столбец + пачечное копирование: таблица не перезаписывается под блокировкой
+        self.type_online = QCheckBox("Онлайн (теневой столбец, копирование пачками)")
+        self.type_online.setToolTip("Для больших таблиц под нагрузкой. Нужен первичный ключ из одного столбца; "
+                                    "столбец не должен входить в индексы, ограничения и представления.")
+        f.addRow("", self.type_online)
+        self.type_progress = QLabel("")
+        f.addRow("", self.type_progress)
+
         self.tabs.addTab(w, "Типы")
 
     # ---- Вкладка «Ограничения»
@@ -259,6 +336,11 @@ class SchemaEditorDialog(_BaseModalDialog):
         fkrow.addWidget(QLabel("Имя ограничения:"), 3, 0); fkrow.addWidget(self.fk_name, 3, 1)
         f.addRow("Внешний ключ:", QWidget()); f.addRow(fkrow)
 
+        # без индекса по столбцу FK удаление строки родительской таблицы сканирует дочернюю целиком
+        self.fk_index_check = QCheckBox("Создать индекс по столбцу, если его нет (CONCURRENTLY)")
+        self.fk_index_check.setChecked(True)
+        f.addRow("", self.fk_index_check)
+
         self.drop_fk_name = QLineEdit()
         f.addRow("Удалить ограничение:", self.drop_fk_name)
 
@@ -266,7 +348,8 @@ class SchemaEditorDialog(_BaseModalDialog):
 
     # ---- Применение изменений (одной транзакцией)
     # ---- Применение изменений (одной транзакцией)
-    def apply_changes(self):
+    def apply_changes(self, dry_run: bool = False):
+        """dry_run=True — только показать оценку последствий (dry_run_alter), ничего не меняя."""
         try:
             actions: List[AlterAction] = []
 
@@ -319,16 +402,19 @@ class SchemaEditorDialog(_BaseModalDialog):
                         )
 
             # ----- Вкладка «Типы»
+            online: Optional[AlterAction] = None
             t2 = self.table_name_types.text().strip()
             if t2 and self.type_col.text().strip() and self.type_new.currentText().strip():
-                actions.append(
-                    AlterAction(
-                        kind="alter_type",
-                        table=t2,
-                        column=self.type_col.text().strip(),
-                        data_type=self.type_new.currentText().strip(),
-                    )
+                type_action = AlterAction(
+                    kind="alter_type",
+                    table=t2,
+                    column=self.type_col.text().strip(),
+                    data_type=self.type_new.currentText().strip(),
                 )
+                if self.type_online.isChecked():
+                    online = type_action
+                else:
+                    actions.append(type_action)
 
             # ----- Вкладка «Ограничения»
             t3 = self.table_name_cons.text().strip()
@@ -382,22 +468,65 @@ class SchemaEditorDialog(_BaseModalDialog):
                     )
                 )
 
-            if not actions:
+            if not actions and (online is None or dry_run):
                 QMessageBox.information(self, "Нет изменений", "Не указано ни одного действия.")
                 return
 
-            from database import get_connection
-            conn = get_connection()
-            try:
-                msg = alter_table(conn, actions)
-                QMessageBox.information(self, "Успех", msg)
-                self.accept()
-            finally:
-                conn.close()
+            if dry_run:
+                self._run_db(dry_run_alter, actions, safe=self.safe_check.isChecked(),
+                             index_foreign_keys=self.fk_index_check.isChecked(),
+                             on_result=lambda impacts: QMessageBox.information(
+                                 self, "Оценка изменений", describe_alter_impact(impacts)))
+            elif actions:
+                # сначала оценка последствий: долгие команды под блокировкой требуют подтверждения
+                self._run_db(dry_run_alter, actions, safe=self.safe_check.isChecked(),
+                             index_foreign_keys=self.fk_index_check.isChecked(),
+                             on_result=lambda impacts: self._confirm_apply(impacts, actions, online))
+            else:
+                self._start_apply(actions, online)
 
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"{e}")
 
+    def _confirm_apply(self, impacts: List[AlterImpact], actions: List[AlterAction], online: Optional[AlterAction]):
+        expensive = [im for im in impacts if im.expensive]
+        if expensive:
+            ans = QMessageBox.warning(
+                self, "Долгие изменения под блокировкой",
+                "Эти команды надолго запретят запись в таблицу:\n\n" + describe_alter_impact(expensive) +
+                "\n\nПрименить изменения?",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, QMessageBox.StandardButton.No)
+            if ans != QMessageBox.StandardButton.Yes:
+                return
+        self._start_apply(actions, online)
+
+    def _start_apply(self, actions: List[AlterAction], online: Optional[AlterAction]):
+        if online is None:
+            self._run_db_next(alter_table, actions, safe=self.safe_check.isChecked(),
+                              index_foreign_keys=self.fk_index_check.isChecked(), on_result=self._on_applied)
+        else:
+            self._run_db_next(_apply_schema_changes, actions, online, safe=self.safe_check.isChecked(),
+                              index_foreign_keys=self.fk_index_check.isChecked(),
+                              on_result=self._on_applied, on_progress=self._on_online_progress)
+
+    def _on_online_progress(self, p: Dict[str, Any]):
+        stages = {"prepare": "подготовка", "backfill": "копирование", "not_null": "NOT NULL", "swap": "подмена"}
+        self.type_progress.setText(f"{stages.get(p['stage'], p['stage'])}: {p['done']} из ~{p['total']} строк")
+
+    def _on_applied(self, msg: str):
+        QMessageBox.information(self, "Успех", msg)
+        self.accept()
+
+
+def _apply_schema_changes(conn, actions: List[AlterAction], online: AlterAction, safe: bool = False,
+                          index_foreign_keys: bool = False, progress=None) -> str:
+    """Обычные действия одной транзакцией alter_table, затем онлайн-изменение типа (своими транзакциями)."""
+    messages = [alter_table(conn, actions, safe=safe, index_foreign_keys=index_foreign_keys)] if actions else []
+    res = online_alter_type(conn, online.table, online.column, online.data_type, progress=progress)
+    messages.append(f"Тип {online.table}.{online.column} изменён онлайн: {res['rows']} строк, "
+                    f"{res['batches']} пачек.")
+    return "\n".join(messages)
+
 
 class SelectBuilderDialog(_BaseModalDialog):
     """
@@ -407,7 +536,9 @@ class SelectBuilderDialog(_BaseModalDialog):
 
     def __init__(self, parent: Optional[QWidget]=None):
         super().__init__("Конструктор SELECT", parent)
-        self.result_rows: Optional[List[Dict[str, Any]]] = None
+        self.result_rows: Optional[ResultSet] = None
+        self.result_params: Optional[SelectParams] = None
+        self.use_cache = False
         self._setup_ui()
 
     def _setup_ui(self):
@@ -425,6 +556,8 @@ class SelectBuilderDialog(_BaseModalDialog):
         self._build_tab_where()
         self._build_tab_group_having()
         self._build_tab_order_limit()
+        self._build_tab_plan()
+        self._build_tab_indexes()
 
         root.addWidget(self.tabs)
 
@@ -446,8 +579,10 @@ class SelectBuilderDialog(_BaseModalDialog):
 
         btns.addWidget(self.preview_btn)
         btns.addWidget(self.ok_btn)
+        btns.addWidget(self.abort_btn)
         btns.addWidget(self.cancel_btn)
         root.addLayout(btns)
+        self._busy_buttons = [self.preview_btn, self.ok_btn, self.profile_btn, self.advise_btn, self.apply_index_btn]
 
     # ---- Таблицы и JOIN-ы
     def _build_tab_tables_and_joins(self):
@@ -592,7 +727,7 @@ class SelectBuilderDialog(_BaseModalDialog):
         # Одно условие за раз, кнопка "Добавить" накапливает
         grid = QGridLayout()
         self.where_col = QLineEdit(); self.where_col.setPlaceholderText("e.name")
-        self.where_op = QComboBox(); self.where_op.addItems(["=", "<>", "<", ">", "<=", ">=", "LIKE", "ILIKE", "~", "~*", "!~", "!~*"])
+        self.where_op = QComboBox(); self.where_op.addItems(["=", "<>", "<", ">", "<=", ">=", "LIKE", "ILIKE", "~", "~*", "!~", "!~*", "@@"])
         self.where_val = QLineEdit(); self.where_val.setPlaceholderText("Значение (подставится как параметр)")
         grid.addWidget(QLabel("Колонка:"), 0, 0); grid.addWidget(self.where_col, 0, 1)
         grid.addWidget(QLabel("Оператор:"), 1, 0); grid.addWidget(self.where_op, 1, 1)
@@ -709,6 +844,10 @@ class SelectBuilderDialog(_BaseModalDialog):
         lay.addRow("LIMIT:", self.limit_spin)
         lay.addRow("OFFSET:", self.offset_spin)
 
+        # повторные запуски того же запроса берутся из памяти (database.RESULT_CACHE)
+        self.cache_check = QCheckBox("Кэшировать результат")
+        lay.addRow("Кэш:", self.cache_check)
+
         self.tabs.addTab(w, "ORDER/LIMIT")
 
     def _on_add_order(self):
@@ -725,6 +864,145 @@ class SelectBuilderDialog(_BaseModalDialog):
         self.order_list.clear()
         QMessageBox.information(self, "ORDER BY", "Список сортировок очищен.")
 
+    # ---- План выполнения (EXPLAIN ANALYZE)
+    PLAN_HEADERS = ["Узел", "Объект", "Строк (план)", "Строк (факт)", "Циклы", "Время, мс", "Своё, мс",
+                    "Буферы hit/read", "Замечания"]
+
+    def _build_tab_plan(self):
+        w = QWidget()
+        lay = QVBoxLayout(w)
+
+        top = QHBoxLayout()
+        self.profile_btn = QPushButton("Профилировать (EXPLAIN ANALYZE)")
+        self.profile_btn.setStyleSheet(SMALL_BTNS_STYLE)
+        self.profile_btn.clicked.connect(self.on_profile)
+        self.plan_summary = QLabel("Запрос выполняется на сервере, транзакция затем откатывается.")
+        top.addWidget(self.profile_btn)
+        top.addWidget(self.plan_summary, 1)
+        lay.addLayout(top)
+
+        self.plan_tree = QTreeWidget()
+        self.plan_tree.setColumnCount(len(self.PLAN_HEADERS))
+        self.plan_tree.setHeaderLabels(self.PLAN_HEADERS)
+        self.plan_tree.itemSelectionChanged.connect(self._on_plan_node_selected)
+        lay.addWidget(self.plan_tree, 1)
+
+        self.plan_detail = QTextEdit(); self.plan_detail.setReadOnly(True); self.plan_detail.setMaximumHeight(90)
+        lay.addWidget(self.plan_detail)
+
+        self.tabs.addTab(w, "План")
+
+    def on_profile(self):
+        try:
+            params = self._collect_params()
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"{e}")
+            return
+        self._run_db(explain_analyze, params, on_result=self._show_plan)
+
+    def _show_plan(self, profile: PlanProfile):
+        self.plan_tree.clear()
+        slowest = max((n.self_ms for n in profile.root.walk()), default=0.0)
+
+        def add(node: PlanNode, parent):
+            values = [node.node_type, node.relation or "", f"{node.plan_rows * max(node.loops, 1):.0f}",
+                      f"{node.actual_rows:.0f}", str(node.loops), f"{node.total_ms:.2f}", f"{node.self_ms:.2f}",
+                      f"{node.shared_hit}/{node.shared_read}", "; ".join(node.flags)]
+            item = QTreeWidgetItem(parent, values)
+            item.setData(0, Qt.ItemDataRole.UserRole, node.detail)
+            for c in range(2, 8):
+                item.setTextAlignment(c, Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+            if node.flags:
+                for c in range(len(values)):
+                    item.setBackground(c, QBrush(QColor("#FDECEC")))
+            if slowest and node.self_ms == slowest:
+                font = item.font(6); font.setBold(True); item.setFont(6, font)
+            for child in node.children:
+                add(child, item)
+            return item
+
+        add(profile.root, self.plan_tree)
+        self.plan_tree.expandAll()
+        for c in range(len(self.PLAN_HEADERS) - 1):
+            self.plan_tree.resizeColumnToContents(c)
+        self.plan_summary.setText(
+            f"Планирование: {profile.planning_ms:.2f} мс; выполнение: {profile.execution_ms:.2f} мс; "
+            f"замечаний: {len(profile.flags)}")
+
+    def _on_plan_node_selected(self):
+        items = self.plan_tree.selectedItems()
+        self.plan_detail.setPlainText(items[0].data(0, Qt.ItemDataRole.UserRole) if items else "")
+
+    # ---- Советник индексов
+    INDEX_HEADERS = ["Таблица", "Индекс", "Выигрыш", "Основание", "Существующий"]
+
+    def _build_tab_indexes(self):
+        w = QWidget()
+        lay = QVBoxLayout(w)
+
+        top = QHBoxLayout()
+        self.advise_btn = QPushButton("Подобрать индексы")
+        self.advise_btn.setStyleSheet(SMALL_BTNS_STYLE)
+        self.advise_btn.clicked.connect(self.on_advise_indexes)
+        self.apply_index_btn = QPushButton("Создать выбранный индекс")
+        self.apply_index_btn.setStyleSheet(SMALL_BTNS_STYLE)
+        self.apply_index_btn.clicked.connect(self.on_apply_index)
+        top.addWidget(self.advise_btn); top.addWidget(self.apply_index_btn); top.addStretch(1)
+        lay.addLayout(top)
+
+        self.index_table = QTableWidget(0, len(self.INDEX_HEADERS))
+        self.index_table.setHorizontalHeaderLabels(self.INDEX_HEADERS)
+        self.index_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.index_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.index_table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.index_table.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeMode.Stretch)
+        lay.addWidget(self.index_table, 1)
+        self._proposals: List[IndexProposal] = []
+
+        self.tabs.addTab(w, "Индексы")
+
+    def on_advise_indexes(self):
+        try:
+            params = self._collect_params()
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"{e}")
+            return
+        self._run_db(advise_indexes, params, on_result=self._show_proposals)
+
+    def _show_proposals(self, proposals: List[IndexProposal]):
+        self._proposals = proposals
+        self.index_table.setRowCount(len(proposals))
+        for r, p in enumerate(proposals):
+            benefit = f"{p.benefit:.0%}" if p.benefit is not None else "—"
+            cols = ", ".join(p.columns)
+            values = [p.table, f"{p.method} ({cols})", benefit, p.reason, p.existing or ""]
+            for c, v in enumerate(values):
+                item = QTableWidgetItem(v)
+                item.setToolTip(p.ddl)
+                self.index_table.setItem(r, c, item)
+        self.index_table.resizeColumnsToContents()
+        if not proposals:
+            QMessageBox.information(self, "Индексы", "Запрос не использует столбцы, которым помог бы индекс.")
+
+    def on_apply_index(self):
+        row = self.index_table.currentRow()
+        if not 0 <= row < len(self._proposals):
+            QMessageBox.warning(self, "Индексы", "Выберите предложение в таблице.")
+            return
+        p = self._proposals[row]
+        if p.existing:
+            QMessageBox.information(self, "Индексы", f"Доступ уже обслуживает индекс {p.existing}.")
+            return
+        if QMessageBox.question(self, "Создать индекс", f"{p.ddl}\n\nИндекс строится без блокировки записи, "
+                                "но на большой таблице это может занять время. Продолжить?") \
+                != QMessageBox.StandardButton.Yes:
+            return
+
+        def done(msg: str):
+            QMessageBox.information(self, "Индексы", msg)
+            self.on_advise_indexes()
+        self._run_db(alter_table, [p.to_action()], on_result=done)
+
     # ---- Построение параметров и выполнение
     def _collect_params(self) -> SelectParams:
         # таблицы
@@ -760,48 +1038,54 @@ class SelectBuilderDialog(_BaseModalDialog):
     def on_preview(self):
         try:
             params = self._collect_params()
-            from database import get_connection, build_select_sql
-            conn = get_connection()
-            try:
-                sql_text, args = build_select_sql(params)
-                # Предпросмотр: покажем собранный SQL и число строк
-                rows = execute_select(conn, params)
-                self.result_rows = rows
-                QMessageBox.information(
-                    self, "Предпросмотр",
-                    f"SQL:\n{sql_text}\n\nПараметры: {args}\n\nСтрок: {len(rows)}"
-                )
-            finally:
-                conn.close()
+            from database import build_select_sql
+            sql_text, args = build_select_sql(params)
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"{e}")
+            return
+
+        # Предпросмотр: покажем собранный SQL и число строк
+        use_cache = self.cache_check.isChecked()
+
+        def done(rows):
+            self.result_rows = rows
+            cache_info = ""
+            if use_cache:
+                st = RESULT_CACHE.stats()
+                cache_info = f"\nКэш: попаданий {st['hits']}, промахов {st['misses']}"
+            QMessageBox.information(
+                self, "Предпросмотр",
+                f"SQL:\n{sql_text}\n\nПараметры: {args}\n\nСтрок: {len(rows)}{cache_info}"
+            )
+        self._run_db(execute_select, params, use_cache=use_cache, on_result=done)
 
     def on_accept(self):
         try:
             params = self._collect_params()
-            from database import get_connection
-            conn = get_connection()
-            try:
-                rows = execute_select(conn, params)
-                self.result_rows = rows
-                # Здесь мы просто показываем итог — интеграцию с DataView сделаем из windows.py
-                QMessageBox.information(self, "Выполнено", f"Получено строк: {len(rows)}")
-                self.accept()
-            finally:
-                conn.close()
+            from database import build_select_sql
+            build_select_sql(params)  # проверяем, что запрос собирается
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"{e}")
+            return
+        # Сам запрос выполняет главное окно: строки читаются потоково прямо в таблицу (DataView),
+        # а с включённым кэшем — целиком через execute_select(use_cache=True)
+        self.result_params = params
+        self.use_cache = self.cache_check.isChecked()
+        self.accept()
 # ---------------- SearchDialog ----------------
 
 class SearchDialog(_BaseModalDialog):
     """
     Поиск по тексту с выбором режима:
-    LIKE, ILIKE, ~, ~*, !~, !~*
+    LIKE, ILIKE, ~, ~*, !~, !~*, @@ (полнотекстовый)
     Возвращает число найденных строк (интеграция с DataView — в windows.py).
+    Сообщает, помог ли индекс, и предлагает триграммный индекс, если поиск шёл полным просмотром.
+    В режиме @@ колонки перечисляются через запятую (по убыванию веса); при необходимости предлагается
+    создать или обновить столбец tsvector с GIN-индексом. Результат — страница, упорядоченная по ts_rank.
     """
     def __init__(self, parent: Optional[QWidget]=None):
         super().__init__("Поиск", parent)
-        self.result_rows: Optional[List[Dict[str, Any]]] = None
+        self.result_rows: Optional[ResultSet] = None
         self._setup_ui()
 
     def _setup_ui(self):
@@ -814,13 +1098,18 @@ class SearchDialog(_BaseModalDialog):
         form = QFormLayout()
         self.table_edit = QLineEdit(); self.table_edit.setPlaceholderText("Например: experiments")
         self.column_edit = QLineEdit(); self.column_edit.setPlaceholderText("Например: name")
-        self.mode_box = QComboBox(); self.mode_box.addItems(["LIKE", "ILIKE", "~", "~*", "!~", "!~*"])
+        self.mode_box = QComboBox(); self.mode_box.addItems(SEARCH_MODES + [FTS_MODE])
+        self.mode_box.setToolTip(f"{FTS_MODE} — полнотекстовый поиск по словам: \"фраза\", or, -исключить")
+        self.mode_box.currentTextChanged.connect(self._on_mode_changed)
         self.value_edit = QLineEdit(); self.value_edit.setPlaceholderText("Значение для поиска")
+        self.page_spin = QSpinBox(); self.page_spin.setRange(1, 100000); self.page_spin.setValue(1)
+        self.page_spin.setEnabled(False)
 
         form.addRow("Таблица:", self.table_edit)
         form.addRow("Колонка:", self.column_edit)
         form.addRow("Режим:", self.mode_box)
         form.addRow("Значение:", self.value_edit)
+        form.addRow("Страница:", self.page_spin)
         root.addLayout(form)
 
         btns = QHBoxLayout()
@@ -829,8 +1118,14 @@ class SearchDialog(_BaseModalDialog):
         self.ok_btn.clicked.connect(self.on_search)
         self.cancel_btn = QPushButton("Отмена"); self.cancel_btn.setStyleSheet(SMALL_BTNS_STYLE)
         self.cancel_btn.clicked.connect(self.reject)
-        btns.addWidget(self.ok_btn); btns.addWidget(self.cancel_btn)
+        btns.addWidget(self.ok_btn); btns.addWidget(self.abort_btn); btns.addWidget(self.cancel_btn)
         root.addLayout(btns)
+        self._busy_buttons = [self.ok_btn]
+
+    def _on_mode_changed(self, mode: str):
+        fts = mode == FTS_MODE
+        self.page_spin.setEnabled(fts)
+        self.column_edit.setPlaceholderText("Например: name, description" if fts else "Например: name")
 
     def on_search(self):
         table = self.table_edit.text().strip()
@@ -838,30 +1133,141 @@ class SearchDialog(_BaseModalDialog):
         mode = self.mode_box.currentText().strip()
         val = self.value_edit.text()
 
+        if mode == FTS_MODE:
+            if not table:
+                QMessageBox.warning(self, "Поиск", "Укажите таблицу.")
+                return
+            # сначала — чего не хватает столбцу tsvector: возможно, его нужно создать или перестроить
+            self._run_db(fts_actions, table, self._fts_columns(), on_result=self._on_fts_plan)
+            return
+
         if not (table and col):
             QMessageBox.warning(self, "Поиск", "Укажите таблицу и колонку.")
             return
 
-        from database import get_connection
-        conn = get_connection()
-        try:
-            # Собираем параметризованный запрос
-            if mode in ("LIKE", "ILIKE", "~", "~*", "!~", "!~*"):
-                op = mode
-            else:
-                op = "LIKE"
+        if mode not in SEARCH_MODES:
+            mode = "LIKE"
 
-            # Пример: SELECT * FROM table WHERE col <op> %s LIMIT 200
-            q = f"SELECT * FROM {table} WHERE {col} {op} %s LIMIT 200"
-            from database import safe_execute
-            rows = safe_execute(conn, q, [val])
-            self.result_rows = rows
-            QMessageBox.information(self, "Результат", f"Найдено строк: {len(rows)}")
+        # SELECT * FROM table WHERE col <mode> %s LIMIT 200 — выражение готовится один раз на соединение
+        self._run_db(search_table, table, col, val, mode, on_result=self._on_found)
+
+    def _fts_columns(self) -> List[str]:
+        return [c.strip() for c in self.column_edit.text().split(",") if c.strip()]
+
+    def _on_fts_plan(self, actions: List[AlterAction]):
+        if not actions:
+            self._search_fts()
+            return
+        kinds = {a.kind for a in actions}
+        if "add_column" in kinds:
+            verb = "пересоздан" if "drop_column" in kinds else "добавлен"
+            what = (f"Столбец {FTS_COLUMN} ({', '.join(self._fts_columns())}) будет {verb} с перезаписью таблицы, "
+                    "затем построен GIN-индекс без блокировки записи.")
+        else:
+            what = f"Будет построен GIN-индекс по {FTS_COLUMN} без блокировки записи."
+        ans = QMessageBox.question(self, "Полнотекстовый поиск", f"{what}\n\nПродолжить?")
+        if ans == QMessageBox.StandardButton.Yes:
+            self._run_db_next(alter_table, actions, on_result=self._on_fts_ready)
+        elif kinds != {"add_column", "create_index"}:
+            # столбец уже есть — ищем по нему как есть
+            self._search_fts()
+
+    def _on_fts_ready(self, msg: str):
+        logger.info(msg)
+        self._search_fts()
+
+    def _search_fts(self):
+        self._run_db_next(fts_search, self.table_edit.text().strip(), self.value_edit.text(),
+                          self.page_spin.value() - 1, on_result=self._on_fts_found)
+
+    def _on_fts_found(self, res: FtsResult):
+        self.result_rows = res.rows
+        access = f"по индексу {res.index}" if res.index_assisted else "полным просмотром таблицы"
+        more = " Есть следующая страница." if res.has_more else ""
+        QMessageBox.information(
+            self, "Результат",
+            f"Страница {res.page + 1}: строк {len(res.rows)} за {res.elapsed_ms:.0f} мс, поиск {access}, "
+            f"по убыванию релевантности (rank).{more}")
+        self.accept()
+
+    def _on_found(self, res: SearchResult):
+        self.result_rows = res.rows
+        access = (f"по индексу {res.index}" if res.index_assisted else "полным просмотром таблицы")
+        text = f"Найдено строк: {len(res.rows)} за {res.elapsed_ms:.0f} мс, поиск {access}."
+        if not res.can_add_index:
+            QMessageBox.information(self, "Результат", text)
             self.accept()
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"{e}")
-        finally:
-            conn.close()
+            return
+        proposal = trigram_index_proposal(self.table_edit.text().strip(), self.column_edit.text().strip())
+        ans = QMessageBox.question(
+            self, "Результат",
+            f"{text}\n\nТриграммный индекс ускорит поиск по шаблону и регулярному выражению:\n{proposal.ddl}\n\n"
+            "Индекс строится без блокировки записи. Создать?")
+        if ans != QMessageBox.StandardButton.Yes:
+            self.accept()
+            return
+        self._run_db_next(create_trigram_index, self.table_edit.text().strip(), self.column_edit.text().strip(),
+                          on_result=self._on_index_created)
+
+    def _on_index_created(self, msg: str):
+        QMessageBox.information(self, "Индекс", msg)
+        self.accept()
+
+
+class GlobalSearchDialog(_BaseModalDialog):
+    """
+    Параметры поиска значения во всех строковых столбцах схемы (search.global_search).
+    Сам поиск выполняет главное окно: находки дописываются в таблицу по мере готовности таблиц.
+    """
+    def __init__(self, parent: Optional[QWidget]=None):
+        super().__init__("Поиск по всей схеме", parent)
+        self.result_params: Optional[Dict[str, Any]] = None
+        self._setup_ui()
+
+    def _setup_ui(self):
+        root = QVBoxLayout(self)
+
+        title = QLabel("Поиск по всем таблицам схемы")
+        title.setStyleSheet("font-style: italic; font-size: 14pt;")
+        root.addWidget(title)
+
+        form = QFormLayout()
+        self.value_edit = QLineEdit(); self.value_edit.setPlaceholderText("Например: %exp 1% (шаблон LIKE)")
+        self.mode_box = QComboBox(); self.mode_box.addItems(GLOBAL_SEARCH_MODES)
+        self.schema_edit = QLineEdit("public")
+        self.limit_spin = QSpinBox(); self.limit_spin.setRange(1, 100000); self.limit_spin.setValue(GLOBAL_SEARCH_LIMIT)
+        self.timeout_spin = QSpinBox(); self.timeout_spin.setRange(100, 3600000); self.timeout_spin.setSingleStep(1000)
+        self.timeout_spin.setValue(GLOBAL_SEARCH_TIMEOUT_MS); self.timeout_spin.setSuffix(" мс")
+
+        form.addRow("Значение:", self.value_edit)
+        form.addRow("Режим:", self.mode_box)
+        form.addRow("Схема:", self.schema_edit)
+        form.addRow("Не больше находок:", self.limit_spin)
+        form.addRow("Таймаут на таблицу:", self.timeout_spin)
+        root.addLayout(form)
+
+        btns = QHBoxLayout()
+        btns.addStretch(1)
+        self.ok_btn = QPushButton("Искать"); self.ok_btn.setStyleSheet(SMALL_BTNS_STYLE)
+        self.ok_btn.clicked.connect(self.on_accept)
+        self.cancel_btn = QPushButton("Отмена"); self.cancel_btn.setStyleSheet(SMALL_BTNS_STYLE)
+        self.cancel_btn.clicked.connect(self.reject)
+        btns.addWidget(self.ok_btn); btns.addWidget(self.cancel_btn)
+        root.addLayout(btns)
+
+    def on_accept(self):
+        value = self.value_edit.text()
+        if not value:
+            QMessageBox.warning(self, "Поиск", "Укажите значение для поиска.")
+            return
+        self.result_params = {
+            "value": value,
+            "mode": self.mode_box.currentText(),
+            "schema": self.schema_edit.text().strip() or "public",
+            "limit": self.limit_spin.value(),
+            "timeout_ms": self.timeout_spin.value(),
+        }
+        self.accept()
 
 
 # ---------------- StringFuncsDialog ----------------
@@ -874,7 +1280,7 @@ class StringFuncsDialog(_BaseModalDialog):
     """
     def __init__(self, parent: Optional[QWidget]=None):
         super().__init__("Строковые функции", parent)
-        self.result_rows: Optional[List[Dict[str, Any]]] = None
+        self.result_rows: Optional[ResultSet] = None
         self._setup_ui()
 
     def _setup_ui(self):
@@ -911,8 +1317,9 @@ class StringFuncsDialog(_BaseModalDialog):
         self.cancel_btn = QPushButton("Закрыть")
         self.cancel_btn.setStyleSheet(SMALL_BTNS_STYLE)
         self.cancel_btn.clicked.connect(self.reject)
-        btns.addWidget(self.preview_btn); btns.addWidget(self.cancel_btn)
+        btns.addWidget(self.preview_btn); btns.addWidget(self.abort_btn); btns.addWidget(self.cancel_btn)
         root.addLayout(btns)
+        self._busy_buttons = [self.preview_btn]
 
     def on_preview(self):
         table = self.table_edit.text().strip()
@@ -953,18 +1360,13 @@ class StringFuncsDialog(_BaseModalDialog):
         else:
             extra_args = []
 
-        from database import get_connection
-        conn = get_connection()
-        try:
-            rows = apply_string_func(conn, table, col, func, *extra_args)
-            self.result_rows = rows
-            # Покажем только количество — вывод в таблицу сделаем из windows.py
-            QMessageBox.information(self, "Предпросмотр", f"Получено строк: {len(rows)}")
-            self.accept()
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"{e}")
-        finally:
-            conn.close()
+        self._run_db(apply_string_func, table, col, func, *extra_args, on_result=self._on_applied)
+
+    def _on_applied(self, rows):
+        self.result_rows = rows
+        # Покажем только количество — вывод в таблицу сделаем из windows.py
+        QMessageBox.information(self, "Предпросмотр", f"Получено строк: {len(rows)}")
+        self.accept()
 
 class InsertRowDialog(_BaseModalDialog):
     """
@@ -1017,8 +1419,9 @@ class InsertRowDialog(_BaseModalDialog):
         self.cancel_btn = QPushButton("Отмена")
         self.cancel_btn.setStyleSheet(SMALL_BTNS_STYLE)
         self.cancel_btn.clicked.connect(self.reject)
-        btns.addWidget(self.save_btn); btns.addWidget(self.cancel_btn)
+        btns.addWidget(self.save_btn); btns.addWidget(self.abort_btn); btns.addWidget(self.cancel_btn)
         root.addLayout(btns)
+        self._busy_buttons = [self.load_btn, self.save_btn]
 
     # ---- helpers
 
@@ -1056,15 +1459,11 @@ class InsertRowDialog(_BaseModalDialog):
             QMessageBox.warning(self, "Таблица", "Укажите имя таблицы.")
             return
 
-        from database import get_connection, get_columns
-        conn = get_connection()
-        try:
-            self._cols_meta = get_columns(conn, tbl, schema="public")
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"{e}")
-            conn.close()
-            return
+        self._run_db(CATALOG_CACHE.columns, tbl, schema="public",
+                     on_result=lambda cols: self._build_editors(tbl, cols))
 
+    def _build_editors(self, tbl: str, cols_meta: List[Dict[str, Any]]):
+        self._cols_meta = cols_meta
         self.table_name = tbl
         # Очистим старые редакторы
         while self.fields_layout.rowCount():
@@ -1097,7 +1496,6 @@ class InsertRowDialog(_BaseModalDialog):
 
         if not self._editors:
             QMessageBox.information(self, "Поля", "Нет редактируемых полей (все авто).")
-        conn.close()
 
     def _collect_values(self) -> Tuple[List[str], List[Any]]:
         cols: List[str] = []
@@ -1162,26 +1560,184 @@ class InsertRowDialog(_BaseModalDialog):
             QMessageBox.warning(self, "Данные", "Не указано ни одного значения.")
             return
 
-        try:
-            from database import get_connection
-            conn = get_connection()
-            try:
-                # Чистый безопасный INSERT без лишней магии обёрток
-                placeholders = ", ".join(["%s"] * len(cols))
-                col_list = ", ".join([f'"{c}"' for c in cols])  # экранируем идентификаторы простыми кавычками
-                q = f'INSERT INTO "{self.table_name}" ({col_list}) VALUES ({placeholders})'
-
-                cur = conn.cursor()
-                cur.execute(q, vals)
-                conn.commit()
-
-                QMessageBox.information(self, "Готово", "Запись добавлена.")
-                self.accept()
-            finally:
-                conn.close()
-        except Exception as e:
-            # Любая ошибка БД/валидации — показываем в диалоге, а не падаем процессом
-            QMessageBox.critical(self, "Ошибка вставки", f"{e}")
+        # Любая ошибка БД/валидации — показываем в диалоге, а не падаем процессом
+        self._run_db(insert_row, self.table_name, cols, vals, on_result=self._on_saved)
+
+    def _on_saved(self, _):
+        QMessageBox.information(self, "Готово", "Запись добавлена.")
+        self.accept()
+
+
+# ---------------- QueryStatsDialog ----------------
+
+class QueryStatsDialog(_BaseModalDialog):
+    """
+    Топ отпечатков запросов из QUERY_STATS: вызовы, суммарное/среднее/p95/максимальное время,
+    строки и байты. Данные собираются курсорами database.py, к БД диалог не обращается.
+    """
+
+    SORT_KEYS = [("Общее время", "total_ms"), ("Вызовы", "calls"), ("Среднее время", "mean_ms"),
+                 ("Максимум", "max_ms"), ("Строки", "rows"), ("Байты", "bytes")]
+    HEADERS = ["Отпечаток", "Запрос", "Вызовы", "Всего, мс", "Среднее, мс", "p95, мс", "Макс, мс",
+               "Строки", "КБ", "Медленных", "Ошибок"]
+
+    def __init__(self, parent: Optional[QWidget] = None):
+        super().__init__("Статистика запросов", parent)
+        self._stats = []
+        self._setup_ui()
+        self.refresh()
+
+    def _setup_ui(self):
+        root = QVBoxLayout(self)
+
+        title = QLabel("Запросы по суммарному времени")
+        title.setStyleSheet("font-style: italic; font-size: 14pt;")
+        root.addWidget(title)
+
+        opts = QHBoxLayout()
+        self.top_spin = QSpinBox(); self.top_spin.setRange(1, 500); self.top_spin.setValue(20)
+        self.sort_box = QComboBox(); self.sort_box.addItems([label for label, _ in self.SORT_KEYS])
+        self.top_spin.valueChanged.connect(self.refresh)
+        self.sort_box.currentIndexChanged.connect(self.refresh)
+        opts.addWidget(QLabel("Показать:")); opts.addWidget(self.top_spin)
+        opts.addWidget(QLabel("Сортировка:")); opts.addWidget(self.sort_box)
+        opts.addStretch(1)
+        root.addLayout(opts)
+
+        self.table = QTableWidget(0, len(self.HEADERS))
+        self.table.setHorizontalHeaderLabels(self.HEADERS)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.table.currentCellChanged.connect(self._on_row_changed)
+        root.addWidget(self.table, 1)
+
+        self.query_text = QTextEdit(); self.query_text.setReadOnly(True); self.query_text.setMaximumHeight(120)
+        root.addWidget(self.query_text)
+
+        self.summary = QLabel("")
+        root.addWidget(self.summary)
+
+        btns = QHBoxLayout()
+        btns.addStretch(1)
+        self.refresh_btn = QPushButton("Обновить"); self.refresh_btn.setStyleSheet(SMALL_BTNS_STYLE)
+        self.refresh_btn.clicked.connect(self.refresh)
+        self.reset_btn = QPushButton("Сбросить"); self.reset_btn.setStyleSheet(SMALL_BTNS_STYLE)
+        self.reset_btn.clicked.connect(self.on_reset)
+        self.close_btn = QPushButton("Закрыть"); self.close_btn.setStyleSheet(SMALL_BTNS_STYLE)
+        self.close_btn.clicked.connect(self.accept)
+        btns.addWidget(self.refresh_btn); btns.addWidget(self.reset_btn); btns.addWidget(self.close_btn)
+        root.addLayout(btns)
+        self.resize(1000, 560)
+
+    def refresh(self):
+        by = self.SORT_KEYS[self.sort_box.currentIndex()][1]
+        self._stats = QUERY_STATS.top(self.top_spin.value(), by=by)
+        self.table.setRowCount(len(self._stats))
+        for r, st in enumerate(self._stats):
+            values = [st.fingerprint, st.query, st.calls, f"{st.total_ms:.1f}", f"{st.mean_ms:.2f}",
+                      f"{st.percentile(95):.1f}", f"{st.max_ms:.1f}", st.rows, st.bytes // 1024, st.slow, st.errors]
+            for c, v in enumerate(values):
+                item = QTableWidgetItem(str(v))
+                if c >= 2:
+                    item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                self.table.setItem(r, c, item)
+        total = sum(st.total_ms for st in self._stats)
+        self.summary.setText(
+            f"Отпечатков: {len(self._stats)}; время в таблице: {total:.0f} мс; "
+            f"порог медленных: {database.SLOW_QUERY_MS:.0f} мс"
+            + (f"; не учтено новых отпечатков: {QUERY_STATS.dropped}" if QUERY_STATS.dropped else ""))
+        self.query_text.clear()
+
+    def _on_row_changed(self, row: int, *_):
+        if 0 <= row < len(self._stats):
+            self.query_text.setPlainText(self._stats[row].query)
+
+    def on_reset(self):
+        QUERY_STATS.reset()
+        self.refresh()
+
+
+class ForeignKeyAuditDialog(_BaseModalDialog):
+    """
+    Внешние ключи схемы без поддерживающего индекса (audit_unindexed_foreign_keys), крупные дочерние
+    таблицы — первыми. Для выбранных строк индексы создаются CREATE INDEX CONCURRENTLY через alter_table.
+    """
+
+    HEADERS = ["Ограничение", "Таблица", "Столбцы", "Ссылается на", "Размер, МБ", "Строк"]
+
+    def __init__(self, parent: Optional[QWidget] = None):
+        super().__init__("Внешние ключи без индексов", parent)
+        self._fks: List[Dict[str, Any]] = []
+        self._setup_ui()
+        self.refresh()
+
+    def _setup_ui(self):
+        root = QVBoxLayout(self)
+
+        title = QLabel("Внешние ключи без индекса на стороне дочерней таблицы")
+        title.setStyleSheet("font-style: italic; font-size: 14pt;")
+        root.addWidget(title)
+
+        self.table = QTableWidget(0, len(self.HEADERS))
+        self.table.setHorizontalHeaderLabels(self.HEADERS)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        root.addWidget(self.table, 1)
+
+        self.summary = QLabel("")
+        root.addWidget(self.summary)
+
+        btns = QHBoxLayout()
+        btns.addStretch(1)
+        self.refresh_btn = QPushButton("Обновить"); self.refresh_btn.setStyleSheet(SMALL_BTNS_STYLE)
+        self.refresh_btn.clicked.connect(self.refresh)
+        self.create_btn = QPushButton("Создать индексы для выбранных"); self.create_btn.setStyleSheet(SMALL_BTNS_STYLE)
+        self.create_btn.clicked.connect(self.on_create_indexes)
+        self.close_btn = QPushButton("Закрыть"); self.close_btn.setStyleSheet(SMALL_BTNS_STYLE)
+        self.close_btn.clicked.connect(self.accept)
+        btns.addWidget(self.refresh_btn); btns.addWidget(self.create_btn)
+        btns.addWidget(self.abort_btn); btns.addWidget(self.close_btn)
+        root.addLayout(btns)
+        self._busy_buttons = [self.refresh_btn, self.create_btn]
+        self.resize(900, 480)
+
+    def refresh(self):
+        self._run_db(audit_unindexed_foreign_keys, on_result=self._show)
+
+    def _show(self, fks: List[Dict[str, Any]]):
+        self._fks = list(fks)
+        self.table.setRowCount(len(self._fks))
+        for r, fk in enumerate(self._fks):
+            values = [fk["constraint"], fk["table"], ", ".join(fk["columns"]), fk["ref_table"],
+                      f"{fk['total_bytes'] / 2**20:.1f}", fk["rows"]]
+            for c, v in enumerate(values):
+                item = QTableWidgetItem(str(v))
+                if c >= 4:
+                    item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                self.table.setItem(r, c, item)
+        self.summary.setText(f"Внешних ключей без индекса: {len(self._fks)}" if self._fks
+                             else "У всех внешних ключей есть индекс.")
+
+    def on_create_indexes(self):
+        rows = sorted({i.row() for i in self.table.selectedIndexes()})
+        if not rows:
+            QMessageBox.warning(self, "Индексы", "Выберите внешние ключи в таблице.")
+            return
+        chosen = [self._fks[r] for r in rows]
+        actions = [AlterAction(kind="create_index", table=fk["table"], extra={"columns": list(fk["columns"])})
+                   for fk in chosen]
+        if QMessageBox.question(self, "Создать индексы",
+                                "\n".join(f"{fk['table']}({', '.join(fk['columns'])})" for fk in chosen) +
+                                "\n\nИндексы строятся без блокировки записи, но на больших таблицах "
+                                "это может занять время. Продолжить?") != QMessageBox.StandardButton.Yes:
+            return
+
+        def done(msg: str):
+            self._show([fk for fk in self._fks if fk not in chosen])
+            QMessageBox.information(self, "Индексы", msg)
+        self._run_db(alter_table, actions, on_result=done)
 
 
 # ---------------- exports ----------------
@@ -1190,6 +1746,9 @@ __all__ = [
     "SchemaEditorDialog",
     "SelectBuilderDialog",
     "SearchDialog",
+    "GlobalSearchDialog",
     "StringFuncsDialog",
     "InsertRowDialog",
+    "QueryStatsDialog",
+    "ForeignKeyAuditDialog",
 ]
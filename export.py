@@ -0,0 +1,189 @@
+"""
+Потоковая выгрузка результатов в файлы:
+- CSV — через COPY (...) TO STDOUT: данные идут из сервера прямо в файл, без разбора в Python
+- JSONL и Parquet — через серверный курсор пачками ResultSet (iter_select); Parquet берёт столбцы целиком
+
+Источник — SelectParams (запрос конструктора) или имя таблицы. Память ограничена одной пачкой
+при любом размере результата. Файл пишется во временный *.part и переименовывается после успеха.
+Parquet требует pyarrow (импортируется только при выгрузке в этот формат).
+"""
+
+from __future__ import annotations
+import base64
+import datetime
+import json
+import logging
+import os
+from decimal import Decimal
+from typing import Any, Callable, Dict, Optional, Union
+
+from psycopg2 import sql
+from psycopg2.extensions import connection as PGConnection, encodings
+
+from database import (DBError, SelectParams, DEFAULT_BATCH_SIZE, build_select_sql, iter_select, _describe,
+                      _humanize_pg_error)
+
+logger = logging.getLogger(__name__)
+
+Source = Union[SelectParams, str]
+EXPORT_FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".parquet": "parquet"}
+
+
+def _as_params(source: Source) -> SelectParams:
+    if isinstance(source, SelectParams):
+        return source
+    return SelectParams(tables=['"' + source.replace('"', '""') + '"'])
+
+
+class _CountingWriter:
+    """
+    Файл для copy_expert: пишет байты и сообщает о записанном объёме (и числе строк по \\n).
+    COPY отдаёт данные построчно, поэтому прогресс сообщается не чаще раза на PROGRESS_BYTES.
+    """
+
+    PROGRESS_BYTES = 1 << 20
+
+    def __init__(self, f, progress: Optional[Callable[[Dict[str, Any]], None]]):
+        self._f = f
+        self._progress = progress
+        self._reported = 0
+        self.bytes = 0
+        self.lines = 0
+
+    def write(self, data: bytes) -> int:
+        n = self._f.write(data)
+        self.bytes += len(data)
+        self.lines += data.count(b"\n")
+        if self._progress and self.bytes - self._reported >= self.PROGRESS_BYTES:
+            self._reported = self.bytes
+            self._progress({"format": "csv", "rows": self.lines, "bytes": self.bytes})
+        return n
+
+
+def _json_default(v: Any) -> Any:
+    if isinstance(v, (datetime.date, datetime.time)):
+        return v.isoformat()
+    if isinstance(v, datetime.timedelta):
+        return v.total_seconds()
+    if isinstance(v, Decimal):
+        return float(v)
+    if isinstance(v, (bytes, memoryview)):
+        return base64.b64encode(bytes(v)).decode("ascii")
+    return str(v)
+
+
+def export_csv(conn: PGConnection, source: Source, path: str, header: bool = True,
+               delimiter: str = ",", progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """COPY (запрос) TO STDOUT в файл. Для таблицы целиком — COPY таблица TO STDOUT."""
+    opts = sql.SQL("WITH (FORMAT csv, HEADER {}, DELIMITER {})").format(
+        sql.SQL("true" if header else "false"), sql.Literal(delimiter))
+    with open(path, "wb") as f, conn.cursor() as cur:
+        if isinstance(source, SelectParams):
+            # COPY не принимает параметры — подставляем их на клиенте с экранированием psycopg2
+            sql_text, args = build_select_sql(source)
+            select_sql = cur.mogrify(sql_text, args).decode(encodings.get(conn.encoding, "utf-8"))
+            query = sql.SQL("COPY ({}) TO STDOUT ").format(sql.SQL(select_sql))
+        else:
+            query = sql.SQL("COPY {} TO STDOUT ").format(sql.Identifier(source))
+        out = _CountingWriter(f, progress)
+        cur.copy_expert((query + opts).as_string(conn), out)
+    conn.rollback()  # COPY TO только читает — закрываем транзакцию, не фиксируя
+    return {"format": "csv", "rows": max(0, out.lines - (1 if header else 0)), "bytes": out.bytes}
+
+
+def export_jsonl(conn: PGConnection, source: Source, path: str, batch_size: int = DEFAULT_BATCH_SIZE,
+                 progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """Одна JSON-строка на запись; даты — ISO 8601, numeric — число, bytea — base64."""
+    rows = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for batch in iter_select(conn, _as_params(source), batch_size):
+            f.writelines(json.dumps(dict(r), ensure_ascii=False, default=_json_default) + "\n" for r in batch)
+            rows += len(batch)
+            if progress:
+                progress({"format": "jsonl", "rows": rows, "bytes": f.tell()})
+    conn.rollback()
+    return {"format": "jsonl", "rows": rows, "bytes": os.path.getsize(path)}
+
+
+def _arrow_type(pa, type_code: int):
+    """OID типа PostgreSQL -> тип Arrow (неизвестные типы пишутся строкой)."""
+    return {
+        16: pa.bool_(), 20: pa.int64(), 21: pa.int16(), 23: pa.int32(),
+        700: pa.float32(), 701: pa.float64(), 1700: pa.float64(),
+        1082: pa.date32(), 1114: pa.timestamp("us"), 1184: pa.timestamp("us", tz="UTC"),
+        17: pa.binary(),
+    }.get(type_code, pa.string())
+
+
+def export_parquet(conn: PGConnection, source: Source, path: str, batch_size: int = 50_000,
+                   progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """Каждая пачка курсора — отдельная row group Parquet; схема берётся из типов столбцов результата."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise DBError("Для выгрузки в Parquet установите пакет pyarrow.")
+    params = _as_params(source)
+    rows = 0
+    writer = None
+    try:
+        for batch in iter_select(conn, params, batch_size):
+            if writer is None:
+                schema = pa.schema([(n, _arrow_type(pa, t)) for n, t in zip(batch.keys, batch.type_codes)])
+                writer = pq.ParquetWriter(path, schema)
+            arrays = []
+            for field in writer.schema:
+                col = batch.column(field.name)
+                if pa.types.is_string(field.type):
+                    col = [None if v is None else v if isinstance(v, str) else
+                           json.dumps(v, ensure_ascii=False, default=_json_default) if isinstance(v, (dict, list))
+                           else _json_default(v) for v in col]
+                elif pa.types.is_floating(field.type):
+                    col = [None if v is None else float(v) for v in col]
+                elif pa.types.is_binary(field.type):
+                    col = [None if v is None else bytes(v) for v in col]
+                arrays.append(pa.array(col, type=field.type))
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=writer.schema))
+            rows += len(batch)
+            if progress:
+                progress({"format": "parquet", "rows": rows, "bytes": os.path.getsize(path)})
+        if writer is None:  # пустой результат: файл со схемой и без строк
+            desc = _describe(conn, *build_select_sql(params))
+            schema = pa.schema([(d.name, _arrow_type(pa, d.type_code)) for d in desc])
+            writer = pq.ParquetWriter(path, schema)
+    finally:
+        if writer is not None:
+            writer.close()
+    conn.rollback()
+    return {"format": "parquet", "rows": rows, "bytes": os.path.getsize(path)}
+
+
+_EXPORTERS = {"csv": export_csv, "jsonl": export_jsonl, "parquet": export_parquet}
+
+
+def export_result(conn: PGConnection, source: Source, path: str, fmt: Optional[str] = None,
+                  progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Выгружает source в path; формат — fmt или по расширению файла (.csv, .jsonl/.ndjson, .parquet).
+    Возвращает {"format", "rows", "bytes", "path"}. Запускается в QueryRunner как fn(conn, ...).
+    """
+    fmt = fmt or EXPORT_FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt not in _EXPORTERS:
+        raise DBError("Неизвестный формат выгрузки: укажите расширение .csv, .jsonl или .parquet.")
+    tmp = path + ".part"
+    try:
+        res = _EXPORTERS[fmt](conn, source, tmp, progress=progress)
+        os.replace(tmp, path)
+    except Exception as e:
+        conn.rollback()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        if isinstance(e, DBError):
+            raise
+        raise DBError(_humanize_pg_error(e))
+    res["path"] = path
+    logger.info("Выгрузка %s: %s строк, %s байт", path, res["rows"], res["bytes"])
+    return res
+
+
+__all__ = ["EXPORT_FORMATS", "export_result", "export_csv", "export_jsonl", "export_parquet"]
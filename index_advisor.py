@@ -0,0 +1,359 @@
+"""
+Советник индексов для запросов конструктора (SelectParams):
+- столбцы из WHERE, условий JOIN, ORDER BY и GROUP BY относятся к таблицам по алиасам
+- покрытие проверяется по существующим индексам (pg_index), селективность — по статистике (pg_stats)
+- предлагаются btree (равенство, затем диапазон или сортировка), GIN с gin_trgm_ops (LIKE/ILIKE/~)
+  и BRIN (диапазон по столбцу большой таблицы, значения которого лежат на диске почти по порядку)
+- выигрыш оценивается по стоимости EXPLAIN до и после гипотетического индекса (расширение hypopg);
+  настоящие индексы при оценке не строятся — без hypopg выигрыш остаётся неоценённым
+
+Предложение применяется через alter_table([proposal.to_action()]) — CREATE INDEX CONCURRENTLY.
+"""
+
+from __future__ import annotations
+import json
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from psycopg2 import sql
+from psycopg2.extensions import connection as PGConnection
+
+from database import DBError, AlterAction, SelectParams, CATALOG_CACHE, build_select_sql, _humanize_pg_error
+
+logger = logging.getLogger(__name__)
+
+LOW_SELECTIVITY = 0.3       # равенство отбирает большую долю строк — столбец в индекс не ставится
+BRIN_MIN_PAGES = 1000       # BRIN оправдан только на больших таблицах (страницы по 8 КБ)
+BRIN_MIN_CORRELATION = 0.9  # |correlation| из pg_stats: физический порядок совпадает с порядком значений
+MAX_INDEX_COLUMNS = 3
+
+_PATTERN_OPS = {"LIKE", "ILIKE", "~", "~*"}
+_RANGE_OPS = {"<", ">", "<=", ">="}
+_IDENT = r'(?:"[^"]+"|\w+)'
+_COLUMN_REF_RE = re.compile(rf"^\s*(?:({_IDENT})\.)?({_IDENT})\s*$")
+_JOIN_EQ_RE = re.compile(rf"((?:{_IDENT}\.)?{_IDENT})\s*=\s*((?:{_IDENT}\.)?{_IDENT})")
+
+
+@dataclass
+class IndexProposal:
+    """Предлагаемый индекс. existing — имя индекса, который уже покрывает этот доступ."""
+    schema: str
+    table: str
+    columns: List[str]  # элементы вида "col" или "col DESC"
+    method: str = "btree"
+    opclass: Optional[str] = None
+    reason: str = ""
+    existing: Optional[str] = None
+    cost_before: Optional[float] = None
+    cost_after: Optional[float] = None
+    estimate: str = ""  # "hypopg" или "" — выигрыш не оценён
+
+    @property
+    def name(self) -> str:
+        names = "_".join(c.split()[0] for c in self.columns)
+        suffix = {"btree": "idx", "gin": "trgm_idx", "brin": "brin_idx"}.get(self.method, "idx")
+        return f"{self.table}_{names}_{suffix}"[:63]
+
+    @property
+    def benefit(self) -> Optional[float]:
+        """Доля снижения стоимости плана (0..1); None — не оценивалось."""
+        if self.cost_before is None or self.cost_after is None or self.cost_before <= 0:
+            return None
+        return max(0.0, (self.cost_before - self.cost_after) / self.cost_before)
+
+    @property
+    def ddl(self) -> str:
+        cols = ", ".join(c if not self.opclass else f"{c} {self.opclass}" for c in self.columns)
+        return f"CREATE INDEX CONCURRENTLY {self.name} ON {self.table} USING {self.method} ({cols})"
+
+    def to_action(self) -> AlterAction:
+        extra: Dict[str, Any] = {"columns": list(self.columns), "method": self.method}
+        if self.opclass:
+            extra["opclass"] = self.opclass
+        return AlterAction(kind="create_index", table=self.table, constraint_name=self.name, extra=extra)
+
+
+@dataclass
+class _Usage:
+    eq: List[str] = field(default_factory=list)
+    range: List[str] = field(default_factory=list)
+    pattern: List[str] = field(default_factory=list)
+    join: List[str] = field(default_factory=list)
+    sort: List[str] = field(default_factory=list)
+    group: List[str] = field(default_factory=list)
+
+
+def _ident(name: str) -> str:
+    """Идентификатор как его хранит каталог: без кавычек — в нижнем регистре."""
+    return name[1:-1] if name.startswith('"') and name.endswith('"') else name.lower()
+
+
+def _table_refs(params: SelectParams) -> Dict[str, Tuple[str, str]]:
+    """Алиас или имя таблицы -> (схема, таблица) для FROM и JOIN."""
+    refs: Dict[str, Tuple[str, str]] = {}
+    for spec in list(params.tables) + [j["table"] for j in params.joins]:
+        parts = [p for p in spec.split() if p.upper() != "AS"]
+        if not parts:
+            continue
+        schema, _, table = parts[0].rpartition(".")
+        target = (_ident(schema) if schema else "public", _ident(table))
+        refs[target[1]] = target
+        if len(parts) > 1:
+            refs[_ident(parts[-1])] = target
+    return refs
+
+
+class _Resolver:
+    """Относит ссылку [алиас.]столбец к таблице запроса; неквалифицированные — по каталогу."""
+
+    def __init__(self, conn: PGConnection, params: SelectParams):
+        self.refs = _table_refs(params)
+        self.tables = sorted(set(self.refs.values()))
+        self._conn = conn
+        self._columns: Dict[Tuple[str, str], set] = {}
+
+    def _has_column(self, target: Tuple[str, str], column: str) -> bool:
+        if target not in self._columns:
+            self._columns[target] = {c["column_name"] for c in CATALOG_CACHE.columns(self._conn, target[1], target[0])}
+        return column in self._columns[target]
+
+    def resolve(self, ref: str) -> Optional[Tuple[Tuple[str, str], str]]:
+        m = _COLUMN_REF_RE.match(ref)
+        if not m:
+            return None  # выражение, а не столбец
+        column = _ident(m.group(2))
+        if m.group(1):
+            target = self.refs.get(_ident(m.group(1)))
+            return (target, column) if target else None
+        owners = [t for t in self.tables if len(self.tables) == 1 or self._has_column(t, column)]
+        return (owners[0], column) if len(owners) == 1 else None
+
+
+def _collect_usage(conn: PGConnection, params: SelectParams) -> Dict[Tuple[str, str], _Usage]:
+    res = _Resolver(conn, params)
+    usage: Dict[Tuple[str, str], _Usage] = {}
+
+    def add(ref: str, kind: str, suffix: str = "") -> Optional[Tuple[str, str]]:
+        hit = res.resolve(ref)
+        if hit is None:
+            return None
+        target, column = hit
+        bucket = getattr(usage.setdefault(target, _Usage()), kind)
+        if column + suffix not in bucket:
+            bucket.append(column + suffix)
+        return target
+
+    for cond in params.where:
+        op = cond.get("op", "=").strip().upper()
+        if op == "=":
+            add(cond["col"], "eq")
+        elif op in _RANGE_OPS:
+            add(cond["col"], "range")
+        elif op in _PATTERN_OPS:
+            add(cond["col"], "pattern")
+    for j in params.joins:
+        for left, right in _JOIN_EQ_RE.findall(j.get("on", "")):
+            add(left, "join")
+            add(right, "join")
+    sort_refs = [res.resolve(col) for col, _ in params.order_by]
+    if sort_refs and all(sort_refs) and len({r[0] for r in sort_refs}) == 1:  # сортировка по одной таблице
+        for col, direction in params.order_by:
+            add(col, "sort", " DESC" if str(direction).upper() == "DESC" else "")
+    for col in params.group_by:
+        add(col, "group")
+    return usage
+
+
+def _table_stats(conn: PGConnection, schema: str, table: str) -> Tuple[float, int, Dict[str, Dict[str, Any]]]:
+    """reltuples, relpages и pg_stats по столбцам."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT c.reltuples, c.relpages
+            FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = %s AND c.relname = %s
+        """, (schema, table))
+        row = cur.fetchone()
+        if row is None:
+            raise DBError(f"Таблица {schema}.{table} не найдена.")
+        cur.execute("""
+            SELECT attname, null_frac, n_distinct, correlation
+            FROM pg_stats WHERE schemaname = %s AND tablename = %s
+        """, (schema, table))
+        stats = {r[0]: {"null_frac": r[1], "n_distinct": r[2], "correlation": r[3]} for r in cur.fetchall()}
+    return max(float(row[0]), 0.0), int(row[1]), stats
+
+
+def _existing_indexes(conn: PGConnection, schema: str, table: str) -> List[Dict[str, Any]]:
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT ic.relname, am.amname, i.indisvalid AND i.indpred IS NULL,
+                   ARRAY(SELECT pg_get_indexdef(i.indexrelid, k, true) FROM generate_series(1, i.indnkeyatts) k),
+                   pg_get_indexdef(i.indexrelid)
+            FROM pg_index i
+            JOIN pg_class ic ON ic.oid = i.indexrelid
+            JOIN pg_am am ON am.oid = ic.relam
+            WHERE i.indrelid = %s::regclass
+        """, (sql.Identifier(schema, table).as_string(conn),))
+        return [{"name": r[0], "method": r[1], "usable": r[2],
+                 "columns": [_ident(c.split()[0]) for c in r[3]], "definition": r[4]} for r in cur.fetchall()]
+
+
+def _covering_index(existing: Sequence[Dict[str, Any]], p: IndexProposal, eq_count: int) -> Optional[str]:
+    """Имя существующего индекса, который уже обслуживает предложенный доступ."""
+    cols = [c.split()[0] for c in p.columns]
+    for ix in existing:
+        if not ix["usable"]:
+            continue
+        head = ix["columns"][:len(cols)]
+        if p.method == "btree" and ix["method"] == "btree":
+            if len(head) == len(cols) and set(head[:eq_count]) == set(cols[:eq_count]) \
+                    and head[eq_count:] == cols[eq_count:]:
+                return ix["name"]
+        elif p.method == "gin":
+            if ix["method"] in ("gin", "gist") and head[:1] == cols[:1] and "trgm_ops" in ix["definition"]:
+                return ix["name"]
+        elif p.method == "brin" and ix["method"] in ("brin", "btree") and head[:1] == cols[:1]:
+            return ix["name"]
+    return None
+
+
+def _eq_selectivity(st: Optional[Dict[str, Any]], reltuples: float) -> Optional[float]:
+    """Доля строк, отбираемая равенством по столбцу (1 / число различных значений)."""
+    if not st or st["n_distinct"] is None:
+        return None
+    nd = float(st["n_distinct"])
+    distinct = nd if nd > 0 else -nd * max(reltuples, 1.0)
+    return 1.0 / distinct if distinct >= 1 else 1.0
+
+
+def _candidates(target: Tuple[str, str], u: _Usage, reltuples: float, relpages: int,
+                stats: Dict[str, Dict[str, Any]]) -> List[Tuple[IndexProposal, int]]:
+    """Предложения для одной таблицы: (предложение, число столбцов равенства в начале ключа)."""
+    schema, table = target
+    out: List[Tuple[IndexProposal, int]] = []
+    eq, skipped = [], []
+    for col in u.eq:
+        sel = _eq_selectivity(stats.get(col), reltuples)
+        (skipped if sel is not None and sel > LOW_SELECTIVITY else eq).append((sel if sel is not None else 1.0, col))
+    eq = [c for _, c in sorted(eq)]
+    note = f"; без {', '.join(c for _, c in skipped)} (низкая селективность)" if skipped else ""
+
+    ranges = u.range[:1]
+    if ranges and not eq:
+        col = ranges[0]
+        corr = (stats.get(col) or {}).get("correlation")
+        if relpages >= BRIN_MIN_PAGES and corr is not None and abs(corr) >= BRIN_MIN_CORRELATION:
+            out.append((IndexProposal(schema, table, [col], "brin",
+                                      reason=f"диапазон по {col}, корреляция с порядком на диске {corr:.2f}"), 0))
+            ranges = []
+    tail = ranges or u.sort
+    if eq or tail:
+        cols = (eq + [c for c in tail if c.split()[0] not in eq])[:MAX_INDEX_COLUMNS]
+        parts = []
+        if eq:
+            parts.append(f"равенство по {', '.join(eq)}")
+        if ranges:
+            parts.append(f"диапазон по {ranges[0]}")
+        elif u.sort:
+            parts.append("ORDER BY " + ", ".join(u.sort))
+        out.append((IndexProposal(schema, table, cols, reason="; ".join(parts) + note), min(len(eq), len(cols))))
+    for col in u.join:
+        if not any(p.method == "btree" and p.columns[0].split()[0] == col for p, _ in out):
+            out.append((IndexProposal(schema, table, [col], reason=f"ключ соединения {col}"), 1))
+    for col in u.pattern:
+        out.append((IndexProposal(schema, table, [col], "gin", "gin_trgm_ops",
+                                  reason=f"поиск по шаблону/регулярному выражению в {col}"), 0))
+    if u.group and not any(p.method == "btree" for p, _ in out):
+        out.append((IndexProposal(schema, table, u.group[:MAX_INDEX_COLUMNS],
+                                  reason="GROUP BY " + ", ".join(u.group)), len(u.group[:MAX_INDEX_COLUMNS])))
+    return out
+
+
+def _plan_cost(cur, query: str, args: Sequence[Any]) -> float:
+    cur.execute("EXPLAIN (FORMAT JSON) " + query, args)
+    raw = cur.fetchone()[0]
+    if isinstance(raw, str):
+        raw = json.loads(raw)
+    return float(raw[0]["Plan"]["Total Cost"])
+
+
+def _hypothetical_ddl(p: IndexProposal) -> sql.Composable:
+    items = []
+    for c in p.columns:
+        parts = c.split()
+        item = sql.Identifier(parts[0])
+        if p.opclass:
+            item = item + sql.SQL(" " + p.opclass)
+        if len(parts) > 1:
+            item = item + sql.SQL(" " + parts[1])
+        items.append(item)
+    return sql.SQL("CREATE INDEX ON {} USING {} ({})").format(
+        sql.Identifier(p.schema, p.table), sql.SQL(p.method), sql.SQL(", ").join(items))
+
+
+def _estimate(conn: PGConnection, p: IndexProposal, query: str, args: Sequence[Any], hypopg: bool) -> None:
+    """
+    Стоимость плана с гипотетическим индексом (hypopg); при невозможности оценки cost_after остаётся None,
+    а в reason пишется причина. Настоящий индекс не строится: CREATE INDEX держал бы блокировку SHARE
+    и останавливал запись в таблицу до конца построения.
+    """
+    if not hypopg:
+        p.reason += "; выигрыш не оценён: требуется расширение hypopg"
+        return
+    if p.method not in ("btree", "brin"):
+        p.reason += f"; выигрыш не оценён: hypopg не поддерживает {p.method}"
+        return
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT indexrelid FROM hypopg_create_index(%s)", (_hypothetical_ddl(p).as_string(conn),))
+            try:
+                p.cost_after = _plan_cost(cur, query, args)
+            finally:
+                cur.execute("SELECT hypopg_reset()")
+            p.estimate = "hypopg"
+    except Exception as e:
+        logger.info("Не удалось оценить индекс %s: %s", p.name, _humanize_pg_error(e))
+    finally:
+        conn.rollback()
+
+
+def advise_indexes(conn: PGConnection, params: SelectParams) -> List[IndexProposal]:
+    """
+    Предложения индексов для запроса: сначала новые — по убыванию оценённого выигрыша,
+    затем уже покрытые существующими индексами (existing заполнено).
+    GIN-предложения требуют расширения pg_trgm; без него выигрыш не оценивается.
+    """
+    query, args = build_select_sql(params)
+    try:
+        usage = _collect_usage(conn, params)
+        with conn.cursor() as cur:
+            cur.execute("SELECT extname FROM pg_extension WHERE extname IN ('hypopg', 'pg_trgm')")
+            extensions = {r[0] for r in cur.fetchall()}
+            base_cost = _plan_cost(cur, query, args)
+        conn.rollback()
+        proposals: List[IndexProposal] = []
+        for target, u in usage.items():
+            reltuples, relpages, stats = _table_stats(conn, *target)
+            existing = _existing_indexes(conn, *target)
+            conn.rollback()
+            for p, eq_count in _candidates(target, u, reltuples, relpages, stats):
+                p.existing = _covering_index(existing, p, eq_count)
+                if p.existing is None:
+                    p.cost_before = base_cost
+                    if p.method == "gin" and "pg_trgm" not in extensions:
+                        p.reason += "; требуется расширение pg_trgm"
+                    else:
+                        _estimate(conn, p, query, args, "hypopg" in extensions)
+                proposals.append(p)
+    except DBError:
+        conn.rollback()
+        raise
+    except Exception as e:
+        conn.rollback()
+        raise DBError(_humanize_pg_error(e))
+    return sorted(proposals, key=lambda p: (p.existing is not None, -(p.benefit if p.benefit is not None else -1)))
+
+
+__all__ = ["IndexProposal", "advise_indexes", "LOW_SELECTIVITY", "BRIN_MIN_PAGES"]
@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import os
 import sys
 import logging
 from PyQt6.QtWidgets import QApplication
@@ -10,6 +11,9 @@ def main():
     """Главная функция приложения"""
     # Настраиваем логирование
     logger = setup_logging()
+    # Медленные запросы дополнительно пишутся в отдельный файл (порог — DBW_SLOW_QUERY_MS)
+    from database import configure_slow_query_log
+    configure_slow_query_log(os.getenv("DBW_SLOW_QUERY_LOG", "slow_queries.log"))
 
     try:
         logger.info("=" * 60)
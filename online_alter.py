@@ -0,0 +1,230 @@
+"""
+Изменение типа столбца без перезаписи таблицы под исключительной блокировкой:
+- добавляется теневой столбец нового типа (только метаданные, без перезаписи)
+- триггер BEFORE INSERT/UPDATE переносит в него новые значения, пока идёт копирование
+- существующие строки заполняются пачками по диапазонам первичного ключа, каждая пачка —
+  своей короткой транзакцией, с паузой между пачками и отчётом о прогрессе
+- NOT NULL переносится через проверенный CHECK, затем в одной короткой транзакции
+  старый столбец удаляется, а теневой получает его имя и значение по умолчанию
+
+Ограничения: нужен первичный ключ из одного столбца; столбец не должен входить в индексы,
+ограничения и представления и не должен владеть последовательностью (такие изменения —
+обычным alter_table). Новый столбец оказывается последним в порядке столбцов таблицы.
+"""
+
+from __future__ import annotations
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from psycopg2 import sql
+from psycopg2.extensions import connection as PGConnection
+
+from database import (DBError, CATALOG_CACHE, RESULT_CACHE, ALTER_LOCK_TIMEOUT_MS, ALTER_LOCK_RETRIES,
+                      get_column_dependents, _run_locked, _humanize_pg_error)
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH = 10_000
+
+
+def _names(table: str, column: str) -> Dict[str, str]:
+    return {
+        "shadow": f"{column}__dbw_new"[:63],
+        "trigger": f"dbw_sync_{table}_{column}"[:63],
+        "check": f"{column}__dbw_not_null"[:63],
+    }
+
+
+def _column_info(conn: PGConnection, schema: str, table: str, column: str) -> Dict[str, Any]:
+    rel = sql.Identifier(schema, table).as_string(conn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT a.attname, a.attnotnull, pg_get_expr(d.adbin, d.adrelid)
+                FROM pg_attribute a
+                LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+                WHERE a.attrelid = %s::regclass AND a.attname IN (%s, %s) AND NOT a.attisdropped
+            """, (rel, column, _names(table, column)["shadow"]))
+            found = {r[0]: r for r in cur.fetchall()}
+            cur.execute("""
+                SELECT a.attname
+                FROM pg_index i JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+                WHERE i.indrelid = %s::regclass AND i.indisprimary
+            """, (rel,))
+            pk = [r[0] for r in cur.fetchall()]
+            cur.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", (rel,))
+            estimate = max(int(cur.fetchone()[0]), 0)
+    except Exception as e:
+        raise DBError(_humanize_pg_error(e))
+    finally:
+        conn.rollback()
+    if column not in found:
+        raise DBError(f"Столбец {column} не найден в таблице {schema}.{table}.")
+    if len(found) > 1:
+        raise DBError(f"В таблице {table} остался теневой столбец прерванного изменения — "
+                      f"удалите его через cleanup_online_alter.")
+    _, not_null, default = found[column]
+    return {"not_null": not_null, "default": default, "pk": pk, "rows": estimate}
+
+
+def cleanup_online_alter(conn: PGConnection, table: str, column: str, schema: str = "public") -> None:
+    """Удаляет следы прерванного online_alter_type: триггер, функцию и теневой столбец."""
+    n = _names(table, column)
+    t = sql.Identifier(schema, table)
+    _run_locked(conn, conn.cursor(), [
+        sql.SQL("DROP TRIGGER IF EXISTS {} ON {}").format(sql.Identifier(n["trigger"]), t),
+        sql.SQL("DROP FUNCTION IF EXISTS {}()").format(sql.Identifier(schema, n["trigger"])),
+        sql.SQL("ALTER TABLE {} DROP COLUMN IF EXISTS {}").format(t, sql.Identifier(n["shadow"])),
+    ], ALTER_LOCK_TIMEOUT_MS, ALTER_LOCK_RETRIES)
+
+
+def online_alter_type(
+    conn: PGConnection,
+    table: str,
+    column: str,
+    data_type: str,
+    using: Optional[str] = None,
+    schema: str = "public",
+    batch_size: int = BACKFILL_BATCH,
+    pause: float = 0.0,
+    lock_timeout_ms: int = ALTER_LOCK_TIMEOUT_MS,
+    retries: int = ALTER_LOCK_RETRIES,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Меняет тип column на data_type онлайн (см. описание модуля).
+    using — SQL-выражение преобразования от имени столбца, как в ALTER COLUMN ... TYPE ... USING;
+    по умолчанию column::data_type. pause — секунд между пачками (снижает нагрузку на сервер).
+    progress получает {"stage": "prepare"|"backfill"|"not_null"|"swap", "done": строк, "total": оценка}.
+    При ошибке или отмене теневой столбец и триггер удаляются, таблица остаётся прежней.
+    Возвращает {"rows", "batches", "seconds": {этап: секунды}}.
+    """
+    info = _column_info(conn, schema, table, column)
+    if len(info["pk"]) != 1:
+        raise DBError("Онлайн-изменение типа требует первичного ключа из одного столбца.")
+    if info["pk"][0] == column:
+        raise DBError("Тип столбца первичного ключа онлайн не меняется: используйте обычный ALTER.")
+    dependents = get_column_dependents(conn, table, column, schema)
+    conn.rollback()
+    if dependents:
+        listed = ", ".join(d["object"] for d in dependents)
+        raise DBError(f"От столбца {column} зависят объекты: {listed}. "
+                      f"Удалите их или измените тип обычным ALTER TABLE.")
+
+    n = _names(table, column)
+    t = sql.Identifier(schema, table)
+    col, shadow, pk = sql.Identifier(column), sql.Identifier(n["shadow"]), sql.Identifier(info["pk"][0])
+    new_type = sql.SQL(data_type)
+    expr = sql.SQL(using) if using else sql.SQL("{}::{}").format(col, new_type)
+    cur = conn.cursor()
+    timings: Dict[str, float] = {}
+    total = info["rows"]
+
+    def report(stage: str, done: int) -> None:
+        if progress:
+            progress({"stage": stage, "done": done, "total": total})
+
+    def locked(statements: List[sql.Composable]) -> None:
+        _run_locked(conn, cur, statements, lock_timeout_ms, retries)
+
+    # ---- теневой столбец и триггер синхронизации
+    report("prepare", 0)
+    t0 = time.perf_counter()
+    if using:
+        # выражение USING ссылается на столбец по имени — вычисляем его над значением NEW
+        sync = sql.SQL("NEW.{} := (SELECT {} FROM (SELECT NEW.{} AS {}) AS s);").format(shadow, expr, col, col)
+    else:
+        sync = sql.SQL("NEW.{} := NEW.{}::{};").format(shadow, col, new_type)
+    function_body = sql.SQL("BEGIN {} RETURN NEW; END").format(sync).as_string(conn)
+    try:
+        locked([
+            sql.SQL("ALTER TABLE {} ADD COLUMN {} {}").format(t, shadow, new_type),
+            sql.SQL("CREATE OR REPLACE FUNCTION {}() RETURNS trigger LANGUAGE plpgsql AS {}").format(
+                sql.Identifier(schema, n["trigger"]), sql.Literal(function_body)),
+            sql.SQL("CREATE TRIGGER {} BEFORE INSERT OR UPDATE OF {} ON {} FOR EACH ROW EXECUTE FUNCTION {}()").format(
+                sql.Identifier(n["trigger"]), col, t, sql.Identifier(schema, n["trigger"])),
+        ])
+    except Exception as e:
+        conn.rollback()
+        raise DBError(_humanize_pg_error(e))
+    timings["prepare"] = time.perf_counter() - t0
+
+    try:
+        # ---- копирование существующих строк пачками по ключу
+        t0 = time.perf_counter()
+        done = batches = 0
+        last = None
+        # строки, вставленные после создания триггера, уже заполнены им — копируем только до текущего max(pk)
+        cur.execute(sql.SQL("SELECT max({}) FROM {}").format(pk, t))
+        stop = cur.fetchone()[0]
+        while stop is not None:
+            after = sql.SQL("AND {} > {}").format(pk, sql.Literal(last)) if last is not None else sql.SQL("")
+            cur.execute(sql.SQL("SELECT max({0}), count(*) FROM (SELECT {0} FROM {1} WHERE {0} <= %s {2} "
+                                "ORDER BY {0} LIMIT %s) AS k").format(pk, t, after), (stop, batch_size))
+            upper, count = cur.fetchone()
+            conn.rollback()
+            if not count:
+                break
+            cond = sql.SQL("{} <= {}").format(pk, sql.Literal(upper))
+            if last is not None:
+                cond = sql.SQL("{} > {} AND ").format(pk, sql.Literal(last)) + cond
+            locked([sql.SQL("UPDATE {} SET {} = {} WHERE ").format(t, shadow, expr) + cond])
+            last = upper
+            done += count
+            batches += 1
+            total = max(total, done)
+            report("backfill", done)
+            if pause:
+                time.sleep(pause)
+        timings["backfill"] = time.perf_counter() - t0
+
+        # ---- NOT NULL через проверенный CHECK: SET NOT NULL не сканирует таблицу
+        if info["not_null"]:
+            report("not_null", done)
+            t0 = time.perf_counter()
+            check = sql.Identifier(n["check"])
+            locked([sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} CHECK ({} IS NOT NULL) NOT VALID").format(
+                t, check, shadow)])
+            locked([sql.SQL("ALTER TABLE {} VALIDATE CONSTRAINT {}").format(t, check)])
+            locked([sql.SQL("ALTER TABLE {} ALTER COLUMN {} SET NOT NULL").format(t, shadow),
+                    sql.SQL("ALTER TABLE {} DROP CONSTRAINT {}").format(t, check)])
+            timings["not_null"] = time.perf_counter() - t0
+
+        # ---- атомарная подмена столбцов
+        report("swap", done)
+        t0 = time.perf_counter()
+        swap = [
+            sql.SQL("DROP TRIGGER {} ON {}").format(sql.Identifier(n["trigger"]), t),
+            sql.SQL("DROP FUNCTION {}()").format(sql.Identifier(schema, n["trigger"])),
+            sql.SQL("ALTER TABLE {} DROP COLUMN {}").format(t, col),
+            sql.SQL("ALTER TABLE {} RENAME COLUMN {} TO {}").format(t, shadow, col),
+        ]
+        if info["default"]:
+            swap.append(sql.SQL("ALTER TABLE {} ALTER COLUMN {} SET DEFAULT ({})::{}").format(
+                t, col, sql.SQL(info["default"]), new_type))
+        locked(swap)
+        timings["swap"] = time.perf_counter() - t0
+    except Exception as e:
+        conn.rollback()
+        try:
+            cleanup_online_alter(conn, table, column, schema)
+        except Exception:
+            conn.rollback()
+            logger.warning("Не удалось удалить теневой столбец %s.%s", table, n["shadow"])
+        if isinstance(e, DBError):
+            raise
+        raise DBError(_humanize_pg_error(e))
+    finally:
+        CATALOG_CACHE.invalidate(schema=schema, table=table)
+        RESULT_CACHE.invalidate_tables({table})
+
+    with conn.cursor() as c:
+        c.execute(sql.SQL("ANALYZE {} ({})").format(t, col))
+    conn.commit()
+    logger.info("Онлайн-изменение типа %s.%s -> %s: %s строк, %s пачек, %s",
+                table, column, data_type, done, batches, timings)
+    return {"rows": done, "batches": batches, "seconds": timings}
+
+
+__all__ = ["online_alter_type", "cleanup_online_alter", "BACKFILL_BATCH"]
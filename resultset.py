@@ -0,0 +1,350 @@
+"""
+Компактный контейнер результата запроса (ResultSet) вместо списка словарей:
+- столбцы хранятся отдельно: целые, вещественные и bool — типизированными массивами (array),
+  NULL — байтовой маской; имя столбца хранится один раз, а не в каждой строке
+- текст с небольшим числом различных значений (status, attack_type) — словарное кодирование:
+  коды в массиве + список уникальных строк
+- срезы строк (rs[100:200]) и выбор столбцов (rs.select([...])) не копируют данные
+- RowView — ленивое представление строки с интерфейсом словаря (Mapping) для старого кода:
+  row["name"], row.get("id"), dict(row)
+- повторяющиеся имена столбцов (SELECT * из JOIN: a.id и b.id) получают ключи id, id_2, ...:
+  по имени всегда находится первый столбец, ни один не теряется в dict(row) и to_dicts()
+
+Модуль не зависит ни от PyQt, ни от numpy (to_numpy импортирует numpy при вызове).
+"""
+
+from __future__ import annotations
+import sys
+from array import array
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+# OID типа PostgreSQL -> код типа array
+_ARRAY_CODES = {16: "b", 21: "h", 23: "i", 20: "q", 26: "I", 700: "f", 701: "d"}
+_TEXT_OIDS = {25, 1043, 1042, 19}  # text, varchar, char, name
+_NUMPY_DTYPES = {"b": "bool", "h": "int16", "i": "int32", "q": "int64", "I": "uint32",
+                 "f": "float32", "d": "float64"}
+_DATETIME_DTYPES = {1082: "datetime64[D]", 1114: "datetime64[us]", 1184: "datetime64[us]"}
+
+DICT_MAX_VALUES = 65535  # больше уникальных строк — столбец хранится обычным списком
+
+
+def _description(desc: Iterable[Any]) -> List[Tuple[str, int]]:
+    """cursor.description или [(имя, oid)] -> [(имя, oid)]."""
+    out = []
+    for d in desc:
+        if isinstance(d, str):
+            out.append((d, 0))
+        elif hasattr(d, "name"):
+            out.append((d.name, d.type_code))
+        else:
+            out.append((d[0], d[1]))
+    return out
+
+
+def _unique_keys(names: Iterable[str]) -> List[str]:
+    """Ключи столбцов: первое вхождение имени — как есть, повторы — name_2, name_3, ..."""
+    keys: List[str] = []
+    used = set()
+    for name in names:
+        key, n = name, 2
+        while key in used:
+            key, n = f"{name}_{n}", n + 1
+        used.add(key)
+        keys.append(key)
+    return keys
+
+
+class Column:
+    """
+    Один столбец. kind: "array" (числа/bool в array + маска NULL), "dict" (коды + словарь строк
+    + маска NULL) или "list" (произвольные объекты, NULL — None).
+    """
+
+    __slots__ = ("name", "type_code", "kind", "data", "nulls", "dictionary", "_codes")
+
+    def __init__(self, name: str, type_code: int = 0):
+        self.name = name
+        self.type_code = type_code
+        code = _ARRAY_CODES.get(type_code)
+        self.kind = "array" if code else ("dict" if type_code in _TEXT_OIDS else "list")
+        self.data: Union[array, List[Any]] = array(code) if code else (array("H") if self.kind == "dict" else [])
+        self.nulls: Optional[bytearray] = bytearray() if self.kind != "list" else None
+        self.dictionary: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def extend(self, values: Sequence[Any]) -> None:
+        if self.kind == "list":
+            self.data.extend(values)
+            return
+        if self.kind == "dict":
+            self._extend_dict(values)
+            return
+        try:
+            chunk = array(self.data.typecode, [0 if v is None else v for v in values])
+        except (TypeError, OverflowError):
+            # значение не влезло в тип — дальше храним столбец как есть
+            self._to_list()
+            self.data.extend(values)
+            return
+        self.data.extend(chunk)
+        self.nulls.extend(v is None for v in values)
+
+    def _extend_dict(self, values: Sequence[Any]) -> None:
+        codes = self._codes
+        new = len(set(values).difference(codes)) if values else 0
+        if len(codes) + new > DICT_MAX_VALUES or (not codes and new > max(16, len(values) // 2)):
+            # значений слишком много для словаря — выгоды нет
+            self._to_list()
+            self.data.extend(values)
+            return
+        for v in values:
+            if v is None:
+                self.nulls.append(1)
+                self.data.append(0)
+                continue
+            c = codes.get(v)
+            if c is None:
+                c = codes[v] = len(self.dictionary)
+                self.dictionary.append(v)
+            self.nulls.append(0)
+            self.data.append(c)
+
+    def _to_list(self) -> None:
+        self.data = [self.get(i) for i in range(len(self.data))]
+        self.kind, self.nulls, self.dictionary, self._codes = "list", None, [], {}
+
+    def get(self, i: int) -> Any:
+        if self.kind == "list":
+            return self.data[i]
+        if self.nulls[i]:
+            return None
+        if self.kind == "dict":
+            return self.dictionary[self.data[i]]
+        v = self.data[i]
+        return bool(v) if self.type_code == 16 else v
+
+    def values(self, start: int, stop: int) -> List[Any]:
+        if self.kind == "list":
+            return self.data[start:stop]
+        if self.kind == "dict":
+            d = self.dictionary
+            return [None if n else d[c] for c, n in zip(self.data[start:stop], self.nulls[start:stop])]
+        vals = self.data[start:stop].tolist()
+        if self.type_code == 16:
+            vals = [bool(v) for v in vals]
+        if any(self.nulls[start:stop]):
+            vals = [None if n else v for v, n in zip(vals, self.nulls[start:stop])]
+        return vals
+
+    def take(self, indices: Sequence[int]) -> "Column":
+        col = Column(self.name, self.type_code)
+        col.kind = self.kind
+        if self.kind == "list":
+            col.data = [self.data[i] for i in indices]
+        else:
+            col.data = array(self.data.typecode, (self.data[i] for i in indices))
+            col.nulls = bytearray(self.nulls[i] for i in indices)
+            col.dictionary, col._codes = self.dictionary, self._codes
+        return col
+
+    @property
+    def nbytes(self) -> int:
+        if self.kind == "list":
+            # оценка по первым 100 значениям: точный обход дорог для больших результатов
+            head = self.data[:100]
+            per_value = sum(sys.getsizeof(v) for v in head) / len(head) if head else 0
+            return sys.getsizeof(self.data) + int(per_value * len(self.data))
+        size = self.data.itemsize * len(self.data) + len(self.nulls)
+        return size + sum(sys.getsizeof(s) for s in self.dictionary)
+
+
+class RowView(Mapping):
+    """Строка ResultSet с интерфейсом словаря; значения читаются из столбцов при обращении."""
+
+    __slots__ = ("_rs", "_i")
+
+    def __init__(self, rs: "ResultSet", i: int):
+        self._rs = rs
+        self._i = i
+
+    def __getitem__(self, key: str) -> Any:
+        return self._rs._by_name[key].get(self._i)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rs.keys)
+
+    def __len__(self) -> int:
+        return len(self._rs._cols)
+
+    def __repr__(self) -> str:
+        return f"RowView({dict(self)!r})"
+
+
+class ResultSet(Sequence):
+    """
+    Результат запроса в виде столбцов. len(rs) — число строк, rs[i] — RowView,
+    rs[a:b] — срез без копирования, rs.column("x") — значения столбца списком.
+    Обращение по имени идёт через ключи (keys) — при повторе имён они различаются суффиксом.
+    """
+
+    def __init__(self, columns: List[Column], start: int = 0, stop: Optional[int] = None):
+        self._cols = columns
+        self._keys = _unique_keys(c.name for c in columns)
+        self._by_name = dict(zip(self._keys, columns))
+        self._start = start
+        self._stop = stop if stop is not None else (len(columns[0]) if columns else 0)
+
+    # ---- построение
+
+    @classmethod
+    def from_rows(cls, description: Iterable[Any], rows: Sequence[Sequence[Any]]) -> "ResultSet":
+        """Из кортежей (cursor.fetchall()) и cursor.description."""
+        cols = [Column(name, oid) for name, oid in _description(description)]
+        if rows:
+            for col, values in zip(cols, zip(*rows)):
+                col.extend(values)
+        return cls(cols)
+
+    @classmethod
+    def from_cursor(cls, cur) -> "ResultSet":
+        """Читает оставшиеся строки курсора (без словаря на строку). Без результата — пустой ResultSet."""
+        if not cur.description:
+            return cls([])
+        return cls.from_rows(cur.description, cur.fetchall())
+
+    @classmethod
+    def from_dicts(cls, rows: Sequence[Mapping[str, Any]]) -> "ResultSet":
+        """Совместимость со старыми источниками вида список словарей."""
+        if isinstance(rows, ResultSet):
+            return rows
+        names = list(rows[0].keys()) if rows else []
+        return cls.from_rows(names, [tuple(r.get(n) for n in names) for r in rows])
+
+    def extend(self, other: "ResultSet") -> None:
+        """Дописывает строки other (те же столбцы в том же порядке) — для подгрузки пачек потока."""
+        if self._cols and (self._start != 0 or self._stop != len(self._cols[0])):
+            raise ValueError("Нельзя дописывать в срез ResultSet")
+        if not self._cols:
+            self.__init__([Column(c.name, c.type_code) for c in other._cols])
+        if self.columns != other.columns:
+            raise ValueError(f"Столбцы не совпадают: {self.columns} и {other.columns}")
+        # по позиции, не по имени: одноимённые столбцы иначе получили бы значения первого из них
+        for col, src in zip(self._cols, other._cols):
+            col.extend(src.values(other._start, other._stop))
+        self._stop = len(self._cols[0]) if self._cols else 0
+
+    # ---- доступ
+
+    @property
+    def columns(self) -> List[str]:
+        """Имена столбцов как в результате запроса (могут повторяться)."""
+        return [c.name for c in self._cols]
+
+    @property
+    def keys(self) -> List[str]:
+        """Уникальные ключи столбцов для обращения по имени (повторы — name_2, ...)."""
+        return list(self._keys)
+
+    @property
+    def type_codes(self) -> List[int]:
+        return [c.type_code for c in self._cols]
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                return self.take(range(start, stop, step))
+            return ResultSet(self._cols, self._start + start, self._start + max(start, stop))
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("ResultSet index out of range")
+        return RowView(self, self._start + key)
+
+    def __iter__(self) -> Iterator[RowView]:
+        for i in range(self._start, self._stop):
+            yield RowView(self, i)
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def __repr__(self) -> str:
+        return f"ResultSet({len(self)} rows, columns={self.columns})"
+
+    def value(self, row: int, column: Union[int, str]) -> Any:
+        col = self._cols[column] if isinstance(column, int) else self._by_name[column]
+        return col.get(self._start + row)
+
+    def column(self, name: str) -> List[Any]:
+        return self._by_name[name].values(self._start, self._stop)
+
+    def column_view(self, name: str) -> memoryview:
+        """
+        Числовой столбец без копирования (memoryview над array); NULL в нём — нули, см. null_mask.
+        Пока представление живо, extend() для этого ResultSet невозможен (BufferError).
+        """
+        col = self._by_name[name]
+        if col.kind != "array":
+            raise TypeError(f"Столбец {name} не числовой")
+        return memoryview(col.data)[self._start:self._stop]
+
+    def null_mask(self, name: str) -> List[bool]:
+        col = self._by_name[name]
+        if col.kind == "list":
+            return [v is None for v in col.data[self._start:self._stop]]
+        return [bool(n) for n in col.nulls[self._start:self._stop]]
+
+    def select(self, names: Sequence[str]) -> "ResultSet":
+        """Подмножество столбцов (по ключам) без копирования."""
+        return ResultSet([self._by_name[n] for n in names], self._start, self._stop)
+
+    def take(self, indices: Iterable[int]) -> "ResultSet":
+        """Строки по номерам (копия) — для перестановок: сортировка, обратный порядок."""
+        idx = [self._start + i for i in indices]
+        return ResultSet([c.take(idx) for c in self._cols])
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        cols = [c.values(self._start, self._stop) for c in self._cols]
+        return [dict(zip(self._keys, vals)) for vals in zip(*cols)]
+
+    @property
+    def nbytes(self) -> int:
+        """Оценка памяти столбцов (для срезов — всего общего хранилища)."""
+        return sum(c.nbytes for c in self._cols)
+
+    def to_numpy(self) -> Dict[str, Any]:
+        """
+        {ключ столбца: numpy.ma.MaskedArray}. Числовые столбцы оборачиваются без копирования (frombuffer),
+        date/timestamp -> datetime64, numeric -> float64, прочее — dtype=object.
+        """
+        import numpy as np
+        out = {}
+        for key, c in zip(self._keys, self._cols):
+            s, e = self._start, self._stop
+            if c.kind == "array":
+                values = np.frombuffer(c.data, dtype=_NUMPY_DTYPES[c.data.typecode])[s:e]
+                mask = np.frombuffer(bytes(c.nulls[s:e]), dtype=bool) if c.nulls else np.zeros(0, bool)
+            else:
+                vals = c.values(s, e)
+                mask = np.fromiter((v is None for v in vals), dtype=bool, count=len(vals))
+                if c.type_code in _DATETIME_DTYPES:
+                    values = np.array([np.datetime64("NaT") if v is None else v for v in vals],
+                                      dtype=_DATETIME_DTYPES[c.type_code])
+                elif c.type_code == 1700:
+                    values = np.fromiter((0.0 if v is None else float(v) for v in vals), dtype="float64",
+                                         count=len(vals))
+                else:
+                    values = np.empty(len(vals), dtype=object)
+                    values[:] = vals
+            out[key] = np.ma.MaskedArray(values, mask=mask)
+        return out
+
+
+__all__ = ["ResultSet", "RowView", "Column", "DICT_MAX_VALUES"]
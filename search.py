@@ -0,0 +1,526 @@
+"""
+Поиск по тексту столбца для SearchDialog:
+- LIKE/ILIKE и регулярные выражения (~, ~*) с шаблоном в начале или середине строки обычным
+  btree-индексом не ускоряются — нужен триграммный индекс (расширение pg_trgm, GIN/GiST с *_trgm_ops)
+- перед поиском проверяется, есть ли такой индекс на столбце; по плану запроса (EXPLAIN) сообщается,
+  использовал ли его планировщик
+- недостающий индекс создаётся CREATE INDEX CONCURRENTLY через alter_table — запись в таблицу
+  при этом не блокируется
+
+Отрицания (!~, !~*) индексом не ускоряются никогда: они отбирают почти все строки.
+
+Полнотекстовый режим (@@) ищет слова, а не подстроки: по выбранным столбцам таблица получает
+генерируемый столбец tsvector (FTS_COLUMN) с GIN-индексом, запрос пишется в синтаксисе
+websearch_to_tsquery ("точная фраза", or, -исключить), строки упорядочены по ts_rank и читаются страницами.
+Столбец и индекс создаются через alter_table (AlterAction); добавление генерируемого столбца
+перезаписывает таблицу.
+
+Поиск по всей схеме (global_search) — когда неизвестно, в какой таблице значение: строковые столбцы
+берутся из каталога, таблицы просматриваются параллельно на соединениях пула, у каждого запроса свой
+statement_timeout, найденное передаётся в progress по мере готовности таблиц; по достижении лимита
+находок оставшиеся запросы отменяются.
+"""
+
+from __future__ import annotations
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from psycopg2 import sql
+from psycopg2.extensions import connection as PGConnection
+
+from database import (DBError, AlterAction, FTS_CONFIG, execute_prepared, alter_table, get_pool, pooled_connection,
+                      _humanize_pg_error)
+from index_advisor import IndexProposal
+from resultset import ResultSet
+
+logger = logging.getLogger(__name__)
+
+SEARCH_MODES = ["LIKE", "ILIKE", "~", "~*", "!~", "!~*"]
+TRIGRAM_MODES = {"LIKE", "ILIKE", "~", "~*"}
+SEARCH_LIMIT = 200
+FTS_MODE = "@@"
+FTS_COLUMN = "search_vector"
+FTS_PAGE_SIZE = 50
+_FTS_WEIGHTS = "ABCD"  # вес по порядку столбцов; пятый и следующие получают D
+GLOBAL_SEARCH_MODES = ["ILIKE", "LIKE", "~*", "~", "="]
+GLOBAL_SEARCH_LIMIT = 500
+GLOBAL_SEARCH_TIMEOUT_MS = int(os.getenv("DBW_GLOBAL_SEARCH_TIMEOUT_MS", "5000"))  # на одну таблицу
+GLOBAL_SEARCH_VALUE_CHARS = 200  # длинные значения в результате обрезаются
+_QUERY_CANCELED = "57014"
+_HEARTBEAT = 0.25  # секунд между пустыми отчётами progress, пока ни одна таблица не готова
+
+
+@dataclass
+class SearchResult:
+    """
+    Найденные строки и сведения о доступе: index — индекс, по которому шёл поиск (None — полный просмотр),
+    trigram_index — триграммный индекс столбца, если он есть; trigram_available — pg_trgm установлен
+    или может быть установлен на сервере.
+    """
+    rows: ResultSet
+    elapsed_ms: float
+    index: Optional[str] = None
+    trigram_index: Optional[str] = None
+    trigram_available: bool = False
+    mode: str = "LIKE"
+
+    @property
+    def index_assisted(self) -> bool:
+        return self.index is not None
+
+    @property
+    def can_add_index(self) -> bool:
+        """Поиск шёл полным просмотром, а триграммный индекс помог бы и может быть создан."""
+        return (not self.index_assisted and self.trigram_index is None and self.trigram_available
+                and self.mode in TRIGRAM_MODES)
+
+
+def _split_table(table: str, schema: str) -> tuple:
+    parts = [p.strip().strip('"') for p in table.split(".")]
+    return (parts[0], parts[1]) if len(parts) == 2 else (schema, parts[0])
+
+
+def _relation(table: str, schema: str = "public") -> sql.Composable:
+    """'таблица' (в схеме schema) или 'схема.таблица' -> экранированный идентификатор."""
+    return sql.Identifier(*_split_table(table, schema))
+
+
+def trigram_status(conn: PGConnection, table: str, column: str, schema: str = "public") -> Dict[str, Any]:
+    """
+    {"installed": pg_trgm установлен в базе, "available": может быть установлен,
+     "index": имя GIN/GiST-индекса с *_trgm_ops по столбцу или None}.
+    """
+    schema, table = _split_table(table, schema)
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT exists (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'),
+                   exists (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm')
+        """)
+        installed, available = cur.fetchone()
+        index = None
+        if installed:
+            cur.execute("""
+                SELECT ic.relname
+                FROM pg_index i
+                JOIN pg_class ic ON ic.oid = i.indexrelid
+                JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attname = %s
+                CROSS JOIN LATERAL generate_subscripts(i.indkey, 1) AS k(pos)
+                JOIN pg_opclass opc ON opc.oid = i.indclass[k.pos]
+                WHERE i.indrelid = to_regclass(%s) AND i.indkey[k.pos] = a.attnum AND i.indisvalid
+                  AND i.indpred IS NULL AND opc.opcname IN ('gin_trgm_ops', 'gist_trgm_ops')
+                ORDER BY 1 LIMIT 1
+            """, (column, sql.Identifier(schema, table).as_string(conn)))
+            row = cur.fetchone()
+            index = row[0] if row else None
+    conn.rollback()
+    return {"installed": installed, "available": installed or available, "index": index}
+
+
+def _plan_indexes(plan: Dict[str, Any]) -> Iterator[str]:
+    if "Index Name" in plan:
+        yield plan["Index Name"]
+    for child in plan.get("Plans", []):
+        yield from _plan_indexes(child)
+
+
+def search_table(conn: PGConnection, table: str, column: str, value: str, mode: str = "LIKE",
+                 limit: int = SEARCH_LIMIT, schema: str = "public") -> SearchResult:
+    """
+    SELECT * FROM table WHERE column <mode> value LIMIT limit. Выражение готовится один раз на соединение
+    (execute_prepared); индекс, которым воспользовался планировщик, берётся из EXPLAIN того же запроса.
+    """
+    if mode not in SEARCH_MODES:
+        raise DBError(f"Неизвестный режим поиска: {mode}")
+    query = sql.SQL("SELECT * FROM {} WHERE {} {} %s LIMIT {}").format(
+        _relation(table, schema), sql.Identifier(column), sql.SQL(mode), sql.Literal(int(limit))).as_string(conn)
+    try:
+        status = trigram_status(conn, table, column, schema)
+        with conn.cursor() as cur:
+            cur.execute("EXPLAIN (FORMAT JSON) " + query, (value,))
+            plan = cur.fetchone()[0]
+        conn.rollback()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        index = next(_plan_indexes(plan[0]["Plan"]), None)
+        t0 = time.perf_counter()
+        rows = execute_prepared(conn, query, [value])
+        elapsed = (time.perf_counter() - t0) * 1000
+        conn.rollback()
+    except DBError:
+        conn.rollback()
+        raise
+    except Exception as e:
+        conn.rollback()
+        raise DBError(_humanize_pg_error(e))
+    return SearchResult(rows, elapsed, index, status["index"], status["available"], mode)
+
+
+def trigram_index_proposal(table: str, column: str, schema: str = "public") -> IndexProposal:
+    schema, table = _split_table(table, schema)
+    return IndexProposal(schema, table, [column], "gin", "gin_trgm_ops",
+                         reason=f"поиск по шаблону/регулярному выражению в {column}")
+
+
+def create_trigram_index(conn: PGConnection, table: str, column: str, schema: str = "public") -> str:
+    """
+    Устанавливает pg_trgm (CREATE EXTENSION IF NOT EXISTS — нужны права на создание расширений)
+    и строит GIN-индекс gin_trgm_ops по столбцу без блокировки записи.
+    """
+    try:
+        with conn.cursor() as cur:
+            cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        raise DBError("Не удалось установить расширение pg_trgm: " + _humanize_pg_error(e))
+    proposal = trigram_index_proposal(table, column, schema)
+    alter_table(conn, [proposal.to_action()])
+    return f"Создан триграммный индекс {proposal.name}."
+
+
+# -------- полнотекстовый поиск
+
+@dataclass
+class FtsResult:
+    """Страница page (с нуля) результатов полнотекстового поиска; столбец rank — ts_rank строки."""
+    rows: ResultSet
+    elapsed_ms: float
+    page: int
+    page_size: int
+    has_more: bool
+    index: Optional[str] = None
+
+    @property
+    def index_assisted(self) -> bool:
+        return self.index is not None
+
+
+def fts_status(conn: PGConnection, table: str, schema: str = "public") -> Dict[str, Any]:
+    """
+    Состояние полнотекстового столбца таблицы: {"exists", "columns": исходные столбцы,
+    "config": конфигурация to_tsvector, "index": GIN-индекс по столбцу или None,
+    "pk": столбцы первичного ключа, "table_columns": остальные столбцы таблицы}.
+    """
+    schema, table = _split_table(table, schema)
+    rel = sql.Identifier(schema, table).as_string(conn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT a.attname, a.attgenerated = 's', pg_get_expr(d.adbin, d.adrelid), d.oid
+                FROM pg_attribute a
+                LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+                WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+                ORDER BY a.attnum
+            """, (rel,))
+            attrs = cur.fetchall()
+            own = next((r for r in attrs if r[0] == FTS_COLUMN), None)
+            columns, config, index = [], None, None
+            if own and own[1]:
+                cur.execute("""
+                    SELECT a.attname
+                    FROM pg_depend dep
+                    JOIN pg_attribute a ON a.attrelid = dep.refobjid AND a.attnum = dep.refobjsubid
+                    WHERE dep.classid = 'pg_attrdef'::regclass AND dep.objid = %s AND dep.refobjsubid > 0
+                      AND a.attname <> %s
+                    ORDER BY a.attnum
+                """, (own[3], FTS_COLUMN))
+                columns = [r[0] for r in cur.fetchall()]
+                m = re.search(r"to_tsvector\('([^']+)'::regconfig", own[2] or "")
+                config = m.group(1) if m else None
+            if own:
+                cur.execute("""
+                    SELECT ic.relname
+                    FROM pg_index i
+                    JOIN pg_class ic ON ic.oid = i.indexrelid
+                    JOIN pg_am am ON am.oid = ic.relam
+                    JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attname = %s
+                    WHERE i.indrelid = %s::regclass AND a.attnum = ANY(i.indkey) AND am.amname = 'gin'
+                      AND i.indisvalid AND i.indpred IS NULL
+                    ORDER BY 1 LIMIT 1
+                """, (FTS_COLUMN, rel))
+                row = cur.fetchone()
+                index = row[0] if row else None
+            cur.execute("""
+                SELECT a.attname
+                FROM pg_index i JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+                WHERE i.indrelid = %s::regclass AND i.indisprimary
+                ORDER BY array_position(i.indkey::int2[], a.attnum)
+            """, (rel,))
+            pk = [r[0] for r in cur.fetchall()]
+    except Exception as e:
+        raise DBError(_humanize_pg_error(e))
+    finally:
+        conn.rollback()
+    return {"exists": own is not None, "generated": bool(own and own[1]), "columns": columns, "config": config,
+            "index": index, "pk": pk, "table_columns": [r[0] for r in attrs if r[0] != FTS_COLUMN]}
+
+
+def _fts_expression(conn: PGConnection, columns: Sequence[str], config: str) -> str:
+    return sql.SQL(" || ").join(
+        sql.SQL("setweight(to_tsvector({}::regconfig, coalesce({}::text, '')), {})").format(
+            sql.Literal(config), sql.Identifier(c), sql.Literal(_FTS_WEIGHTS[min(i, 3)]))
+        for i, c in enumerate(columns)).as_string(conn)
+
+
+def fts_actions(conn: PGConnection, table: str, columns: Sequence[str], schema: str = "public",
+                config: str = FTS_CONFIG, status: Optional[Dict[str, Any]] = None) -> List[AlterAction]:
+    """
+    Действия alter_table, приводящие FTS_COLUMN таблицы к столбцам columns (в порядке убывания веса)
+    и конфигурации config: генерируемый столбец tsvector и GIN-индекс по нему. Пустой список — всё уже
+    на месте. Столбец с другими исходными столбцами или конфигурацией пересоздаётся (индекс удаляется
+    вместе с ним). Пустые columns — оставить столбец как есть, достроить только индекс.
+    """
+    status = status or fts_status(conn, table, schema)
+    _, name = _split_table(table, schema)
+    if status["exists"] and not status["generated"]:
+        raise DBError(f"В таблице {name} уже есть столбец {FTS_COLUMN}, не созданный поиском.")
+    columns = [c.strip() for c in columns if c.strip()]
+    if not columns and not status["exists"]:
+        raise DBError("Укажите столбцы для полнотекстового поиска.")
+    unknown = [c for c in columns if c not in status["table_columns"]]
+    if unknown:
+        raise DBError(f"Столбцы не найдены в таблице {name}: {', '.join(unknown)}")
+    actions: List[AlterAction] = []
+    rebuild = bool(columns) and (set(columns) != set(status["columns"]) or config != status["config"])
+    if rebuild:
+        if status["exists"]:
+            actions.append(AlterAction(kind="drop_column", table=name, column=FTS_COLUMN))
+        data_type = f"tsvector GENERATED ALWAYS AS ({_fts_expression(conn, columns, config)}) STORED"
+        actions.append(AlterAction(kind="add_column", table=name, column=FTS_COLUMN, data_type=data_type))
+    if rebuild or not status["index"]:
+        actions.append(AlterAction(kind="create_index", table=name, column=FTS_COLUMN, extra={"method": "gin"}))
+    return actions
+
+
+def ensure_fts_column(conn: PGConnection, table: str, columns: Sequence[str], schema: str = "public",
+                      config: str = FTS_CONFIG) -> str:
+    """Создаёт или обновляет полнотекстовый столбец и его GIN-индекс (см. fts_actions)."""
+    actions = fts_actions(conn, table, columns, schema, config)
+    if not actions:
+        return f"Полнотекстовый столбец {FTS_COLUMN} уже актуален."
+    alter_table(conn, actions)
+    if any(a.kind == "add_column" for a in actions):
+        listed = ", ".join(c.strip() for c in columns if c.strip())
+        return f"Столбец {FTS_COLUMN} по {listed} и GIN-индекс созданы."
+    return f"GIN-индекс по {FTS_COLUMN} создан."
+
+
+def fts_search(conn: PGConnection, table: str, query: str, page: int = 0, page_size: int = FTS_PAGE_SIZE,
+               schema: str = "public") -> FtsResult:
+    """
+    Строки, где FTS_COLUMN @@ websearch_to_tsquery(query), по убыванию ts_rank (при равенстве — по
+    первичному ключу, чтобы страницы не перекрывались). Столбец tsvector в результат не входит.
+    Запрос к странице — OFFSET: дальние страницы дороже, но ранжированный поиск обычно читают с начала.
+    """
+    status = fts_status(conn, table, schema)
+    if not status["generated"]:
+        raise DBError(f"В таблице нет столбца {FTS_COLUMN}: создайте его для полнотекстового поиска.")
+    fts = sql.Identifier(FTS_COLUMN)
+    order = [sql.SQL("rank DESC")] + [sql.Identifier(c) for c in status["pk"]]
+    stmt = sql.SQL("SELECT {cols}, ts_rank({fts}, q) AS rank "
+                   "FROM {rel}, websearch_to_tsquery({cfg}::regconfig, %s) AS q "
+                   "WHERE {fts} @@ q ORDER BY {order} LIMIT %s OFFSET %s").format(
+        cols=sql.SQL(", ").join(sql.Identifier(c) for c in status["table_columns"]), fts=fts, rel=_relation(table, schema),
+        cfg=sql.Literal(status["config"] or FTS_CONFIG), order=sql.SQL(", ").join(order)).as_string(conn)
+    # строка сверх страницы показывает, есть ли следующая
+    args = [query, int(page_size) + 1, int(page) * int(page_size)]
+    try:
+        with conn.cursor() as cur:
+            cur.execute("EXPLAIN (FORMAT JSON) " + stmt, args)
+            plan = cur.fetchone()[0]
+        conn.rollback()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        index = next(_plan_indexes(plan[0]["Plan"]), None)
+        t0 = time.perf_counter()
+        rows = execute_prepared(conn, stmt, args)
+        elapsed = (time.perf_counter() - t0) * 1000
+        conn.rollback()
+    except DBError:
+        conn.rollback()
+        raise
+    except Exception as e:
+        conn.rollback()
+        raise DBError(_humanize_pg_error(e))
+    return FtsResult(rows[:page_size], elapsed, page, page_size, len(rows) > page_size, index)
+
+
+# -------- поиск по всей схеме
+
+def text_columns(conn: PGConnection, schema: str = "public") -> List[Dict[str, Any]]:
+    """
+    Таблицы схемы со строковыми столбцами (категория типов S: text, varchar, char, citext, ...), доступные
+    на чтение: [{"table", "columns", "pk", "rows": оценка}], крупные — первыми. Секции секционированных
+    таблиц не перечисляются отдельно — их просматривает запрос к родительской таблице.
+    """
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT c.relname,
+                       array_agg(a.attname::text ORDER BY a.attnum),
+                       ARRAY(SELECT pa.attname::text
+                             FROM pg_index i
+                             JOIN pg_attribute pa ON pa.attrelid = i.indrelid AND pa.attnum = ANY(i.indkey)
+                             WHERE i.indrelid = c.oid AND i.indisprimary
+                             ORDER BY array_position(i.indkey::int2[], pa.attnum)),
+                       c.reltuples
+                FROM pg_class c
+                JOIN pg_namespace n ON n.oid = c.relnamespace
+                JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+                JOIN pg_type t ON t.oid = a.atttypid
+                WHERE n.nspname = %s AND c.relkind IN ('r', 'p', 'm') AND NOT c.relispartition
+                  AND t.typcategory = 'S' AND has_table_privilege(c.oid, 'SELECT')
+                GROUP BY c.oid, c.relname, c.reltuples
+                ORDER BY c.reltuples DESC, c.relname
+            """, (schema,))
+            rows = cur.fetchall()
+    except Exception as e:
+        raise DBError(_humanize_pg_error(e))
+    finally:
+        conn.rollback()
+    return [{"table": r[0], "columns": list(r[1]), "pk": list(r[2]), "rows": max(int(r[3]), 0)} for r in rows]
+
+
+def _table_search_sql(schema: str, spec: Dict[str, Any], mode: str) -> sql.Composable:
+    """
+    Один запрос на таблицу: по ветке UNION ALL на столбец — так каждый столбец может использовать
+    свой (например, триграммный) индекс. Строки: таблица, столбец, ключ строки, значение.
+    """
+    t = sql.Identifier(schema, spec["table"])
+    key = (sql.SQL("concat_ws(', ', {})").format(sql.SQL(", ").join(sql.Identifier(c) for c in spec["pk"]))
+           if spec["pk"] else sql.SQL("ctid::text"))
+    branches = [
+        sql.SQL("SELECT {tbl} AS \"table\", {col} AS \"column\", {key} AS key, "
+                "left({ident}::text, {chars}) AS value FROM {t} WHERE {ident} {op} %(value)s").format(
+            tbl=sql.Literal(spec["table"]), col=sql.Literal(c), key=key, ident=sql.Identifier(c),
+            chars=sql.Literal(GLOBAL_SEARCH_VALUE_CHARS), t=t, op=sql.SQL(mode))
+        for c in spec["columns"]]
+    return sql.SQL(" UNION ALL ").join(branches) + sql.SQL(" LIMIT %(limit)s")
+
+
+def global_search(
+    value: str,
+    mode: str = "ILIKE",
+    schema: str = "public",
+    limit: int = GLOBAL_SEARCH_LIMIT,
+    timeout_ms: int = GLOBAL_SEARCH_TIMEOUT_MS,
+    workers: Optional[int] = None,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Ищет value (шаблон для LIKE/ILIKE, регулярное выражение для ~/~*) во всех строковых столбцах схемы.
+    Таблицы просматриваются параллельно, не более workers одновременно (по умолчанию — число ядер,
+    но не больше пула минус одно соединение); запрос к таблице ограничен timeout_ms.
+    progress получает {"rows": ResultSet находок таблицы (может быть пустым), "table", "done": таблиц,
+    "total": таблиц, "hits": находок всего} — по мере готовности таблиц. Набрав limit находок, оставшиеся запросы
+    отменяются (PQcancel), а не дожидаются.
+    Вызывается вне GUI-потока (QueryRunner с with_connection=False): соединения берутся из пула.
+    Возвращает {"rows", "tables", "searched", "timed_out": [таблицы], "errors": {таблица: текст},
+    "limited": лимит достигнут, "seconds"}.
+    """
+    if mode not in GLOBAL_SEARCH_MODES:
+        raise DBError(f"Неизвестный режим поиска: {mode}")
+    with pooled_connection() as conn:
+        specs = text_columns(conn, schema)
+    pool = get_pool()
+    workers = workers or os.cpu_count() or 1
+    workers = max(1, min(workers, pool.maxconn - 1, len(specs) or 1))
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    active: Dict[str, Any] = {}  # таблица -> соединение выполняющегося запроса (для отмены)
+
+    def search(spec: Dict[str, Any]) -> Optional[ResultSet]:
+        if stop.is_set():
+            return None
+        with pooled_connection() as c:
+            with lock:
+                if stop.is_set():
+                    return None
+                active[spec["table"]] = c
+            try:
+                with c.cursor() as cur:
+                    cur.execute("SET LOCAL statement_timeout = %s", (int(timeout_ms),))
+                    cur.execute(_table_search_sql(schema, spec, mode), {"value": value, "limit": int(limit)})
+                    return ResultSet.from_cursor(cur)
+            finally:
+                with lock:
+                    active.pop(spec["table"], None)
+                c.rollback()
+
+    def cancel_running() -> None:
+        stop.set()
+        # под блокировкой: иначе соединение успеет вернуться в пул и отмена попадёт в чужой запрос
+        with lock:
+            for c in active.values():
+                try:
+                    if not c.closed:
+                        c.cancel()
+                except Exception:
+                    logger.warning("Не удалось отменить запрос поиска")
+
+    t0 = time.perf_counter()
+    found = ResultSet([])
+    timed_out: List[str] = []
+    errors: Dict[str, str] = {}
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="global-search") as ex:
+        futures = {ex.submit(search, spec): spec["table"] for spec in specs}
+        pending = set(futures)
+        try:
+            while pending:
+                finished, pending = wait(pending, timeout=_HEARTBEAT, return_when=FIRST_COMPLETED)
+                if not finished and progress:
+                    # пустой отчёт: через него срабатывает отмена из GUI
+                    progress({"rows": ResultSet([]), "table": None, "done": done, "total": len(specs),
+                              "hits": len(found)})
+                for fut in finished:
+                    table = futures[fut]
+                    try:
+                        rows = fut.result()
+                    except Exception as e:
+                        if stop.is_set():
+                            continue  # отменён нами после достижения лимита
+                        done += 1
+                        if getattr(e, "pgcode", None) == _QUERY_CANCELED:
+                            timed_out.append(table)
+                        else:
+                            errors[table] = _humanize_pg_error(e)
+                        continue
+                    if rows is None or stop.is_set():
+                        continue
+                    done += 1
+                    if rows:
+                        rows = rows[:limit - len(found)]
+                        found.extend(rows)
+                    if progress:
+                        progress({"rows": rows, "table": table, "done": done, "total": len(specs),
+                                  "hits": len(found)})
+                    if len(found) >= limit:
+                        for f in pending:
+                            f.cancel()
+                        cancel_running()
+        except BaseException:
+            # отмена из воркера GUI (progress бросает исключение) — прерываем все таблицы
+            for f in futures:
+                f.cancel()
+            cancel_running()
+            raise
+    elapsed = time.perf_counter() - t0
+    logger.info("Поиск %r по схеме %s: %s находок, %s таблиц, %.2f с", value, schema, len(found), done, elapsed)
+    return {"rows": found, "tables": len(specs), "searched": done, "timed_out": timed_out, "errors": errors,
+            "limited": len(found) >= limit, "seconds": elapsed}
+
+
+__all__ = ["SEARCH_MODES", "TRIGRAM_MODES", "SEARCH_LIMIT", "SearchResult", "search_table", "trigram_status",
+           "trigram_index_proposal", "create_trigram_index",
+           "FTS_MODE", "FTS_COLUMN", "FTS_PAGE_SIZE", "FtsResult", "fts_status", "fts_actions", "ensure_fts_column",
+           "fts_search", "GLOBAL_SEARCH_MODES", "GLOBAL_SEARCH_LIMIT", "GLOBAL_SEARCH_TIMEOUT_MS", "text_columns",
+           "global_search"]
@@ -0,0 +1,46 @@
+"""Слияние подкоманд в плане alter_table (без обращения к базе): python -m unittest test_alter_plan"""
+import unittest
+
+from database import AlterAction, plan_alter
+
+
+def kinds(*actions: AlterAction):
+    return [step.kinds for step in plan_alter(actions)]
+
+
+class MergeOrderTest(unittest.TestCase):
+    """Действия над одним столбцом или ограничением выполняются в заданном порядке."""
+
+    def test_not_null_toggle(self):
+        self.assertEqual(
+            kinds(AlterAction("set_not_null", "t", "x"), AlterAction("drop_not_null", "t", "x")),
+            [["set_not_null"], ["drop_not_null"]])
+
+    def test_drop_after_add(self):
+        self.assertEqual(
+            kinds(AlterAction("add_column", "t", "x", data_type="int"), AlterAction("add_unique", "t", "x"),
+                  AlterAction("drop_column", "t", "x")),
+            [["add_column"], ["add_unique"], ["drop_column"]])
+
+    def test_alter_type_of_added_column(self):
+        self.assertEqual(
+            kinds(AlterAction("add_column", "t", "x", data_type="int"),
+                  AlterAction("alter_type", "t", "x", data_type="bigint")),
+            [["add_column"], ["alter_type"]])
+
+    def test_drop_added_constraint(self):
+        self.assertEqual(
+            kinds(AlterAction("add_check", "t", check_expr="y > 0", constraint_name="c"),
+                  AlterAction("drop_constraint", "t", constraint_name="c")),
+            [["add_check"], ["drop_constraint"]])
+
+    def test_independent_clauses_merge(self):
+        # разные столбцы сливаются в одну команду и расставляются по проходам PostgreSQL
+        self.assertEqual(
+            kinds(AlterAction("add_column", "t", "x", data_type="int"), AlterAction("drop_column", "t", "y"),
+                  AlterAction("alter_type", "t", "z", data_type="bigint")),
+            [["drop_column", "alter_type", "add_column"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,28 +2,36 @@
 Главное окно приложения:
 - Две кнопки в строке (минималистичный стиль: фон #FAFAFA, текст #000, белые кнопки с серой рамкой)
 - Кнопки: Создать таблицу, Редактор схемы, Конструктор SELECT, Мастер JOIN (встроен в конструктор),
-  Строковые функции, Поиск, Применить изменения, Отменить, Лог..., Выход
-- DataView: табличный просмотр результатов/предпросмотра
+  Строковые функции, Поиск, Импорт CSV, Экспорт, Применить изменения, Отменить, Лог..., Выход
+- DataView: табличный просмотр результатов/предпросмотра (виртуальная модель, потоковая подгрузка строк)
 - Интеграция с dialogs.py и database.py
 """
 
 from __future__ import annotations
 import logging
-from typing import List, Dict, Any, Optional
+from typing import Dict, Any, Optional
 
 from PyQt6.QtCore import Qt
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QGridLayout,
-    QPushButton, QLabel, QTableWidget, QTableWidgetItem, QFileDialog, QMessageBox,
+    QPushButton, QLabel, QFileDialog, QMessageBox, QInputDialog,
     QStatusBar,  QSizePolicy
 )
 
 from database import (
-    get_connection, preview_table, execute_select, SelectParams, safe_execute
+    close_pool, preview_table, execute_select, SelectParams, safe_execute, CATALOG_CACHE, DDLListener,
+    RESULT_CACHE, pooled_connection
 )
 from dialogs import (
-    SchemaEditorDialog, SelectBuilderDialog, SearchDialog, StringFuncsDialog, InsertRowDialog
+    SchemaEditorDialog, SelectBuilderDialog, SearchDialog, StringFuncsDialog, InsertRowDialog, QueryStatsDialog,
+    ForeignKeyAuditDialog, GlobalSearchDialog
 )
+from workers import QueryRunner, CANCELLED_MSG
+from DataView import ResultGrid, open_stream
+from csv_import import import_csv
+from search import global_search
+from export import export_result
+from resultset import ResultSet
 "константы для удобства"
 APP_BG = "#FAFAFA"
 TEXT_COLOR = "#000000"
@@ -49,7 +57,7 @@ BASE_STYLE = f"""
         background-color: qlineargradient(x1:0, y1:0, x2:0, y2:1,
                                           stop:0 #F2F2F2, stop:1 #E0E0E0);
     }}
-    QTableWidget {{
+    QTableView {{
         gridline-color: #D0D0D0;
         alternate-background-color: #F5F5F5;
         selection-background-color: #E0E0E0;
@@ -64,8 +72,12 @@ class MainWindow(QMainWindow):
         super().__init__()
         self.setWindowTitle("DB Designer — KR-2")
         self.resize(1100, 720)
+        self.runner = QueryRunner(self)
         self._setup_ui()
-        self._last_rows: List[Dict[str, Any]] = []
+        # кэш метаданных сбрасывается и при DDL из других клиентов (LISTEN/NOTIFY)
+        self._ddl_listener = DDLListener(CATALOG_CACHE)
+        self._ddl_listener.start()
+        self._last_params: Optional[SelectParams] = None
 
     def _setup_ui(self):
         cw = QWidget()
@@ -93,11 +105,11 @@ class MainWindow(QMainWindow):
         root.addLayout(topbar)
 
         # ─── Таблица (занимает максимум пространства; со скроллами) ─
-        self.table = QTableWidget()
-        self.table.setAlternatingRowColors(True)
-        self.table.setSortingEnabled(True)
-        self.table.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
-        self.table.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
+        self.table = ResultGrid()
+        self.table.result_model.error.connect(self._on_db_error)
+        self.table.result_model.sortRequested.connect(self._on_sort_requested)
+        self.table.result_model.rowsInserted.connect(self._update_rows_status)
+        self.table.result_model.streamExpired.connect(self._on_stream_expired)
         root.addWidget(self.table, 1)  # растягивается
 
         # ─── Кнопки: три строки по две, под таблицей, растягиваем ───
@@ -108,6 +120,13 @@ class MainWindow(QMainWindow):
         self.btn_search = QPushButton("Поиск")
         self.btn_exit = QPushButton("Выход")
         self.btn_insert = QPushButton("Добавить запись")
+        self.btn_import = QPushButton("Импорт CSV")
+        self.btn_export = QPushButton("Экспорт")
+        self.btn_stats = QPushButton("Статистика запросов")
+        self.btn_fk_audit = QPushButton("Внешние ключи без индексов")
+        self.btn_global_search = QPushButton("Поиск по всей схеме")
+        self.btn_abort = QPushButton("Прервать запрос")
+        self.btn_abort.setEnabled(False)
 
         # делаем кнопки тянущимися по ширине
         for b in (self.btn_create, self.btn_schema, self.btn_select,
@@ -124,7 +143,10 @@ class MainWindow(QMainWindow):
             self.btn_create, self.btn_schema,
             self.btn_select, self.btn_strings,
             self.btn_search, self.btn_exit,
-            self.btn_insert
+            self.btn_insert, self.btn_import,
+            self.btn_export, self.btn_stats,
+            self.btn_fk_audit, self.btn_global_search,
+            self.btn_abort
         ]
         row = col = 0
         for b in buttons:
@@ -147,25 +169,72 @@ class MainWindow(QMainWindow):
         self.btn_search.clicked.connect(self.on_search)
         self.btn_exit.clicked.connect(self.close)
         self.btn_insert.clicked.connect(self.on_insert_row)
+        self.btn_import.clicked.connect(self.on_import_csv)
+        self.btn_export.clicked.connect(self.on_export)
+        self.btn_stats.clicked.connect(self.on_query_stats)
+        self.btn_fk_audit.clicked.connect(self.on_fk_audit)
+        self.btn_global_search.clicked.connect(self.on_global_search)
+        self.btn_abort.clicked.connect(self.runner.cancel)
+        self.runner.busyChanged.connect(self._on_busy_changed)
+
+    def _on_busy_changed(self, busy: bool):
+        self.btn_abort.setEnabled(busy)
+        if busy:
+            self.status.showMessage("Выполняется запрос…")
+
+    def _on_db_error(self, msg: str):
+        if msg == CANCELLED_MSG:
+            self.status.showMessage(msg, 5000)
+        else:
+            QMessageBox.critical(self, "Ошибка", msg)
 
-    def _show_rows(self, rows: List[Dict[str, Any]]):
-        self._last_rows = rows
+    def _show_rows(self, rows: ResultSet):
+        self._last_params = None
+        model = self.table.result_model
+        model.set_rows(rows)
         if not rows:
-            self.table.clear()
-            self.table.setRowCount(0)
-            self.table.setColumnCount(0)
             self.status.showMessage("Пустой результат", 5000)
             return
-        headers = list(rows[0].keys())
-        self.table.setColumnCount(len(headers))
-        self.table.setHorizontalHeaderLabels(headers)
-        self.table.setRowCount(len(rows))
-        for r_idx, row in enumerate(rows):
-            for c_idx, key in enumerate(headers):
-                val = row.get(key, "")
-                item = QTableWidgetItem(str(val))
-                self.table.setItem(r_idx, c_idx, item)
-        self.status.showMessage(f"Строк: {len(rows)}; Колонок: {len(headers)}", 5000)
+        self.status.showMessage(f"Строк: {len(rows)}; Колонок: {model.columnCount()}", 5000)
+
+    def _show_cached_rows(self, rows: ResultSet):
+        self._show_rows(rows)
+        st = RESULT_CACHE.stats()
+        self.status.showMessage(
+            f"Строк: {len(rows)}; кэш: попаданий {st['hits']}, промахов {st['misses']}, "
+            f"{st['bytes'] // 1024} КБ", 5000)
+
+    def _show_stream(self, params: SelectParams):
+        """Результат SELECT читается серверным курсором: первая пачка — сразу, остальные — при прокрутке."""
+        self._last_params = params
+
+        def done(result):
+            stream, first = result
+            model = self.table.result_model
+            model.set_stream(stream, first)
+            if not first:
+                self.status.showMessage("Пустой результат", 5000)
+            else:
+                self._update_rows_status()
+        self.runner.run(open_stream, params, with_connection=False, on_result=done, on_error=self._on_db_error)
+
+    def _update_rows_status(self, *_):
+        model = self.table.result_model
+        more = "" if model.exhausted else " (прокрутите вниз, чтобы загрузить ещё)"
+        self.status.showMessage(f"Строк: {model.rowCount()}{more}; Колонок: {model.columnCount()}")
+
+    def _on_stream_expired(self):
+        self.status.showMessage(
+            f"Строк: {self.table.result_model.rowCount()}; поток результата закрыт после простоя — "
+            "чтобы дочитать остальное, повторите запрос.")
+
+    def _on_sort_requested(self, column: str, order: Qt.SortOrder):
+        if self._last_params is None:
+            return
+        from dataclasses import replace
+        direction = "DESC" if order == Qt.SortOrder.DescendingOrder else "ASC"
+        quoted = '"' + column.replace('"', '""') + '"'
+        self._show_stream(replace(self._last_params, order_by=[(quoted, direction)]))
 
     # ---- actions
 
@@ -178,19 +247,11 @@ class MainWindow(QMainWindow):
         import os
         base = os.path.basename(name)
         table = base.replace(".", "_").replace("-", "_")
-        try:
-            conn = get_connection()
-            try:
-                q = f'CREATE TABLE IF NOT EXISTS "{table}" (id SERIAL PRIMARY KEY, name TEXT)'
-                safe_execute(conn, q)
-                # preview new table
-                rows = preview_table(conn, table, limit=0)
-                self._show_rows(rows)
-                QMessageBox.information(self, "Создано", f'Таблица "{table}" создана.')
-            finally:
-                conn.close()
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", str(e))
+
+        def done(rows):
+            self._show_rows(rows)
+            QMessageBox.information(self, "Создано", f'Таблица "{table}" создана.')
+        self.runner.run(_create_table_and_preview, table, on_result=done, on_error=self._on_db_error)
 
     def on_schema_editor(self):
         dlg = SchemaEditorDialog(self)
@@ -200,9 +261,12 @@ class MainWindow(QMainWindow):
 
     def on_select_builder(self):
         dlg = SelectBuilderDialog(self)
-        if dlg.exec() and getattr(dlg, "result_rows", None) is not None:
-            self._show_rows(dlg.result_rows)
-            self.status.showMessage(f"Показано строк: {len(dlg.result_rows)}", 5000)
+        if dlg.exec() and getattr(dlg, "result_params", None) is not None:
+            if dlg.use_cache:
+                self.runner.run(execute_select, dlg.result_params, use_cache=True,
+                                on_result=self._show_cached_rows, on_error=self._on_db_error)
+            else:
+                self._show_stream(dlg.result_params)
         else:
             self.status.showMessage("Запрос отменён или результата нет.", 3000)
 
@@ -218,6 +282,34 @@ class MainWindow(QMainWindow):
             self._show_rows(dlg.result_rows)
             pass
 
+    def on_global_search(self):
+        dlg = GlobalSearchDialog(self)
+        if not dlg.exec() or dlg.result_params is None:
+            return
+        params = dlg.result_params
+        self._last_params = None
+        model = self.table.result_model
+        model.clear()
+
+        # находки каждой таблицы дописываются в таблицу сразу, не дожидаясь остальных
+        def on_progress(p):
+            model.append_rows(p["rows"])
+            self.status.showMessage(f"Поиск: таблиц {p['done']} из {p['total']}, находок {p['hits']}")
+
+        def done(res):
+            notes = []
+            if res["limited"]:
+                notes.append(f"лимит {params['limit']} достигнут, оставшиеся таблицы не просмотрены")
+            if res["timed_out"]:
+                notes.append("прервано по таймауту: " + ", ".join(res["timed_out"]))
+            self.status.showMessage(
+                f"Находок: {len(res['rows'])} в {res['searched']} из {res['tables']} таблиц "
+                f"за {res['seconds']:.1f} с" + ("; " + "; ".join(notes) if notes else ""), 15000)
+            if res["errors"]:
+                QMessageBox.warning(self, "Поиск", "\n".join(f"{t}: {e}" for t, e in res["errors"].items()))
+        self.runner.run(global_search, with_connection=False, on_progress=on_progress,
+                        on_result=done, on_error=self._on_db_error, **params)
+
     def on_apply_commit(self):
         QMessageBox.information(self, "Транзакция", "Изменения применяются автоматически после операций.")
 
@@ -227,16 +319,62 @@ class MainWindow(QMainWindow):
             # если пользователь добавлял запись — покажем актуальную таблицу
             tbl = dlg.table_name
             if tbl:
-                try:
-                    conn = get_connection()
-                    try:
-                        rows = preview_table(conn, tbl, limit=200)
-                        self._show_rows(rows)
-                        self.status.showMessage(f"Добавлена запись в {tbl}", 4000)
-                    finally:
-                        conn.close()
-                except Exception as e:
-                    QMessageBox.critical(self, "Ошибка", str(e))
+                def done(rows):
+                    self._show_rows(rows)
+                    self.status.showMessage(f"Добавлена запись в {tbl}", 4000)
+                self.runner.run(preview_table, tbl, limit=200, on_result=done, on_error=self._on_db_error)
+
+    def on_import_csv(self):
+        path, _ = QFileDialog.getOpenFileName(self, "CSV-файл для импорта", "", "CSV (*.csv);;Все файлы (*)")
+        if not path:
+            return
+        table, ok = QInputDialog.getText(self, "Импорт CSV", "Целевая таблица (столбцы — из заголовка файла):")
+        table = table.strip()
+        if not ok or not table:
+            return
+
+        stages = {"copy": "загрузка", "validate": "проверка", "insert": "перенос", "analyze": "ANALYZE"}
+
+        def on_progress(p):
+            pct = 100 * p["done"] // p["total"] if p["total"] else 100
+            self.status.showMessage(f"Импорт {table}: {stages.get(p['stage'], p['stage'])}, {pct}%")
+
+        def done(res):
+            secs = sum(res["seconds"].values())
+            self.status.showMessage(
+                f"Импортировано строк: {res['rows_inserted']} из {res['rows_loaded']} "
+                f"за {secs:.1f} с ({res['workers']} потоков)", 10000)
+            self._last_params = None
+            self.table.result_model.set_rows(res["preview"])
+        self.runner.run(_import_csv_and_preview, path, table, with_connection=False,
+                        on_progress=on_progress, on_result=done, on_error=self._on_db_error)
+
+    def on_export(self):
+        # выгружается последний запрос конструктора целиком (не только подгруженные в таблицу строки)
+        source = self._last_params
+        if source is None:
+            table, ok = QInputDialog.getText(self, "Экспорт", "Таблица для выгрузки:")
+            source = table.strip()
+            if not ok or not source:
+                return
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Файл выгрузки", "", "CSV (*.csv);;JSON Lines (*.jsonl);;Parquet (*.parquet)")
+        if not path:
+            return
+
+        def on_progress(p):
+            self.status.showMessage(f"Экспорт: {p['rows']} строк, {p['bytes'] // 1024} КБ")
+
+        def done(res):
+            self.status.showMessage(f"Выгружено строк: {res['rows']} в {res['path']}", 10000)
+        self.runner.run(export_result, source, path, on_progress=on_progress,
+                        on_result=done, on_error=self._on_db_error)
+
+    def on_query_stats(self):
+        QueryStatsDialog(self).exec()
+
+    def on_fk_audit(self):
+        ForeignKeyAuditDialog(self).exec()
 
     def on_apply_rollback(self):
         QMessageBox.information(self, "Транзакция", "Откат возможен для явных транзакций. В текущем режиме операции атомарны.")
@@ -253,6 +391,30 @@ class MainWindow(QMainWindow):
                 QMessageBox.warning(self, "Лог", f"Не удалось прочитать лог: {e}")
         else:
             QMessageBox.information(self, "Лог", "Файл лога не найден.")
+
+    def closeEvent(self, event):
+        self.runner.cancel()
+        self.table.result_model.close()
+        self._ddl_listener.stop()
+        close_pool()
+        event.accept()
+
+
+def _create_table_and_preview(conn, table: str) -> ResultSet:
+    q = f'CREATE TABLE IF NOT EXISTS "{table}" (id SERIAL PRIMARY KEY, name TEXT)'
+    safe_execute(conn, q)
+    CATALOG_CACHE.invalidate(table=table)
+    # preview new table
+    return preview_table(conn, table, limit=0)
+
+
+def _import_csv_and_preview(path: str, table: str, progress=None) -> Dict[str, Any]:
+    res = import_csv(path, table, progress=progress)
+    with pooled_connection() as conn:
+        res["preview"] = preview_table(conn, table, limit=200)
+    return res
+
+
 def main():
     import sys
     app = QApplication(sys.argv)
@@ -0,0 +1,187 @@
+"""
+Фоновое выполнение запросов к БД:
+- QueryWorker — выполняет функцию из database.py в отдельном QThread на соединении из пула
+- QueryRunner — управляет воркерами одного окна: запуск, отмена, сигнал занятости
+
+Функция вызывается как fn(conn, *args, **kwargs) — так устроены все функции database.py;
+с with_connection=False — как fn(*args, **kwargs) (если функция сама берёт соединение из пула).
+Результат, ошибки и прогресс доставляются в GUI-поток через сигналы Qt, поэтому
+долгий запрос не блокирует перерисовку и ввод.
+"""
+
+from __future__ import annotations
+import logging
+import threading
+from typing import Any, Callable, Optional, Set, Tuple
+
+from PyQt6.QtCore import QObject, QThread, pyqtSignal, pyqtSlot
+
+from database import pooled_connection
+
+logger = logging.getLogger(__name__)
+
+CANCELLED_MSG = "Запрос отменён пользователем."
+
+# Пары (поток, воркер) живут здесь до завершения потока, чтобы их не собрал GC
+# и чтобы закрытие окна не разрушило работающий QThread.
+_ACTIVE: Set[Tuple[QThread, "QueryWorker"]] = set()
+
+
+class QueryWorker(QObject):
+    """Выполняет одну функцию database.py вне GUI-потока."""
+
+    started = pyqtSignal()
+    progress = pyqtSignal(object)
+    result = pyqtSignal(object)
+    error = pyqtSignal(str)
+    finished = pyqtSignal()
+
+    def __init__(self, fn: Callable[..., Any], *args: Any, with_progress: bool = False,
+                 with_connection: bool = True, **kwargs: Any):
+        super().__init__()
+        self._fn = fn
+        self._args = args
+        self._kwargs = kwargs
+        self._with_progress = with_progress
+        self._with_connection = with_connection
+        self._lock = threading.Lock()
+        self._conn = None
+        self._cancelled = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def run(self):
+        self.started.emit()
+        try:
+            if not self._with_connection:
+                res = self._fn(*self._args, **self._call_kwargs())
+                if self._cancelled:
+                    raise RuntimeError(CANCELLED_MSG)
+                self.result.emit(res)
+                return
+            with pooled_connection() as conn:
+                with self._lock:
+                    if self._cancelled:
+                        raise RuntimeError(CANCELLED_MSG)
+                    self._conn = conn
+                try:
+                    res = self._fn(conn, *self._args, **self._call_kwargs())
+                finally:
+                    with self._lock:
+                        self._conn = None
+            if self._cancelled:
+                raise RuntimeError(CANCELLED_MSG)
+            self.result.emit(res)
+        except Exception as e:
+            if self._cancelled:
+                self.error.emit(CANCELLED_MSG)
+            else:
+                logger.exception("Ошибка фонового запроса %s", getattr(self._fn, "__name__", self._fn))
+                self.error.emit(str(e))
+        finally:
+            self.finished.emit()
+
+    def cancel(self):
+        """Прерывает выполняющийся запрос (PQcancel — аналог pg_cancel_backend для своего backend-а)."""
+        with self._lock:
+            self._cancelled = True
+            conn = self._conn
+            if conn is not None and not conn.closed:
+                try:
+                    conn.cancel()
+                except Exception:
+                    logger.warning("Не удалось отправить отмену запроса")
+
+    def _call_kwargs(self) -> dict:
+        kwargs = dict(self._kwargs)
+        if self._with_progress:
+            kwargs["progress"] = self._report
+        return kwargs
+
+    def _report(self, value: Any) -> None:
+        if self._cancelled:
+            raise RuntimeError(CANCELLED_MSG)
+        self.progress.emit(value)
+
+
+class QueryRunner(QObject):
+    """
+    Запускает воркеры для одного окна. Одновременно выполняется не более одного запроса;
+    busyChanged(True/False) позволяет блокировать кнопки и включать кнопку «Прервать».
+    """
+
+    busyChanged = pyqtSignal(bool)
+
+    def __init__(self, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self._worker: Optional[QueryWorker] = None
+        self._on_result: Optional[Callable[[Any], None]] = None
+        self._on_error: Optional[Callable[[str], None]] = None
+        self._on_progress: Optional[Callable[[Any], None]] = None
+
+    @property
+    def busy(self) -> bool:
+        return self._worker is not None
+
+    def run(self, fn: Callable[..., Any], *args: Any,
+            on_result: Optional[Callable[[Any], None]] = None,
+            on_error: Optional[Callable[[str], None]] = None,
+            on_progress: Optional[Callable[[Any], None]] = None,
+            with_connection: bool = True,
+            **kwargs: Any) -> bool:
+        """Запускает fn(conn, *args, **kwargs) в фоне. False — если окно уже занято запросом."""
+        if self.busy:
+            return False
+        worker = QueryWorker(fn, *args, with_progress=on_progress is not None,
+                             with_connection=with_connection, **kwargs)
+        self._worker = worker
+        self._on_result, self._on_error, self._on_progress = on_result, on_error, on_progress
+
+        thread = QThread()
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.progress.connect(self._handle_progress)
+        worker.result.connect(self._handle_result)
+        worker.error.connect(self._handle_error)
+        worker.finished.connect(self._handle_finished)
+        worker.finished.connect(thread.quit)
+
+        pair = (thread, worker)
+        _ACTIVE.add(pair)
+        thread.finished.connect(lambda: _ACTIVE.discard(pair))
+
+        self.busyChanged.emit(True)
+        thread.start()
+        return True
+
+    def cancel(self):
+        if self._worker is not None:
+            self._worker.cancel()
+
+    @pyqtSlot(object)
+    def _handle_progress(self, value: Any):
+        if self.sender() is self._worker and self._on_progress:
+            self._on_progress(value)
+
+    @pyqtSlot(object)
+    def _handle_result(self, value: Any):
+        if self.sender() is self._worker and self._on_result:
+            self._on_result(value)
+
+    @pyqtSlot(str)
+    def _handle_error(self, msg: str):
+        if self.sender() is self._worker and self._on_error:
+            self._on_error(msg)
+
+    @pyqtSlot()
+    def _handle_finished(self):
+        if self.sender() is not self._worker:
+            return
+        self._worker = None
+        self._on_result = self._on_error = self._on_progress = None
+        self.busyChanged.emit(False)
+
+
+__all__ = ["QueryWorker", "QueryRunner", "CANCELLED_MSG"]